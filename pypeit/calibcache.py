@@ -0,0 +1,501 @@
+"""
+Implements the caches used to hold the calibrations.
+
+:class:`CalibrationCache` is a persistent, content-addressed cache.
+Calibration products are saved to disk using a key constructed from
+everything used to build them: the raw files (path, size, and
+modification time or checksum), the relevant parameters, the keys of
+the calibrations they depend on, and the PypeIt version.  Any change
+to these inputs changes the key, such that stale products are never
+reused; unchanged calibrations are reused across PypeIt runs without
+relying on the names of the MasterFrame files.
+
+:class:`CalibrationDict` holds the calibrations in memory during a
+PypeIt run, spilling the least recently used ones to disk when its
+memory limit is exceeded.
+
+.. _numpy.ndarray: https://docs.scipy.org/doc/numpy/reference/generated/numpy.ndarray.html
+"""
+import os
+import sys
+import glob
+import json
+import pickle
+import shutil
+import hashlib
+import weakref
+import tempfile
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from pypeit import msgs
+from pypeit import parallel
+from pypeit.par.parset import ParSet
+
+import pypeit
+
+# Parameters that only set how a calibration is computed (number of
+# processes, memory and scratch space) and are excluded from the keys
+EXECUTION_PARS = ['nproc', 'combine_block', 'scratch_dir', 'stack_dtype', 'lathreads']
+
+
+def par_signature(par):
+    """
+    Return the parameters in a parameter set used to construct the
+    cache keys.
+
+    Args:
+        par (:class:`pypeit.par.parset.ParSet`):
+            Parameter set.  Nested parameter sets are included
+            recursively.
+
+    Returns:
+        :obj:`list`: The name and value of each parameter, excluding
+        those in :data:`EXECUTION_PARS`.
+    """
+    return [[k, par_signature(par[k]) if isinstance(par[k], ParSet) else par[k]]
+                for k in par.keys() if k not in EXECUTION_PARS]
+
+
+def file_signature(filename, checksum=False):
+    """
+    Return the signature of a file used to construct the cache keys.
+
+    Args:
+        filename (:obj:`str`):
+            Name of the file.
+        checksum (:obj:`bool`, optional):
+            Use the SHA1 checksum of the file contents instead of its
+            modification time.
+
+    Returns:
+        :obj:`list`: The absolute path and size of the file, followed
+        by its checksum or modification time.  Only the path is
+        returned if the file does not exist.
+    """
+    if not os.path.isfile(filename):
+        return [os.path.abspath(filename)]
+    stat = os.stat(filename)
+    if not checksum:
+        return [os.path.abspath(filename), stat.st_size, stat.st_mtime]
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            sha.update(block)
+    return [os.path.abspath(filename), stat.st_size, sha.hexdigest()]
+
+
+class CalibrationCache(object):
+    """
+    Persistent cache for the calibration products.
+
+    Each product is pickled to a file in :attr:`cache_dir` named after
+    its key.  When the total size of the cache exceeds
+    :attr:`max_size`, the least recently used products are removed.
+
+    Args:
+        cache_dir (:obj:`str`):
+            Directory with the cached products.  Created if it does
+            not exist.
+        max_size (:obj:`float`, optional):
+            Maximum size of the cache in GB.
+        checksum (:obj:`bool`, optional):
+            Identify the raw files by their checksum instead of their
+            modification time.  Slower, but insensitive to files
+            being copied or touched.
+
+    Attributes:
+        stats (`collections.OrderedDict`_):
+            Number of hits and misses for each calibration type.
+    """
+    def __init__(self, cache_dir, max_size=10., checksum=False):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.checksum = checksum
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.stats = OrderedDict()
+
+    def key(self, master_type, files=None, par=None, depends=None, data=None, **kwargs):
+        """
+        Construct the key for a calibration product.
+
+        Args:
+            master_type (:obj:`str`):
+                Type of calibration product.
+            files (:obj:`list`, optional):
+                Raw files used to build the product.
+            par (:class:`pypeit.par.parset.ParSet`, :obj:`list`, optional):
+                One or more parameter sets used to build the product.
+                Parameters that do not change the product are
+                excluded; see :func:`par_signature`.
+            depends (:obj:`list`, optional):
+                Keys of the calibrations used to build the product.
+            data (`numpy.ndarray`_, optional):
+                Array used to build the product that is not itself
+                cached; the key includes a hash of its contents.
+            **kwargs:
+                Any other quantity that affects the product.  Must
+                have a unique string representation.
+
+        Returns:
+            :obj:`str`: The hexadecimal key.
+        """
+        _par = [] if par is None else (par if isinstance(par, list) else [par])
+        items = [pypeit.__version__, master_type,
+                 [] if files is None else [file_signature(f, checksum=self.checksum)
+                                            for f in files],
+                 [par_signature(p) if isinstance(p, ParSet) else p for p in _par],
+                 [] if depends is None else list(depends),
+                 None if data is None else hashlib.sha1(np.ascontiguousarray(data)).hexdigest(),
+                 sorted([(k, str(v)) for k, v in kwargs.items()])]
+        return hashlib.sha1(json.dumps(items, default=str).encode('utf-8')).hexdigest()
+
+    def file_name(self, key):
+        """Name of the file with the cached product."""
+        return os.path.join(self.cache_dir, '{0}.pkl'.format(key))
+
+    def _count(self, master_type, hit):
+        if master_type not in self.stats:
+            self.stats[master_type] = [0, 0]
+        self.stats[master_type][0 if hit else 1] += 1
+
+    def load(self, master_type, key):
+        """
+        Load a calibration product from the cache.
+
+        Args:
+            master_type (:obj:`str`):
+                Type of calibration product; only used for the
+                statistics of the cache.
+            key (:obj:`str`):
+                Key of the product; see :func:`key`.
+
+        Returns:
+            object: The cached product, or None if the product is not
+            in the cache.
+        """
+        _file = self.file_name(key)
+        if not os.path.isfile(_file):
+            self._count(master_type, False)
+            return None
+        try:
+            with open(_file, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            msgs.warn('Could not read cached {0}: {1}'.format(master_type, e))
+            self._remove(_file)
+            self._count(master_type, False)
+            return None
+        # Mark as recently used
+        os.utime(_file, None)
+        self._count(master_type, True)
+        msgs.info('Using {0} found in the calibration cache: {1}'.format(master_type, key))
+        return data
+
+    def save(self, key, data):
+        """
+        Save a calibration product to the cache.
+
+        The file is written atomically, such that processes sharing
+        the cache never read a partially written product.  The least
+        recently used products are then removed if the cache exceeds
+        :attr:`max_size`.
+
+        Args:
+            key (:obj:`str`):
+                Key of the product; see :func:`key`.
+            data (object):
+                Product to save.  Must be picklable.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.file_name(key))
+        except:
+            self._remove(tmp)
+            raise
+        self.evict(keep=key)
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def size(self):
+        """Return the total size of the cache in bytes."""
+        return sum([os.path.getsize(f)
+                        for f in glob.glob(os.path.join(self.cache_dir, '*.pkl'))])
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used products until the cache is
+        smaller than :attr:`max_size`.
+
+        Args:
+            keep (:obj:`str`, optional):
+                Key of a product that should not be removed.
+        """
+        files = []
+        for f in glob.glob(os.path.join(self.cache_dir, '*.pkl')):
+            try:
+                stat = os.stat(f)
+            except OSError:
+                # Removed by another process
+                continue
+            files += [(stat.st_mtime, stat.st_size, f)]
+        budget = self.max_size*1024**3
+        total = sum([f[1] for f in files])
+        _keep = None if keep is None else self.file_name(keep)
+        for mtime, size, f in sorted(files):
+            if total <= budget:
+                break
+            if f == _keep:
+                continue
+            msgs.info('Removing {0} from the calibration cache'.format(os.path.basename(f)))
+            self._remove(f)
+            total -= size
+
+    def reset_stats(self):
+        """Reset the hit and miss counts."""
+        self.stats = OrderedDict()
+
+    def add_stats(self, stats):
+        """
+        Add the hit and miss counts of another cache instance, e.g.
+        from another process.
+        """
+        for master_type, (hits, misses) in stats.items():
+            if master_type not in self.stats:
+                self.stats[master_type] = [0, 0]
+            self.stats[master_type][0] += hits
+            self.stats[master_type][1] += misses
+
+    def report(self):
+        """
+        Print the number of hits and misses for each calibration type.
+        """
+        if len(self.stats) == 0:
+            msgs.info('The calibration cache was not used.')
+            return
+        msg = 'Calibration cache {0} ({1:.2f} GB):'.format(self.cache_dir, self.size()/1024**3)
+        msg += msgs.newline() + '{0:>12} {1:>6} {2:>6}'.format('Type', 'Hits', 'Misses')
+        for master_type, (hits, misses) in self.stats.items():
+            msg += msgs.newline() + '{0:>12} {1:>6} {2:>6}'.format(master_type, hits, misses)
+        msgs.info(msg)
+
+
+def calib_nbytes(obj):
+    """
+    Return the approximate memory used by a calibration product.
+
+    Arrays are counted by their data buffer, and containers by the sum
+    of their elements.
+
+    Args:
+        obj (object):
+            Calibration product, e.g. a `numpy.ndarray`_ or a
+            dictionary of them.
+
+    Returns:
+        :obj:`int`: Number of bytes.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum([calib_nbytes(v) for v in obj.values()])
+    if isinstance(obj, (list, tuple)):
+        return sum([calib_nbytes(v) for v in obj])
+    return sys.getsizeof(obj)
+
+
+class _CalibrationEntry(dict):
+    """
+    Calibrations for one master key in a :class:`CalibrationDict`.
+
+    Reports any change to its parent so that the size of the entry is
+    kept up to date.  Pickled as a plain :obj:`dict`.
+    """
+    def __init__(self, parent, key, data):
+        dict.__init__(self, data)
+        self._parent = parent
+        self._key = key
+
+    def __setitem__(self, master_type, data):
+        dict.__setitem__(self, master_type, data)
+        self._parent._resize(self._key, self)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._parent._resize(self._key, self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class CalibrationDict(MutableMapping):
+    """
+    In-memory cache of the calibrations, keyed by master key, with a
+    memory limit.
+
+    The cache behaves as the :obj:`dict` of dictionaries used by
+    :attr:`pypeit.calibrations.Calibrations.calib_dict`; e.g.
+    ``calib_dict['A_1_01']['arc']``.  The memory used by each master key
+    is tracked as its calibrations are added.  When the total exceeds
+    :attr:`max_size`, the least recently used master keys are pickled
+    to a temporary directory and removed from memory; they are read
+    back transparently when accessed again.
+
+    The spilled files belong to the process that created the cache.
+    Worker processes forked from it (see :mod:`pypeit.parallel`) read
+    copies of the spilled entries and never delete those files; the
+    entries they spill themselves are written to files named after
+    their process ID.
+
+    Args:
+        max_size (:obj:`float`, optional):
+            Memory limit in GB.  If None, the memory is not limited.
+        spill_dir (:obj:`str`, optional):
+            Directory for the spilled calibrations.  If None, a
+            temporary directory is created when first needed and
+            removed with this object.
+    """
+    def __init__(self, max_size=None, spill_dir=None):
+        self.max_size = max_size
+        self.spill_dir = spill_dir
+        self._tmpdir = None
+        # Process that owns the spill files
+        self._pid = os.getpid()
+        # In-memory entries in the order of use, and their sizes
+        self._data = OrderedDict()
+        self._sizes = {}
+        # Files with the spilled entries
+        self._spilled = {}
+        # Statistics
+        self.nbytes = 0
+        self.peak_nbytes = 0
+        self.nspill = 0
+        self.nreload = 0
+
+    def __getitem__(self, key):
+        if key in self._spilled:
+            self._reload(key)
+        entry = self._data[key]
+        self._data.move_to_end(key)
+        return entry
+
+    def __setitem__(self, key, data):
+        if key in self._spilled:
+            self._discard(self._spilled.pop(key))
+        self._data[key] = _CalibrationEntry(self, key, data)
+        self._data.move_to_end(key)
+        self._resize(key, self._data[key])
+
+    def __delitem__(self, key):
+        if key in self._spilled:
+            self._discard(self._spilled.pop(key))
+            return
+        del self._data[key]
+        self.nbytes -= self._sizes.pop(key)
+
+    def __contains__(self, key):
+        return key in self._data or key in self._spilled
+
+    def __iter__(self):
+        return iter(list(self._data.keys()) + list(self._spilled.keys()))
+
+    def __len__(self):
+        return len(self._data) + len(self._spilled)
+
+    def _resize(self, key, entry):
+        """
+        Update the size of an entry and spill the least recently used
+        entries if the memory limit is exceeded.
+        """
+        if self._data.get(key) is not entry:
+            # Entry no longer held in memory
+            return
+        size = calib_nbytes(dict(entry))
+        self.nbytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+        if self.max_size is None:
+            return
+        budget = self.max_size*1024**3
+        for _key in list(self._data.keys()):
+            if self.nbytes <= budget:
+                break
+            # Never spill the entry being used
+            if _key != key:
+                self._spill(_key)
+
+    def _is_owner(self):
+        """Return True if called by the process that owns the spill files."""
+        return os.getpid() == self._pid and not parallel.in_worker()
+
+    def _discard(self, _file):
+        """Remove a spill file, unless it belongs to another process."""
+        if self._is_owner():
+            os.remove(_file)
+
+    def _spill(self, key):
+        """Pickle an entry to disk and remove it from memory."""
+        if self.spill_dir is None and self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='pypeit_calib_')
+            weakref.finalize(self, shutil.rmtree, self._tmpdir, ignore_errors=True)
+        spill_dir = self._tmpdir if self.spill_dir is None else self.spill_dir
+        if not os.path.isdir(spill_dir):
+            os.makedirs(spill_dir)
+        self._spilled[key] = os.path.join(spill_dir, '{0}.pkl'.format(key) if self._is_owner()
+                                                     else '{0}.{1}.pkl'.format(key, os.getpid()))
+        msgs.info('Moving calibrations for {0} from memory to {1}'.format(key,
+                                                                         self._spilled[key]))
+        with open(self._spilled[key], 'wb') as f:
+            pickle.dump(dict(self._data.pop(key)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.nbytes -= self._sizes.pop(key)
+        self.nspill += 1
+
+    def spill_all(self):
+        """Move all the calibrations held in memory to disk."""
+        for key in list(self._data.keys()):
+            self._spill(key)
+
+    def _reload(self, key):
+        """Read a spilled entry back into memory."""
+        _file = self._spilled.pop(key)
+        with open(_file, 'rb') as f:
+            data = pickle.load(f)
+        # Files spilled by the calling process are left in place for the
+        # other workers and the calling process itself
+        self._discard(_file)
+        self.nreload += 1
+        self[key] = data
+
+    def stats(self):
+        """
+        Return the statistics of the cache.
+
+        Returns:
+            :obj:`dict`: The number of master keys in memory and on
+            disk, the current and peak memory used in GB, and the
+            number of times entries have been spilled to and reloaded
+            from disk.
+        """
+        return dict(in_memory=len(self._data), on_disk=len(self._spilled),
+                    memory=self.nbytes/1024**3, peak_memory=self.peak_nbytes/1024**3,
+                    spilled=self.nspill, reloaded=self.nreload)
+
+    def report(self):
+        """Print the statistics of the cache."""
+        stats = self.stats()
+        msgs.info('Calibrations in memory: {0} ({1:.2f} GB; peak {2:.2f} GB'.format(
+                  stats['in_memory'], stats['memory'], stats['peak_memory'])
+                  + ('' if self.max_size is None else ', limit {0:.2f} GB'.format(self.max_size))
+                  + '); on disk: {0}; spilled {1} and reloaded {2} times.'.format(
+                  stats['on_disk'], stats['spilled'], stats['reloaded']))
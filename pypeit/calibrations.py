@@ -15,6 +15,7 @@ from IPython import embed
 
 from pypeit import msgs
 from pypeit import masterframe
+from pypeit import calibcache
 from pypeit import arcimage
 from pypeit import biasframe
 from pypeit import flatfield
@@ -40,7 +41,16 @@ class Calibrations(object):
 
     To avoid rebuilding MasterFrames that were generated during this execution
     of PypeIt, the class performs book-keeping of these master frames and
-    holds that info in self.calib_dict
+    holds that info in self.calib_dict, a
+    :class:`pypeit.calibcache.CalibrationDict` limited to
+    `par['memory_limit']`.
+
+    If `par['cachedir']` is set, the bias, arc, slits, wavelength
+    calibration, tilts, and flats are also saved to and reused from a
+    persistent :class:`pypeit.calibcache.CalibrationCache`, keyed by
+    the raw files, parameters, and calibrations used to build them.
+    Calibrations found in this cache are not written again as
+    MasterFrames.
 
     Args:
         fitstbl (:class:`pypeit.metadata.PypeItMetaData`):
@@ -77,6 +87,11 @@ class Calibrations(object):
         redux_path
         master_dir
         calib_dict
+        cache (:class:`pypeit.calibcache.CalibrationCache`):
+            Persistent calibration cache; None if not used.
+        cache_keys (:obj:`dict`):
+            Keys in :attr:`cache` of the calibrations of the current
+            frame and detector.
         det
         frame (:obj:`int`):
             0-indexed row of the frame being calibrated in
@@ -136,8 +151,13 @@ class Calibrations(object):
         if self.write_qa and not os.path.isdir(os.path.join(self.qa_path, 'PNGs')):
             os.makedirs(os.path.join(self.qa_path, 'PNGs'))
 
+        # Persistent cache
+        self.cache = None if self.par['cachedir'] is None \
+                        else calibcache.CalibrationCache(self.par['cachedir'],
+                                                         max_size=self.par['cache_size'])
+
         # Attributes
-        self.calib_dict = {}
+        self.calib_dict = calibcache.CalibrationDict(max_size=self.par['memory_limit'])
         self.det = None
         self.frame = None
         self.binning = None
@@ -162,14 +182,18 @@ class Calibrations(object):
         self.msbias = None
         self.msbpm = None
         self.mstrace = None
+        self.traceImage = None
+        self.traceSlits = None
         self.tslits_dict = None
         self.wavecalib = None
+        self.waveTilts = None
         self.tilts_dict = None
         self.mspixelflat = None
         self.msillumflat = None
         self.mswave = None
         self.calib_ID = None
         self.master_key_dict = {}
+        self.cache_keys = {}
 
     def _update_cache(self, master_key, master_type, data):
         """
@@ -235,6 +259,67 @@ class Calibrations(object):
         self.calib_dict[master_key][master_type] = {}
         return False
 
+    def _cache_key(self, master_type, files=None, par=None, depends=None, **kwargs):
+        """
+        Construct and record the key of a calibration in :attr:`cache`.
+
+        The key includes the spectrograph, the detector, and the keys
+        of the calibrations in `depends`; see
+        :func:`pypeit.calibcache.CalibrationCache.key` for the other
+        arguments.
+
+        Returns:
+            :obj:`str`: The key, also saved to :attr:`cache_keys`.
+            None if the cache is not used.
+        """
+        if self.cache is None:
+            return None
+        _depends = [] if depends is None else [self.cache_keys.get(d) for d in depends]
+        self.cache_keys[master_type] \
+                = self.cache.key(master_type, files=files, par=par, depends=_depends,
+                                 spectrograph=self.spectrograph.spectrograph, det=self.det,
+                                 **kwargs)
+        return self.cache_keys[master_type]
+
+    def _chk_master_obj(self, obj, master_type):
+        """
+        Check that a MasterFrame object has been built for the current
+        master key of a calibration.
+
+        Args:
+            obj (:obj:`str`):
+                Name of the attribute with the object.
+            master_type (:obj:`str`):
+                Key in :attr:`master_key_dict` with the master key of
+                the calibration.
+
+        Returns:
+            bool: True if the object exists and has the current master
+            key.
+        """
+        _obj = getattr(self, obj, None)
+        return _obj is not None and master_type in self.master_key_dict \
+                    and _obj.master_key == self.master_key_dict[master_type]
+
+    def _load_cache(self, master_type):
+        """
+        Load a calibration from :attr:`cache`.
+
+        Returns:
+            object: The cached data, or None if the cache is not used
+            or the data is not cached.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.load(master_type, self.cache_keys[master_type])
+
+    def _save_cache(self, master_type, data):
+        """
+        Save a calibration to :attr:`cache`, if used.
+        """
+        if self.cache is not None:
+            self.cache.save(self.cache_keys[master_type], data)
+
     def set_config(self, frame, det, par=None):
         """
         Specify the parameters of the Calibrations class and reset all
@@ -285,6 +370,8 @@ class Calibrations(object):
         self.master_key_dict['arc'] \
                 = self.fitstbl.master_key(arc_rows[0] if len(arc_rows) > 0 else self.frame,
                                           det=self.det)
+        self._cache_key('arc', files=self.arc_files, par=self.par['arcframe'],
+                        depends=['bias', 'bpm'])
 
         if self._cached('arc', self.master_key_dict['arc']):
             # Previously calculated
@@ -301,9 +388,16 @@ class Calibrations(object):
 
         # Load the MasterFrame (if it exists and is desired)?
         self.msarc = self.arcImage.load()
-        if self.msarc is None:  # Otherwise build it
-            msgs.info("Preparing a master {0:s} frame".format(self.arcImage.frametype))
-            self.msarc = self.arcImage.build_image(bias=self.msbias, bpm=self.msbpm)
+        if self.msarc is None:
+            # Previously calculated by another PypeIt run?
+            cached = self._load_cache('arc')
+            if cached is not None:
+                self.arcImage.image, = cached
+                self.msarc = self.arcImage.image
+            else:  # Otherwise build it
+                msgs.info("Preparing a master {0:s} frame".format(self.arcImage.frametype))
+                self.msarc = self.arcImage.build_image(bias=self.msbias, bpm=self.msbpm)
+                self._save_cache('arc', (self.msarc,))
             # Save to Masters
             if self.save_masters:
                 self.arcImage.save()
@@ -335,6 +429,8 @@ class Calibrations(object):
                 = self.fitstbl.master_key(bias_rows[0] if len(bias_rows) > 0 else self.frame,
                                           det=self.det)
 
+        self._cache_key('bias', files=self.bias_files, par=self.par['biasframe'])
+
         # Grab from internal dict (or hard-drive)?
         if self._cached('bias', self.master_key_dict['bias']):
             self.msbias = self.calib_dict[self.master_key_dict['bias']]['bias']
@@ -351,8 +447,16 @@ class Calibrations(object):
         # Try to load the master bias
         self.msbias = self.biasFrame.load()
         if self.msbias is None:
-            # Build it and save it
-            self.msbias = self.biasFrame.build_image()
+            # Grab from the calibration cache?
+            cached = self._load_cache('bias')
+            if cached is not None:
+                self.biasFrame.image, = cached
+                self.msbias = self.biasFrame.image
+            else:
+                # Build it
+                self.msbias = self.biasFrame.build_image()
+                self._save_cache('bias', (self.msbias,))
+            # Save it
             if self.save_masters:
                 self.biasFrame.save()
 
@@ -384,6 +488,9 @@ class Calibrations(object):
 
         if self._cached('bpm', self.master_key_dict['bpm']):
             self.msbpm = self.calib_dict[self.master_key_dict['bpm']]['bpm']
+            # The mask is cheap to build and is not cached on disk;
+            # the calibrations that use it depend on its contents
+            self._cache_key('bpm', data=self.msbpm)
             return self.msbpm
 
         # Build the data-section image
@@ -401,6 +508,7 @@ class Calibrations(object):
         self.msbpm = self.spectrograph.bpm(shape=self.shape, filename=sci_image_file, det=self.det)
 
         # Record it
+        self._cache_key('bpm', data=self.msbpm)
         self._update_cache('bpm', 'bpm', self.msbpm)
         # Return
         return self.msbpm
@@ -458,6 +566,12 @@ class Calibrations(object):
         self.master_key_dict['flat'] \
                 = self.fitstbl.master_key(pixflat_rows[0] if len(pixflat_rows) > 0 else self.frame,
                                           det=self.det)
+        # Include a user-supplied flat in the key
+        user_flat = [self.par['flatfield']['frame']] \
+                        if os.path.isfile(self.par['flatfield']['frame']) else []
+        self._cache_key('flat', files=pixflat_image_files+user_flat,
+                        par=[self.par['pixelflatframe'], self.par['flatfield']],
+                        depends=['bias', 'trace', 'wavecalib', 'tilts'])
 
         # Return already generated data
         if self._cached('pixelflat', self.master_key_dict['flat']) \
@@ -505,9 +619,27 @@ class Calibrations(object):
 
         # 3) there is no master or no user supplied flat, generate the flat
         if self.mspixelflat is None and len(pixflat_image_files) != 0:
-            # Run
-            self.mspixelflat, self.msillumflat = self.flatField.run(show=self.show,
-                                                                    maskslits=self.tslits_dict['maskslits'])
+            # Use data generated by another PypeIt run?
+            cached = self._load_cache('flat')
+            if cached is not None:
+                self.flatField.rawflatimg, self.flatField.mspixelflat, \
+                        self.flatField.msillumflat, tslits_dict, tilts_dict = cached
+                self.mspixelflat = self.flatField.mspixelflat
+                self.msillumflat = self.flatField.msillumflat
+                if tslits_dict is not None:
+                    # Slit boundaries tweaked by the flat
+                    self.flatField.tslits_dict = tslits_dict
+                    self.flatField.tilts_dict = tilts_dict
+            else:
+                # Run
+                self.mspixelflat, self.msillumflat \
+                        = self.flatField.run(show=self.show,
+                                             maskslits=self.tslits_dict['maskslits'])
+                tweaked = self.par['flatfield']['tweak_slits']
+                self._save_cache('flat', (self.flatField.rawflatimg, self.mspixelflat,
+                                          self.msillumflat,
+                                          self.flatField.tslits_dict if tweaked else None,
+                                          self.flatField.tilts_dict if tweaked else None))
 
             # If we tweaked the slits, update the tilts_dict and
             # tslits_dict to reflect new slit edges
@@ -523,17 +655,24 @@ class Calibrations(object):
                 # If we tweaked the slits update the master files for tilts and slits
                 # TODO: These should be saved separately
                 if self.par['flatfield']['tweak_slits']:
-                    msgs.info('Updating MasterTrace and MasterTilts using tweaked slit boundaries')
-                    # Add tweaked boundaries to the MasterTrace file
-                    self.traceSlits.tslits_dict = self.flatField.tslits_dict
-                    try:
-                        self.traceSlits.save(traceImage=self.traceImage)
-                    except:
-                        self.traceSlits.save(traceImage=self.mstrace)
-                    # Write the final_tilts using the new slit boundaries to the MasterTilts file
-                    self.waveTilts.final_tilts = self.flatField.tilts_dict['tilts']
-                    self.waveTilts.tilts_dict = self.flatField.tilts_dict
-                    self.waveTilts.save()
+                    # The TraceSlits and WaveTilts objects are not built
+                    # when the slits and tilts are found in memory
+                    if not self._chk_master_obj('traceSlits', 'trace') \
+                            or not self._chk_master_obj('waveTilts', 'arc'):
+                        msgs.warn('Slits or tilts were reused from memory; MasterTrace and '
+                                  'MasterTilts are not updated with the tweaked slit boundaries.')
+                    else:
+                        msgs.info('Updating MasterTrace and MasterTilts using tweaked slit '
+                                  'boundaries')
+                        # Add tweaked boundaries to the MasterTrace file
+                        self.traceSlits.tslits_dict = self.flatField.tslits_dict
+                        self.traceSlits.save(traceImage=self.mstrace if self.traceImage is None
+                                                            else self.traceImage)
+                        # Write the final_tilts using the new slit boundaries to the MasterTilts
+                        # file
+                        self.waveTilts.final_tilts = self.flatField.tilts_dict['tilts']
+                        self.waveTilts.tilts_dict = self.flatField.tilts_dict
+                        self.waveTilts.save()
 
         # 4) If either of the two flats are still None, use unity
         # everywhere and print out a warning
@@ -584,6 +723,9 @@ class Calibrations(object):
         self.master_key_dict['trace'] \
                 = self.fitstbl.master_key(trace_rows[0] if len(trace_rows) > 0 else self.frame,
                                           det=self.det)
+        self._cache_key('trace', files=self.trace_image_files,
+                        par=[self.par['traceframe'], self.par['slits']], depends=['bias', 'bpm'],
+                        binning=self.binning)
 
         # Return already generated data
         if self._cached('trace', self.master_key_dict['trace']) and not redo:
@@ -598,7 +740,15 @@ class Calibrations(object):
 
         # Load the MasterFrame (if it exists and is desired)?
         self.tslits_dict, _ = self.traceSlits.load()
-        if self.tslits_dict is None:
+
+        # Use data generated by another PypeIt run?
+        cached = None if self.tslits_dict is not None or redo else self._load_cache('trace')
+        if cached is not None:
+            self.tslits_dict, self.mstrace = cached
+            self.traceSlits.tslits_dict = self.tslits_dict
+            if self.save_masters:
+                self.traceSlits.save(traceImage=self.mstrace)
+        elif self.tslits_dict is None:
             # Build the trace image
             self.traceImage = traceimage.TraceImage(self.spectrograph,
                                                     files=self.trace_image_files, det=self.det,
@@ -642,10 +792,11 @@ class Calibrations(object):
             # Save to disk
             if self.save_masters:
                 self.traceSlits.save(traceImage=self.traceImage)
+            self._save_cache('trace', (self.tslits_dict, self.traceImage.image))
 
         # Save, initialize maskslits, and return
-        # TODO: We're not caching self.mstrace.  And actually there is
-        # no mstrace in Calibrations anymore; only in TraceSlits?
+        # TODO: Is there any mstrace in Calibrations anymore; only in
+        # TraceSlits?
         self._update_cache('trace', 'trace', self.tslits_dict)
         return self.tslits_dict
 
@@ -721,6 +872,7 @@ class Calibrations(object):
         self._chk_set(['det', 'calib_ID', 'par'])
         if 'arc' not in self.master_key_dict.keys():
             msgs.error('Arc master key not set.  First run get_arc.')
+        self._cache_key('wavecalib', par=self.par['wavelengths'], depends=['arc', 'trace', 'bpm'])
 
         # Return existing data
         if self._cached('wavecalib', self.master_key_dict['arc']) \
@@ -752,8 +904,15 @@ class Calibrations(object):
                                              qa_path=self.qa_path, msbpm=self.msbpm)
         # Load from disk (MasterFrame)?
         self.wv_calib = self.waveCalib.load()
-        if self.wv_calib is None:
-            self.wv_calib, _ = self.waveCalib.run(skip_QA=(not self.write_qa))
+        loaded, cached = self.wv_calib is not None, None
+        if not loaded:
+            # Use data generated by another PypeIt run?
+            cached = self._load_cache('wavecalib')
+            if cached is not None:
+                self.wv_calib, self.wv_maskslits = cached
+                self.waveCalib.wv_calib = self.wv_calib
+            else:
+                self.wv_calib, _ = self.waveCalib.run(skip_QA=(not self.write_qa))
             # Save to Masters
             if self.save_masters:
                 self.waveCalib.save()
@@ -763,7 +922,10 @@ class Calibrations(object):
         # master frame file.  As it is, if not loaded from the master
         # frame file, mask_maskslits is run twice, once in run above and
         # once here...
-        self.wv_maskslits = self.waveCalib.make_maskslits(self.tslits_dict['slit_left'].shape[1])
+        if cached is None:
+            self.wv_maskslits = self.waveCalib.make_maskslits(self.tslits_dict['slit_left'].shape[1])
+            if not loaded:
+                self._save_cache('wavecalib', (self.wv_calib, self.wv_maskslits))
         self.tslits_dict['maskslits'] += self.wv_maskslits
 
         # Save & return
@@ -796,6 +958,8 @@ class Calibrations(object):
         self._chk_set(['det', 'calib_ID', 'par'])
         if 'arc' not in self.master_key_dict.keys():
             msgs.error('Arc master key not set.  First run get_arc.')
+        self._cache_key('tilts', par=[self.par['tilts'], self.par['wavelengths']],
+                        depends=['arc', 'trace', 'wavecalib', 'bpm'])
 
         # Return existing data
         if self._cached('tilts_dict', self.master_key_dict['arc']) \
@@ -815,10 +979,17 @@ class Calibrations(object):
         # Master
         self.tilts_dict = self.waveTilts.load()
         if self.tilts_dict is None:
-            # TODO still need to deal with syntax for LRIS ghosts. Maybe we don't need it
-            self.tilts_dict, self.wt_maskslits \
-                    = self.waveTilts.run(maskslits=self.tslits_dict['maskslits'], doqa=self.write_qa,
-                                         show=self.show)
+            # Use data generated by another PypeIt run?
+            cached = self._load_cache('tilts')
+            if cached is not None:
+                self.tilts_dict, self.wt_maskslits = cached
+                self.waveTilts.tilts_dict = self.tilts_dict
+            else:
+                # TODO still need to deal with syntax for LRIS ghosts. Maybe we don't need it
+                self.tilts_dict, self.wt_maskslits \
+                        = self.waveTilts.run(maskslits=self.tslits_dict['maskslits'],
+                                             doqa=self.write_qa, show=self.show)
+                self._save_cache('tilts', (self.tilts_dict, self.wt_maskslits))
             if self.save_masters:
                 self.waveTilts.save()
         else:
@@ -881,7 +881,8 @@ def extract_coadd2d(stack_dict, master_dir, det, samp_fact = 1.0,ir_redux=False,
 
 # TODO make weights optional and do uniform weighting without.
 def weighted_combine(weights, sci_list, var_list, inmask_stack,
-                     sigma_clip=False, sigma_clip_stack = None, sigrej=None, maxiters=5):
+                     sigma_clip=False, sigma_clip_stack = None, sigrej=None, maxiters=5,
+                     block_size=None):
     """
 
     Args:
@@ -914,6 +915,12 @@ def weighted_combine(weights, sci_list, var_list, inmask_stack,
             on the numberr of images provided.
         maxiters:
             Maximum number of iterations for sigma clipping using astropy.stats.SigmaClip
+        block_size: float, default = None
+            Maximum size in MB of the block of the image stacks that is combined at once. The stacks are
+            combined in blocks of spectral rows, such that they can be memory-mapped arrays (see
+            pypeit.utils.scratch_array) of which only one block is read into memory. Each pixel is
+            combined independently, so the result does not depend on the block size. If None, all the
+            rows are combined at once.
 
     Returns:
         sci_list_out: list
@@ -961,30 +968,47 @@ def weighted_combine(weights, sci_list, var_list, inmask_stack,
                 sigrej = 1.9
             else:
                 sigrej = 2.0
-        # sigma clip if we have enough images
-        # mask_stack > 0 is a masked value. numpy masked arrays are True for masked (bad) values
-        data = np.ma.MaskedArray(sigma_clip_stack, np.invert(inmask_stack))
         sigclip = astropy.stats.SigmaClip(sigma=sigrej, maxiters=maxiters, cenfunc='median')
-        data_clipped = sigclip(data, axis=0, masked=True)
-        mask_stack = np.invert(data_clipped.mask)  # mask_stack = True are good values
     else:
         if sigma_clip and nimgs < 3:
             msgs.warn('Sigma clipping requested, but you cannot sigma clip with less than 3 images. '
                       'Proceeding without sigma clipping')
-        mask_stack = inmask_stack  # mask_stack = True are good values
-
-    nused = np.sum(mask_stack, axis=0)
-    weights_stack = broadcast_weights(weights, shape)
-    weights_mask_stack = weights_stack*mask_stack
-
-    weights_sum = np.sum(weights_mask_stack, axis=0)
-    sci_list_out = []
-    for sci_stack in sci_list:
-        sci_list_out.append(np.sum(sci_stack*weights_mask_stack, axis=0)/(weights_sum + (weights_sum == 0.0)))
-    var_list_out = []
-    for var_stack in var_list:
-        var_list_out.append(np.sum(var_stack * weights_mask_stack**2, axis=0) / (weights_sum + (weights_sum == 0.0))**2)
-    # Was it masked everywhere?
-    outmask = np.any(mask_stack, axis=0)
+        sigclip = None
+
+    # Number of spectral rows in each block
+    nrow = nspec if block_size is None \
+                else int(np.clip(block_size*2**20 // (8*nspat*nimgs), 1, nspec))
+    if nrow < nspec:
+        msgs.info('Combining the images in blocks of {0} rows'.format(nrow))
+
+    sci_list_out = [np.zeros((nspec, nspat), dtype=np.result_type(sci_stack, weights))
+                        for sci_stack in sci_list]
+    var_list_out = [np.zeros((nspec, nspat), dtype=np.result_type(var_stack, weights))
+                        for var_stack in var_list]
+    outmask = np.zeros((nspec, nspat), dtype=bool)
+    nused = np.zeros((nspec, nspat), dtype=int)
+    for start in range(0, nspec, nrow):
+        rows = slice(start, min(start+nrow, nspec))
+        if sigclip is not None:
+            # sigma clip if we have enough images
+            # mask_stack > 0 is a masked value. numpy masked arrays are True for masked (bad) values
+            data = np.ma.MaskedArray(sigma_clip_stack[:,rows], np.invert(inmask_stack[:,rows]))
+            data_clipped = sigclip(data, axis=0, masked=True)
+            mask_stack = np.invert(data_clipped.mask)  # mask_stack = True are good values
+        else:
+            mask_stack = inmask_stack[:,rows]  # mask_stack = True are good values
+
+        nused[rows] = np.sum(mask_stack, axis=0)
+        weights_stack = broadcast_weights(weights if weights.ndim == 1 else weights[:,rows],
+                                          mask_stack.shape)
+        weights_mask_stack = weights_stack*mask_stack
+
+        weights_sum = np.sum(weights_mask_stack, axis=0)
+        for sci_out, sci_stack in zip(sci_list_out, sci_list):
+            sci_out[rows] = np.sum(sci_stack[:,rows]*weights_mask_stack, axis=0)/(weights_sum + (weights_sum == 0.0))
+        for var_out, var_stack in zip(var_list_out, var_list):
+            var_out[rows] = np.sum(var_stack[:,rows] * weights_mask_stack**2, axis=0) / (weights_sum + (weights_sum == 0.0))**2
+        # Was it masked everywhere?
+        outmask[rows] = np.any(mask_stack, axis=0)
 
     return sci_list_out, var_list_out, outmask, nused
@@ -7,10 +7,16 @@ from pypeit import msgs
 
 def comb_frames(frames_arr, saturation=None,
                      maskvalue=1048577, method='weightmean', satpix='reject', cosmics=None,
-                     n_lohi=[0,0], sig_lohi=[3.,3.], replace='maxnonsat'):
+                     n_lohi=[0,0], sig_lohi=[3.,3.], replace='maxnonsat', block_size=None):
     """
     Combine several frames
 
+    The frames are combined in blocks of rows, each block being
+    rejected and combined independently.  Because all the rejection
+    and combination steps operate on the stack of values of each
+    pixel, the result does not depend on the size of the block; only
+    the peak memory does.
+
     .. todo::
         - Make better use of np.ma.MaskedArray objects throughout?
         - More testing of replacement code necessary?
@@ -18,8 +24,12 @@ def comb_frames(frames_arr, saturation=None,
 
     Parameters
     ----------
-    frames_arr : ndarray (3D)
-      Array of frames to be combined
+    frames_arr : ndarray (3D), list
+      Array of frames to be combined, with the frames along the last
+      axis, or a list with the 2D frames.  The frames in the list can
+      be any array-like object that can be sliced along its first axis
+      (e.g. a `numpy.memmap`); only the rows in the block being combined
+      are read into memory.
     weights : str, or None (optional)
       How should the frame combination by weighted (not currently
       implemented)
@@ -33,6 +43,9 @@ def comb_frames(frames_arr, saturation=None,
       Method for handling saturated pixels
     saturation : float, optional
       Saturation value;  only required for some choices of reject['replace']
+    block_size : float, optional
+      Maximum size in MB of the block of the stacked frames that is
+      combined at once.  If None, all the rows are combined at once.
 
     Returns
     -------
@@ -44,11 +57,16 @@ def comb_frames(frames_arr, saturation=None,
     # Was printtype specified
     if frames_arr is None:
         msgs.error("No frames were given to comb_frames to combine")
-    (sz_x, sz_y, num_frames) = np.shape(frames_arr)
+    stacked = isinstance(frames_arr, np.ndarray)
+    if stacked:
+        (sz_x, sz_y, num_frames) = np.shape(frames_arr)
+    else:
+        num_frames = len(frames_arr)
+        (sz_x, sz_y) = np.shape(frames_arr[0])
     if num_frames == 1:
         msgs.info("Only one frame to combine!")
         msgs.info("Returning input frame")
-        return frames_arr[:, :, 0]
+        return frames_arr[:, :, 0] if stacked else np.asarray(frames_arr[0])
     else:
         msgs.info("Combining {0:d} frames".format(num_frames))
 
@@ -61,6 +79,67 @@ def comb_frames(frames_arr, saturation=None,
                    + msgs.newline() + 'There are {0:d} frames '.format(num_frames)
                    + 'and n_lohi will reject {0:d} low and {1:d} high values.'.format(
                                                                 n_lohi[0], n_lohi[1]))
+    if replace not in ['min', 'max', 'mean', 'median', 'weightmean', 'maxnonsat']:
+        msgs.error("You must specify what to do in case all pixels are rejected")
+    if satpix not in ['force', 'reject', 'nothing']:
+        msgs.error('Option \'{0}\' '.format(satpix)
+                   + 'for dealing with saturated pixels was not recognised.')
+    if method not in ['mean', 'median', 'weightmean']:
+        msgs.error("Combination type '{0:s}' is unknown".format(method))
+
+    # Report the steps
+    msgs.info("Finding saturated and non-linear pixels")
+    msgs.info("Rejecting cosmic rays" if cosmics is not None and cosmics > 0.0
+              else "Not rejecting cosmic rays")
+    if n_lohi[0] > 0 or n_lohi[1] > 0:
+        msgs.info("Rejecting {0:d} deviant low and {1:d} deviant high pixels".format(*n_lohi))
+    else:
+        msgs.info("Not rejecting any low/high pixels")
+    msgs.info("Rejecting deviant pixels" if sig_lohi[0] > 0.0 or sig_lohi[1] > 0.0
+              else "Not rejecting deviant pixels")
+    msgs.info("Combining frames with a {0:s} operation".format(method))
+    msgs.info("Replacing completely masked pixels with the {0:s} value of the input frames".format(replace))
+
+    # Number of rows in each block
+    nrow = sz_x if block_size is None \
+                else int(np.clip(block_size*2**20 // (8*sz_y*num_frames), 1, sz_x))
+    if nrow < sz_x:
+        msgs.info('Combining the frames in blocks of {0} rows'.format(nrow))
+
+    # Combine each block
+    comb_frame = np.empty((sz_x, sz_y), dtype=np.float)
+    for start in range(0, sz_x, nrow):
+        end = min(start+nrow, sz_x)
+        block = np.asarray(frames_arr[start:end], dtype=np.float) if stacked \
+                    else np.stack([np.asarray(f[start:end], dtype=np.float)
+                                        for f in frames_arr], axis=2)
+        comb_frame[start:end] = _comb_block(block, saturation, maskvalue, method, satpix,
+                                            cosmics, n_lohi, sig_lohi, replace)
+        del block
+
+    ##############
+    # And return a 2D numpy array
+    msgs.info("{0:d} frames combined successfully!".format(num_frames))
+    return comb_frame
+
+
+def _comb_block(frames_arr, saturation, maskvalue, method, satpix, cosmics, n_lohi, sig_lohi,
+                replace):
+    """
+    Reject pixels in and combine a block of stacked frames.
+
+    The options are the same as for :func:`comb_frames`, which also
+    checks them.  The input array is modified.
+
+    Args:
+        frames_arr (`numpy.ndarray`_):
+            Block of frames to combine, with the frames along the last
+            axis.
+
+    Returns:
+        `numpy.ndarray`_: The combined block.
+    """
+    (sz_x, sz_y, num_frames) = frames_arr.shape
 
     # Calculate the values to be used if all frames are rejected in some pixels
     if replace == 'min':
@@ -73,41 +152,24 @@ def comb_frames(frames_arr, saturation=None,
         allrej_arr = np.median(frames_arr, axis=2)
     elif replace == 'weightmean':
         msgs.work("No weights are implemented yet")
-        allrej_arr = frames_arr.copy()
-        allrej_arr = masked_weightmean(allrej_arr, maskvalue)
+        allrej_arr = masked_weightmean(frames_arr, maskvalue)
     elif replace == 'maxnonsat':
-        allrej_arr = frames_arr.copy()
-        allrej_arr = maxnonsat(allrej_arr, saturation)
-    else:
-        msgs.error("You must specify what to do in case all pixels are rejected")
+        allrej_arr = maxnonsat(frames_arr, saturation)
 
     ################
     # Saturated Pixels
-    msgs.info("Finding saturated and non-linear pixels")
     if satpix == 'force':
         # If a saturated pixel is in one of the frames, force them to
         # all have saturated pixels
-#		satw = np.zeros_like(frames_arr)
-#		satw[np.where(frames_arr > settings.spect['det']['saturation']*settings.spect['det']['nonlinear'])] = 1.0
-#		satw = np.any(satw,axis=2)
-#		del satw
-        setsat = np.zeros_like(frames_arr)
-        setsat[frames_arr > saturation] = 1
+        setsat = np.any(frames_arr > saturation, axis=2)
     elif satpix == 'reject':
         # Ignore saturated pixels in frames if possible
         frames_arr[frames_arr > saturation] = maskvalue
-    elif satpix == 'nothing':
-        # Don't do anything special for saturated pixels (Hopefully the
-        # user has specified how to deal with them below!)
-        pass
-    else:
-        msgs.error('Option \'{0}\' '.format(satpix)
-                   + 'for dealing with saturated pixels was not recognised.')
 
     ################
     # Cosmic Rays
-    if cosmics > 0.0:
-        msgs.info("Rejecting cosmic rays")  # Use a robust statistic
+    if cosmics is not None and cosmics > 0.0:
+        # Use a robust statistic
         masked_fa = np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue)
         medarr = np.ma.median(masked_fa, axis=2)
         stdarr = 1.4826*np.ma.median(np.ma.absolute(masked_fa - medarr[:,:,None]), axis=2)
@@ -116,8 +178,6 @@ def comb_frames(frames_arr, saturation=None,
         frames_arr[indx] = maskvalue
         # Delete unecessary arrays
         del medarr, stdarr
-    else:
-        msgs.info("Not rejecting cosmic rays")
 
     ################
     # Low and High pixel rejection --- Masks *additional* pixels
@@ -126,32 +186,25 @@ def comb_frames(frames_arr, saturation=None,
 
         # First reject low pixels
         frames_arr = np.sort(frames_arr, axis=2)
-        if n_lohi[0] > 0:
-            msgs.info("Rejecting {0:d} deviant low pixels".format(n_lohi[0]))
-            while rejlo > 0:
-                xi, yi = np.indices(sz_x, sz_y)
-                frames_arr[xi, yi, np.argmin(frames_arr, axis=2)] = maskvalue
-                del xi, yi
-                rejlo -= 1
+        xi, yi = np.indices((sz_x, sz_y))
+        while rejlo > 0:
+            frames_arr[xi, yi, np.argmin(frames_arr, axis=2)] = maskvalue
+            rejlo -= 1
 
         # Now reject high pixels
         if n_lohi[1] > 0:
-            msgs.info("Rejecting {0:d} deviant high pixels".format(n_lohi[1]))
-            frames_arr[np.where(frames_arr == maskvalue)] *= -1
+            frames_arr[frames_arr == maskvalue] *= -1
             while rejhi > 0:
-                xi, yi = np.indices(sz_x, sz_y)
                 frames_arr[xi, yi, np.argmax(frames_arr, axis=2)] = -maskvalue
-                del xi, yi
                 rejhi -= 1
-            frames_arr[np.where(frames_arr) == -maskvalue] *= -1
+            frames_arr[frames_arr == -maskvalue] *= -1
+        del xi, yi
 
 # TODO: Do we need this?
 # The following is an example of *not* masking additional pixels
 #		if reject['lowhigh'][1] > 0:
 #			msgs.info("Rejecting {0:d} deviant high pixels".format(reject['lowhigh'][1]))
 #			masktemp[:,:,-reject['lowhigh'][0]:] = True
-    else:
-        msgs.info("Not rejecting any low/high pixels")
 
     ################
     # Deviant Pixels
@@ -159,8 +212,7 @@ def comb_frames(frames_arr, saturation=None,
     # just selects if cosmics should be used.  Is this intentional?  Why
     # not just do: `if cosmics > 0:`?
     if sig_lohi[0] > 0.0 or sig_lohi[1] > 0.0:
-        msgs.info("Rejecting deviant pixels")  # Use a robust statistic
-
+        # Use a robust statistic
         masked_fa = np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue)
         medarr = np.ma.median(masked_fa, axis=2)
         stdarr = 1.4826*np.ma.median(np.ma.absolute(masked_fa - medarr[:,:,None]), axis=2)
@@ -171,25 +223,20 @@ def comb_frames(frames_arr, saturation=None,
 
         # Delete unecessary arrays
         del medarr, stdarr
-    else:
-        msgs.info("Not rejecting deviant pixels")
 
     ##############
     # Combine the arrays
-    msgs.info("Combining frames with a {0:s} operation".format(method))
     if method == 'mean':
-        comb_frame = np.ma.mean(np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue), axis=2)
+        comb_frame = np.ma.mean(np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue),
+                                axis=2).filled(maskvalue)
     elif method == 'median':
-        comb_frame = np.ma.median(np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue), axis=2)
+        comb_frame = np.ma.median(np.ma.MaskedArray(frames_arr, mask=frames_arr==maskvalue),
+                                  axis=2).filled(maskvalue)
     elif method == 'weightmean':
-        comb_frame = frames_arr.copy()
-        comb_frame = masked_weightmean(comb_frame, maskvalue)
-    else:
-        msgs.error("Combination type '{0:s}' is unknown".format(method))
+        comb_frame = masked_weightmean(frames_arr, maskvalue)
 
     ##############
     # If any pixels are completely masked, apply user-specified function
-    msgs.info("Replacing completely masked pixels with the {0:s} value of the input frames".format(replace))
     indx = comb_frame == maskvalue
     comb_frame[indx] = allrej_arr[indx]
     # Delete unecessary arrays
@@ -198,14 +245,8 @@ def comb_frames(frames_arr, saturation=None,
     ##############
     # Apply the saturated pixels:
     if satpix == 'force':
-        msgs.info("Applying saturated pixels to final combined image")
         comb_frame[setsat] = saturation # settings.spect[dnum]['saturation']
 
-    ##############
-    # And return a 2D numpy array
-    msgs.info("{0:d} frames combined successfully!".format(num_frames))
-    # Make sure the returned array is the correct type
-    comb_frame = np.array(comb_frame, dtype=np.float)
     return comb_frame
 
 
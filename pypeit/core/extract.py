@@ -81,80 +81,101 @@ def extract_asymbox2(image,left_in,right_in,ycen = None,weight_image = None):
     22-Apr-2018  Ported to python by Joe Hennawi
     """
 
-    # ToDO it would be nice to avoid this transposing, but I got confused during the IDL port
-    left = left_in.T
-    right = right_in.T
-
-    dim = left.shape
-    ndim = left.ndim
-    if (ndim == 1):
-        nTrace = 1
-        npix = dim[0]
-    else:
-        nTrace = dim[0]
-        npix = dim[1]
+    left = np.asarray(left_in, dtype=float)
+    right = np.asarray(right_in, dtype=float)
 
     if ycen is None:
-        if ndim == 1:
-            ycen_out = np.arange(npix, dtype=int)
-        elif ndim == 2:
-            ycen_out = np.outer(np.ones(nTrace, dtype=int), np.arange(npix, dtype=int))
-        else:
+        if left.ndim not in [1, 2]:
             raise ValueError('trace is not 1 or 2 dimensional')
+        ycen_out = np.arange(left.shape[0], dtype=int)
+        if left.ndim == 2:
+            ycen_out = np.repeat(ycen_out[:,None], left.shape[1], axis=1)
     else:
-        ycen_out = ycen.T
-        ycen_out = np.rint(ycen_out).astype(int)
+        ycen_out = np.rint(ycen).astype(int)
 
     if ((np.size(left) != np.size(ycen_out)) | (np.shape(left) != np.shape(ycen_out))):
         raise ValueError('Number of elements and left of trace and ycen must be equal')
 
-    idims = image.shape
-    nspat = idims[1]
-    nspec = idims[0]
-
-    maxwindow = np.max(right - left)
-    tempx = np.int(maxwindow + 3.0)
-
-    bigleft = np.outer(left[:], np.ones(tempx))
-    bigright = np.outer(right[:], np.ones(tempx))
-    spot = np.outer(np.ones(npix * nTrace), np.arange(tempx)) + bigleft - 1
-    bigy = np.outer(ycen_out[:], np.ones(tempx, dtype='int'))
-
-    fullspot = np.array(np.fmin(np.fmax(np.round(spot + 1) - 1, 0), nspat - 1), int)
-    fracleft = np.fmax(np.fmin(fullspot - bigleft, 0.5), -0.5)
-    fracright = np.fmax(np.fmin(bigright - fullspot, 0.5), -0.5)
-    del bigleft
-    del bigright
-    bool_mask1 = (spot >= -0.5) & (spot < (nspat - 0.5))
-    bool_mask2 = (bigy >= 0) & (bigy <= (nspec - 1))
-    weight = (np.fmin(np.fmax(fracleft + fracright, 0), 1)) * bool_mask1 * bool_mask2
-    del spot
-    del fracleft
-    del fracright
-    bigy = np.fmin(np.fmax(bigy, 0), nspec - 1)
-
-    if weight_image != None:
-        temp = np.array([weight_image[x1, y1] * image[x1, y1] for (x1, y1) in zip(bigy.flatten(), fullspot.flatten())])
-        temp2 = np.reshape(weight.flatten() * temp, (nTrace, npix, tempx))
-        fextract = np.sum(temp2, axis=2)
-        temp_wi = np.array([weight_image[x1, y1] for (x1, y1) in zip(bigy.flatten(), fullspot.flatten())])
-        temp2_wi = np.reshape(weight.flatten() * temp_wi, (nTrace, npix, tempx))
-        f_ivar = np.sum(temp2_wi, axis=2)
+    if np.size(left) == 0:
+        return np.zeros(left.shape, dtype=float)
+
+    windows = _BoxcarWindows(image.shape, left, right, ycen_out)
+    sub = windows.subimage(image)
+    if weight_image is not None:
+        sub_wgt = windows.subimage(weight_image)
+        fextract = windows.integrate(sub_wgt * sub)
+        f_ivar = windows.integrate(sub_wgt)
         fextract = fextract / (f_ivar + (f_ivar == 0)) * (f_ivar > 0)
     else:
-        # Might be more pythonic way to code this. I needed to switch the flattening order in order to get
-        # this to work
-        temp = np.array([image[x1, y1] for (x1, y1) in zip(bigy.flatten(), fullspot.flatten())])
-        temp2 = np.reshape(weight.flatten() * temp, (nTrace, npix, tempx))
-        fextract = np.sum(temp2, axis=2)
+        fextract = windows.integrate(sub)
 
     # IDL version model functionality not implemented yet
     # At the moment I'm not reutnring the f_ivar for the weight_image mode. I'm not sure that this functionality is even
     # ever used
 
-    if(nTrace ==1):
-        fextract = fextract.reshape(npix)
-    return fextract.T
+    return fextract
+
+
+class _BoxcarWindows(object):
+    """
+    Geometry of a set of boxcar windows in an image.
+
+    The image is treated as constant over each pixel, such that the flux
+    between two positions in a row is the difference of the cumulative
+    integral of the row at the two positions.  Only the rows and range
+    of columns covered by the windows are integrated.  The geometry is
+    computed once and can be applied to any number of images with the
+    same shape.
+
+    Args:
+        shape (:obj:`tuple`):
+            Shape of the images, (nspec, nspat).
+        left (`numpy.ndarray`_):
+            Left edge of the windows in floating-point pixels.
+        right (`numpy.ndarray`_):
+            Right edge of the windows, same shape as ``left``.
+        ycen (`numpy.ndarray`_):
+            Integer row of the windows, same shape as ``left``.
+    """
+    def __init__(self, shape, left, right, ycen):
+        nspec, nspat = shape
+
+        # Limit the window to the image; pixels off the image do not
+        # contribute, nor do windows with right < left
+        x1 = np.clip(left, -0.5, nspat - 0.5)
+        x2 = np.fmax(np.clip(right, -0.5, nspat - 0.5), x1)
+        self.onimg = (ycen >= 0) & (ycen <= (nspec - 1))
+
+        # Rows and columns needed
+        self.rows, self.rindx = np.unique(np.clip(ycen, 0, nspec - 1), return_inverse=True)
+        self.rindx = self.rindx.reshape(ycen.shape)
+        self.c1 = min(int(np.floor(np.amax(x2) + 0.5)) + 1, nspat)
+        self.c0 = min(int(np.floor(np.amin(x1) + 0.5)), self.c1 - 1)
+
+        # Pixel and fraction of the pixel at the edges of the windows,
+        # relative to the first column
+        ncol = self.c1 - self.c0
+        u1 = x1 + 0.5 - self.c0
+        u2 = x2 + 0.5 - self.c0
+        self.j1 = np.clip(np.floor(u1).astype(int), 0, ncol - 1)
+        self.j2 = np.clip(np.floor(u2).astype(int), 0, ncol - 1)
+        self.f1 = u1 - self.j1
+        self.f2 = u2 - self.j2
+
+    def subimage(self, img):
+        """Return the rows and columns of an image covered by the windows."""
+        return np.asarray(img)[self.rows,self.c0:self.c1].astype(float)
+
+    def integrate(self, sub):
+        """
+        Integrate a sub-image, or a stack of sub-images along the first
+        axis, within each window.
+        """
+        cumsum = np.zeros(sub.shape[:-1] + (sub.shape[-1]+1,), dtype=float)
+        np.cumsum(sub, axis=-1, out=cumsum[...,1:])
+        return ((cumsum[...,self.rindx,self.j2] + self.f2 * sub[...,self.rindx,self.j2])
+                - (cumsum[...,self.rindx,self.j1] + self.f1 * sub[...,self.rindx,self.j1])) \
+                    * self.onimg
 
 
 def extract_boxcar(image,trace_in, radius_in, ycen = None):
@@ -244,6 +265,62 @@ def extract_boxcar(image,trace_in, radius_in, ycen = None):
 
 
 
+def extract_boxcar_multi(images, trace_in, radius_in, ycen=None):
+    """ Extract the total flux of a set of images within the same boxcar windows. The geometry of the windows is
+    computed only once, and all images are integrated in a single pass, which is faster than calling extract_boxcar
+    for each image when several quantities (flux, variance, masks, etc) are needed for the same objects. The ycen
+    position is optional. If it is not provied, it is assumed to be integers in the spectral direction.
+
+    Parameters
+    ----------
+    images :  list or float ndarray
+        Images to extract from. Either a list of 2-d arrays or a 3-d array, each image with shape (nspec, nspat).
+        Boolean images are converted to floats.
+
+    trace_in :  float ndarray
+        Traces of the regions to be extracted (given as floating pt pixels). This can either be an 2-d  array with shape
+        (nspec, nTrace) array to extract all objects at once, or a 1-d array with shape (nspec) for the case of a
+        single trace.
+
+    radius :  float or ndarray
+        boxcar radius in floating point pixels. This can be either be in put as a scalar or as an array with the same
+        shape as trace_in.
+
+    Optional Parameters
+    -------------------
+    ycen :  float ndarray
+        Y positions corresponding to trace_in (expected as integers). Will be rounded to the nearest integer if floats
+        are provided. This needs to have the same shape as trace_in.
+
+    Returns
+    -------
+    fextract:   ndarray
+        Extracted flux of each image, with shape (nimages,) + trace_in.shape.
+    """
+    trace = np.asarray(trace_in, dtype=float)
+    if np.ndim(radius_in) > 0 and np.shape(radius_in) != trace.shape:
+        raise ValueError('Boxcar radius must a be either an integer, a floating point number, or an ndarray '
+                         'with the same shape and size as trace_in')
+
+    if ycen is None:
+        if trace.ndim not in [1, 2]:
+            raise ValueError('trace is not 1 or 2 dimensional')
+        ycen_out = np.arange(trace.shape[0], dtype=int)
+        if trace.ndim == 2:
+            ycen_out = np.repeat(ycen_out[:,None], trace.shape[1], axis=1)
+    else:
+        ycen_out = np.rint(ycen).astype(int)
+
+    if ((np.size(trace) != np.size(ycen_out)) | (np.shape(trace) != np.shape(ycen_out))):
+        raise ValueError('Number of elements and shape of trace and ycen must be equal')
+
+    if np.size(trace) == 0:
+        return np.zeros((len(images),) + trace.shape, dtype=float)
+
+    windows = _BoxcarWindows(np.shape(images[0]), trace - radius_in, trace + radius_in, ycen_out)
+    return windows.integrate(np.stack([windows.subimage(img) for img in images]))
+
+
 def extract_optimal(sciimg,ivar, mask, waveimg, skyimg, rn2_img, oprof, box_radius, specobj):
 
     """ Calculate the spatial FWHM from an object profile. Utitlit routine for fit_profile
@@ -396,21 +473,19 @@ def extract_optimal(sciimg,ivar, mask, waveimg, skyimg, rn2_img, oprof, box_radi
     specobj.optimal['CHI2'] = chi2            # Reduced chi2 of the model fit for this spectral pixel
 
     # Fill in the boxcar extraction tags
-    flux_box  = extract_boxcar(imgminsky*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    # Denom is computed in case the trace goes off the edge of the image
-    box_denom = extract_boxcar(waveimg*mask > 0.0, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    wave_box  = extract_boxcar(waveimg*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)/(box_denom + (box_denom == 0.0))
     varimg = 1.0/(ivar + (ivar == 0.0))
-    var_box  = extract_boxcar(varimg*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    nvar_box  = extract_boxcar(var_no*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    sky_box  = extract_boxcar(skyimg*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    rn2_box  = extract_boxcar(rn2_img*mask, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
+    # Denom is computed in case the trace goes off the edge of the image
+    flux_box, box_denom, wave_box, var_box, nvar_box, sky_box, rn2_box, pixtot, mask_box \
+            = extract_boxcar_multi([imgminsky*mask, waveimg*mask > 0.0, waveimg*mask, varimg*mask,
+                                    var_no*mask, skyimg*mask, rn2_img*mask, ivar*0 + 1.0,
+                                    ivar*mask == 0.0], specobj.trace_spat, box_radius,
+                                   ycen=specobj.trace_spec)
+    wave_box /= (box_denom + (box_denom == 0.0))
+    # If every pixel is masked then mask the boxcar extraction
+    mask_box = mask_box != pixtot
     rn_posind = (rn2_box > 0.0)
     rn_box = np.zeros(rn2_box.shape,dtype=float)
     rn_box[rn_posind] = np.sqrt(rn2_box[rn_posind])
-    pixtot  = extract_boxcar(ivar*0 + 1.0, specobj.trace_spat,box_radius, ycen = specobj.trace_spec)
-    # If every pixel is masked then mask the boxcar extraction
-    mask_box = (extract_boxcar(ivar*mask == 0.0, specobj.trace_spat,box_radius, ycen = specobj.trace_spec) != pixtot)
 
     bad_box = (wave_box <= 0.0) | (np.isfinite(wave_box) == False) | (box_denom == 0.0)
     # interpolate bad wavelengths over masked pixels
@@ -877,9 +952,11 @@ def fit_profile(image, ivar, waveimg, thismask, spat_img, trace_in, wave, flux,
     si = inside[np.argsort(sigma_x.flat[inside])]
     sr = si[::-1]
 
-    bset, bmask = pydl.iterfit(sigma_x.flat[si],norm_obj.flat[si], invvar = norm_ivar.flat[si],
-                                   nord = 4, bkpt = bkpt, maxiter = 15, upper = 1, lower = 1)
-    mode_fit, _ = bset.value(sigma_x.flat[si])
+    si_basis = pydl.bspline_basis(sigma_x.flat[si])
+    bset, bmask = pydl.iterfit(si_basis.x,norm_obj.flat[si], invvar = norm_ivar.flat[si],
+                                   nord = 4, bkpt = bkpt, maxiter = 15, upper = 1, lower = 1,
+                                   basis=si_basis)
+    mode_fit, _ = bset.value(si_basis.x, basis=si_basis)
     median_fit = np.median(norm_obj[norm_ivar > 0.0])
 
     # TODO I don't follow the logic behind this statement but I'm leaving it for now. If the median is large it is used, otherwise we  user zero???
@@ -2303,24 +2380,29 @@ def ech_objfind(image, ivar, slitmask, slit_left, slit_righ, inmask=None, fof_li
     ivar_box = np.zeros((nspec, norders, nobj))
     mask_box = np.zeros((nspec, norders, nobj))
     SNR_arr = np.zeros((norders, nobj))
-    for iobj in range(nobj):
-        for iord in range(norders):
-            indx = (sobjs_align.ech_objid == uni_obj_id[iobj]) & (sobjs_align.ech_orderindx == iord)
-            spec = sobjs_align[indx][0]
-            thismask = slitmask == iord
-            inmask_iord = inmask & thismask
-            # TODO make the snippet below its own function quick_extraction()
-            box_rad_pix = box_radius/plate_scale_ord[iord]
-            flux_tmp  = extract_boxcar(image*inmask_iord, spec.trace_spat,box_rad_pix, ycen = spec.trace_spec)
-            var_tmp  = extract_boxcar(varimg*inmask_iord, spec.trace_spat,box_rad_pix, ycen = spec.trace_spec)
-            ivar_tmp = utils.calc_ivar(var_tmp)
-            pixtot  = extract_boxcar(ivar*0 + 1.0, spec.trace_spat,box_rad_pix, ycen = spec.trace_spec)
-            mask_tmp = (extract_boxcar(ivar*inmask_iord == 0.0, spec.trace_spat,box_rad_pix, ycen = spec.trace_spec) != pixtot)
-            flux_box[:,iord,iobj] = flux_tmp*mask_tmp
-            ivar_box[:,iord,iobj] = np.fmax(ivar_tmp*mask_tmp,0.0)
-            mask_box[:,iord,iobj] = mask_tmp
-            (mean, med_sn, stddev) = sigma_clipped_stats(flux_box[mask_tmp,iord,iobj]*np.sqrt(ivar_box[mask_tmp,iord,iobj]),
-            sigma_lower=5.0,sigma_upper=5.0)
+    for iord in range(norders):
+        # Extract all the objects on this order at once
+        specs = [sobjs_align[(sobjs_align.ech_objid == uni_obj_id[iobj])
+                             & (sobjs_align.ech_orderindx == iord)][0] for iobj in range(nobj)]
+        thismask = slitmask == iord
+        inmask_iord = inmask & thismask
+        # TODO make the snippet below its own function quick_extraction()
+        box_rad_pix = box_radius/plate_scale_ord[iord]
+        flux_tmp, var_tmp, pixtot, mask_tmp \
+                = extract_boxcar_multi([image*inmask_iord, varimg*inmask_iord, ivar*0 + 1.0,
+                                        ivar*inmask_iord == 0.0],
+                                       np.stack([spec.trace_spat for spec in specs], axis=1),
+                                       box_rad_pix,
+                                       ycen=np.stack([spec.trace_spec for spec in specs], axis=1))
+        ivar_tmp = utils.calc_ivar(var_tmp)
+        mask_tmp = mask_tmp != pixtot
+        flux_box[:,iord,:] = flux_tmp*mask_tmp
+        ivar_box[:,iord,:] = np.fmax(ivar_tmp*mask_tmp,0.0)
+        mask_box[:,iord,:] = mask_tmp
+        for iobj, spec in enumerate(specs):
+            (mean, med_sn, stddev) = sigma_clipped_stats(flux_box[mask_tmp[:,iobj],iord,iobj]
+                                                         * np.sqrt(ivar_box[mask_tmp[:,iobj],iord,iobj]),
+                                                         sigma_lower=5.0,sigma_upper=5.0)
             # ToDO assign this to sobjs_align for use in the extraction
             SNR_arr[iord,iobj] = med_sn
             spec.ech_snr = med_sn
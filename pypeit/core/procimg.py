@@ -1,5 +1,10 @@
 """ Module for image processing core methods
+
+.. _numpy.ndarray: https://docs.scipy.org/doc/numpy/reference/generated/numpy.ndarray.html
+.. _numpy.dtype: https://docs.scipy.org/doc/numpy/reference/generated/numpy.dtype.html
 """
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from scipy import signal, ndimage
 from IPython import embed
@@ -9,14 +14,125 @@ from pypeit import utils
 from pypeit.core import parse
 
 
+def _filter_rows(func, img, halo, nthreads=1, out=None):
+    """
+    Apply a filter to an image in tiles of rows.
+
+    The tiles are padded by ``halo`` rows of the image on either side
+    so that, for a filter whose footprint extends no more than
+    ``halo`` rows from the filtered pixel, the result is identical to
+    filtering the full image.  The tiles are filtered by a pool of
+    threads; the scipy filters release the GIL.
+
+    Args:
+        func (callable):
+            Filter to apply; called as ``func(tile)`` and must return an
+            array with the shape of the tile.
+        img (`numpy.ndarray`_):
+            Image to filter.
+        halo (:obj:`int`):
+            Number of rows on either side of each tile needed to
+            compute the filter.
+        nthreads (:obj:`int`, optional):
+            Number of threads, and tiles, to use.
+        out (`numpy.ndarray`_, optional):
+            Array for the output; must have the shape of ``img``.
+
+    Returns:
+        `numpy.ndarray`_: The filtered image.
+    """
+    ntile = max(min(nthreads, img.shape[0]//(2*halo+1)), 1)
+    if ntile == 1:
+        if out is None:
+            return func(img)
+        out[...] = func(img)
+        return out
+
+    if out is None:
+        out = np.empty_like(img)
+    edges = np.linspace(0, img.shape[0], ntile+1).astype(int)
+
+    def _tile(i):
+        start, end = max(edges[i]-halo, 0), min(edges[i+1]+halo, img.shape[0])
+        out[edges[i]:edges[i+1]] = func(img[start:end])[edges[i]-start:edges[i+1]-start]
+
+    with ThreadPoolExecutor(max_workers=ntile) as executor:
+        list(executor.map(_tile, range(ntile)))
+    return out
+
+
+def _median_filter(img, size, nthreads=1, out=None):
+    """
+    Median filter an image, mirroring at its edges, in tiles of rows
+    processed by separate threads; see :func:`_filter_rows`.
+    """
+    return _filter_rows(lambda x: ndimage.median_filter(x, size=size, mode='mirror'), img,
+                        size//2, nthreads=nthreads, out=out)
+
+
+def _laplacian_plus(img, out=None):
+    r"""
+    Compute the L.A.Cosmic Laplacian of an image.
+
+    In the original algorithm, the image is subsampled by a factor of
+    2, convolved with the Laplacian kernel (with symmetric boundary
+    conditions), clipped at zero, and rebinned to the original size.
+    Each of the 4 subpixels of pixel :math:`x_{i,j}` shares two of its
+    neighbors with the same pixel, such that the convolution of the
+    subpixels reduce to :math:`2x_{i,j} - x_{i\pm1,j} - x_{i,j\pm1}`.
+    This function computes the four combinations directly from the
+    image shifted by one pixel, avoiding the 4 times larger subsampled
+    image.
+
+    Args:
+        img (`numpy.ndarray`_):
+            Image to convolve.
+        out (`numpy.ndarray`_, optional):
+            Array for the output; must have the shape and type of
+            ``img``.
+
+    Returns:
+        `numpy.ndarray`_: The positive part of the Laplacian of the
+        image, averaged over the four subpixels.
+    """
+    padded = np.pad(img, 1, mode='edge')
+    vert = [padded[:-2,1:-1], padded[2:,1:-1]]
+    horz = [padded[1:-1,:-2], padded[1:-1,2:]]
+    twice = 2*img
+    if out is None:
+        out = np.empty_like(img)
+    out[...] = 0.
+    tmp = np.empty_like(img)
+    # Sum the pairs of subpixels in the same order as utils.rebin_evlist
+    for h in horz:
+        pair = np.zeros_like(img)
+        for v in vert:
+            np.subtract(twice, v, out=tmp)
+            np.subtract(tmp, h, out=tmp)
+            np.maximum(tmp, 0., out=tmp)
+            pair += tmp
+        out += pair
+    out /= 2.
+    out /= 2.
+    return out
+
+
 def lacosmic(det, sciframe, saturation, nonlinear, varframe=None, maxiter=1, grow=1.5,
-             remove_compact_obj=True, sigclip=5.0, sigfrac=0.3, objlim=5.0):
+             remove_compact_obj=True, sigclip=5.0, sigfrac=0.3, objlim=5.0, dtype=np.float64,
+             nthreads=1):
     """
     Identify cosmic rays using the L.A.Cosmic algorithm
     U{http://www.astro.yale.edu/dokkum/lacosmic/}
     (article : U{http://arxiv.org/abs/astro-ph/0108003})
     This routine is mostly courtesy of Malte Tewes
 
+    The Laplacian of the 2x subsampled image is computed directly
+    from the image (see :func:`_laplacian_plus`), and the median
+    filters can be computed over tiles of the image by multiple
+    threads.  The image is not modified between iterations, meaning
+    that iterations beyond the first would find the same pixels; only
+    one pass is performed regardless of ``maxiter``.
+
     Args:
         det:
         sciframe:
@@ -29,6 +145,12 @@ def lacosmic(det, sciframe, saturation, nonlinear, varframe=None, maxiter=1, gro
         sigclip:
         sigfrac:
         objlim:
+        dtype (:obj:`str`, `numpy.dtype`_, optional):
+            Floating-point type used for the calculations.  Using
+            float32 halves the memory use but can change the
+            result for pixels at the detection thresholds.
+        nthreads (:obj:`int`, optional):
+            Number of threads used for the median filters.
 
     Returns:
         ndarray: mask of cosmic rays (0=no CR, 1=CR)
@@ -40,116 +162,103 @@ def lacosmic(det, sciframe, saturation, nonlinear, varframe=None, maxiter=1, gro
     msgs.info("Detecting cosmic rays with the L.A.Cosmic algorithm")
 #    msgs.work("Include these parameters in the settings files to be adjusted by the user")
     # Set the settings
-    scicopy = sciframe.copy()
-    crmask = np.cast['bool'](np.zeros(sciframe.shape))
+    scicopy = sciframe.astype(dtype)
     sigcliplow = sigclip * sigfrac
 
     # Determine if there are saturated pixels
-    satpix = np.zeros_like(sciframe)
 #    satlev = settings_det['saturation']*settings_det['nonlinear']
     satlev = saturation*nonlinear
-    wsat = np.where(sciframe >= satlev)
-    if wsat[0].size == 0: satpix = None
+    satpix = sciframe >= satlev
+    if not np.any(satpix):
+        satpix = None
+
+    if maxiter > 1:
+        msgs.info("Image is unchanged between iterations; performing a single iteration")
+
+    msgs.info("Convolving image with Laplacian kernel")
+    s = _laplacian_plus(scicopy)
+
+    msgs.info("Creating noise model")
+    # Build a custom noise map, and compare  this to the laplacian
+    if varframe is None:
+        noise = _median_filter(scicopy, 5, nthreads=nthreads)
+        np.absolute(noise, out=noise)
+        np.sqrt(noise, out=noise)
     else:
-        satpix[wsat] = 1.0
-        satpix = np.cast['bool'](satpix)
-
-    # Define the kernels
-    laplkernel = np.array([[0.0, -1.0, 0.0], [-1.0, 4.0, -1.0], [0.0, -1.0, 0.0]])  # Laplacian kernal
-    growkernel = np.ones((3,3))
-    for i in range(1, maxiter+1):
-        msgs.info("Convolving image with Laplacian kernel")
-        # Subsample, convolve, clip negative values, and rebin to original size
-        subsam = utils.subsample(scicopy)
-        conved = signal.convolve2d(subsam, laplkernel, mode="same", boundary="symm")
-        cliped = conved.clip(min=0.0)
-        lplus = utils.rebin_evlist(cliped, np.array(cliped.shape)/2.0)
-
-        msgs.info("Creating noise model")
-        # Build a custom noise map, and compare  this to the laplacian
-        m5 = ndimage.filters.median_filter(scicopy, size=5, mode='mirror')
-        if varframe is None:
-            noise = np.sqrt(np.abs(m5))
-        else:
-            noise = np.sqrt(varframe)
-        msgs.info("Calculating Laplacian signal to noise ratio")
+        noise = np.sqrt(varframe).astype(dtype, copy=False)
+    msgs.info("Calculating Laplacian signal to noise ratio")
 
-        # Laplacian S/N
-        s = lplus / (2.0 * noise)  # Note that the 2.0 is from the 2x2 subsampling
+    # Laplacian S/N
+    s /= 2.0 * noise  # Note that the 2.0 is from the 2x2 subsampling
 
-        # Remove the large structures
-        sp = s - ndimage.filters.median_filter(s, size=5, mode='mirror')
+    # Remove the large structures
+    sp = _median_filter(s, 5, nthreads=nthreads)
+    np.subtract(s, sp, out=sp)
 
-        msgs.info("Selecting candidate cosmic rays")
-        # Candidate cosmic rays (this will include HII regions)
-        candidates = sp > sigclip
-        nbcandidates = np.sum(candidates)
-
-        msgs.info("{0:5d} candidate pixels".format(nbcandidates))
-
-        # At this stage we use the saturated stars to mask the candidates, if available :
-        if satpix is not None:
-            msgs.info("Masking saturated pixels")
-            candidates = np.logical_and(np.logical_not(satpix), candidates)
-            nbcandidates = np.sum(candidates)
+    msgs.info("Selecting candidate cosmic rays")
+    # Candidate cosmic rays (this will include HII regions)
+    candidates = sp > sigclip
+    nbcandidates = np.sum(candidates)
 
-            msgs.info("{0:5d} candidate pixels not part of saturated stars".format(nbcandidates))
+    msgs.info("{0:5d} candidate pixels".format(nbcandidates))
 
-        msgs.info("Building fine structure image")
+    # At this stage we use the saturated stars to mask the candidates, if available :
+    if satpix is not None:
+        msgs.info("Masking saturated pixels")
+        candidates &= np.logical_not(satpix)
+        nbcandidates = np.sum(candidates)
 
-        # We build the fine structure image :
-        m3 = ndimage.filters.median_filter(scicopy, size=3, mode='mirror')
-        m37 = ndimage.filters.median_filter(m3, size=7, mode='mirror')
-        f = m3 - m37
-        f /= noise
-        f = f.clip(min=0.01)
+        msgs.info("{0:5d} candidate pixels not part of saturated stars".format(nbcandidates))
 
-        msgs.info("Removing suspected compact bright objects")
+    msgs.info("Building fine structure image")
 
-        # Now we have our better selection of cosmics :
+    # We build the fine structure image; reuse the buffer of the
+    # Laplacian S/N, which is no longer needed
+    m3 = _median_filter(scicopy, 3, nthreads=nthreads)
+    f = _median_filter(m3, 7, nthreads=nthreads, out=s)
+    np.subtract(m3, f, out=f)
+    f /= noise
+    np.maximum(f, 0.01, out=f)
+    del m3, noise
 
-        if remove_compact_obj:
-            cosmics = np.logical_and(candidates, sp/f > objlim)
-        else:
-            cosmics = candidates
-        nbcosmics = np.sum(cosmics)
+    msgs.info("Removing suspected compact bright objects")
 
-        msgs.info("{0:5d} remaining candidate pixels".format(nbcosmics))
+    # Now we have our better selection of cosmics :
 
-        # What follows is a special treatment for neighbors, with more relaxed constains.
+    if remove_compact_obj:
+        cosmics = candidates & (sp/f > objlim)
+    else:
+        cosmics = candidates
+    nbcosmics = np.sum(cosmics)
 
-        msgs.info("Finding neighboring pixels affected by cosmic rays")
+    msgs.info("{0:5d} remaining candidate pixels".format(nbcosmics))
 
-        # We grow these cosmics a first time to determine the immediate neighborhod  :
-        growcosmics = np.cast['bool'](signal.convolve2d(np.cast['float32'](cosmics), growkernel, mode="same", boundary="symm"))
+    # What follows is a special treatment for neighbors, with more relaxed constains.
 
-        # From this grown set, we keep those that have sp > sigmalim
-        # so obviously not requiring sp/f > objlim, otherwise it would be pointless
-        growcosmics = np.logical_and(sp > sigclip, growcosmics)
+    msgs.info("Finding neighboring pixels affected by cosmic rays")
 
-        # Now we repeat this procedure, but lower the detection limit to sigmalimlow :
+    # We grow these cosmics a first time to determine the immediate neighborhod  :
+    growkernel = np.ones((3,3), dtype=bool)
+    growcosmics = ndimage.binary_dilation(cosmics, structure=growkernel)
 
-        finalsel = np.cast['bool'](signal.convolve2d(np.cast['float32'](growcosmics), growkernel, mode="same", boundary="symm"))
-        finalsel = np.logical_and(sp > sigcliplow, finalsel)
+    # From this grown set, we keep those that have sp > sigmalim
+    # so obviously not requiring sp/f > objlim, otherwise it would be pointless
+    growcosmics &= sp > sigclip
 
-        # Unmask saturated pixels:
-        if satpix is not None:
-            msgs.info("Masking saturated stars")
-            finalsel = np.logical_and(np.logical_not(satpix), finalsel)
+    # Now we repeat this procedure, but lower the detection limit to sigmalimlow :
 
-        ncrp = np.sum(finalsel)
+    crmask = ndimage.binary_dilation(growcosmics, structure=growkernel)
+    crmask &= sp > sigcliplow
 
-        msgs.info("{0:5d} pixels detected as cosmics".format(ncrp))
+    # Unmask saturated pixels:
+    if satpix is not None:
+        msgs.info("Masking saturated stars")
+        crmask &= np.logical_not(satpix)
 
-        # We find how many cosmics are not yet known :
-        newmask = np.logical_and(np.logical_not(crmask), finalsel)
-        nnew = np.sum(newmask)
+    ncrp = np.sum(crmask)
 
-        # We update the mask with the cosmics we have found :
-        crmask = np.logical_or(crmask, finalsel)
+    msgs.info("{0:5d} pixels detected as cosmics".format(ncrp))
 
-        msgs.info("Iteration {0:d} -- {1:d} pixels identified as cosmic rays ({2:d} new)".format(i, ncrp, nnew))
-        if ncrp == 0: break
     # Additional algorithms (not traditionally implemented by LA cosmic) to remove some false positives.
     msgs.work("The following algorithm would be better on the rectified, tilts-corrected image")
     filt  = ndimage.sobel(sciframe, axis=1, mode='constant')
@@ -160,13 +269,9 @@ def lacosmic(det, sciframe, saturation, nonlinear, varframe=None, maxiter=1, gro
 
     sigsmth = ndimage.filters.gaussian_filter(sigimg,1.5)
     sigsmth[np.where(np.isnan(sigsmth))]=0.0
-    sigmask = np.cast['bool'](np.zeros(sciframe.shape))
-    sigmask[np.where(sigsmth>sigclip)] = True
-    crmask = np.logical_and(crmask, sigmask)
+    crmask &= sigsmth > sigclip
     msgs.info("Growing cosmic ray mask by 1 pixel")
-    crmask = grow_masked(crmask.astype(np.float), grow, 1.0)
-
-    return crmask.astype(bool)
+    return grow_masked(crmask, grow, True)
 
 
 def cr_screen(a, mask_value=0.0, spatial_axis=1):
@@ -210,30 +315,35 @@ def cr_screen(a, mask_value=0.0, spatial_axis=1):
 
 
 def grow_masked(img, grow, growval):
+    """
+    Grow the pixels of an image with a given value.
+
+    All pixels within a distance ``grow`` of a pixel equal to
+    ``growval`` are set to ``growval``.
+
+    Args:
+        img (`numpy.ndarray`_):
+            Image to grow.
+        grow (:obj:`float`):
+            Radius, in pixels, of the growth.
+        growval (:obj:`float`):
+            Value of the pixels to grow.
 
-    if not np.any(img == growval):
+    Returns:
+        `numpy.ndarray`_: The grown image; the input image is returned
+        if no pixels are equal to ``growval``.
+    """
+    indx = img == growval
+    if not np.any(indx):
         return img
 
-    _img = img.copy()
-    sz_x, sz_y = img.shape
+    # Footprint with all pixels within the growth radius
     d = int(1+grow)
-    rsqr = grow*grow
-
-    # Grow any masked values by the specified amount
-    for x in range(sz_x):
-        for y in range(sz_y):
-            if img[x,y] != growval:
-                continue
-
-            mnx = 0 if x-d < 0 else x-d
-            mxx = x+d+1 if x+d+1 < sz_x else sz_x
-            mny = 0 if y-d < 0 else y-d
-            mxy = y+d+1 if y+d+1 < sz_y else sz_y
-
-            for i in range(mnx,mxx):
-                for j in range(mny, mxy):
-                    if (i-x)*(i-x)+(j-y)*(j-y) <= rsqr:
-                        _img[i,j] = growval
+    x, y = np.mgrid[-d:d+1,-d:d+1]
+    footprint = x*x + y*y <= grow*grow
+
+    _img = img.copy()
+    _img[ndimage.binary_dilation(indx, structure=footprint)] = growval
     return _img
 
 
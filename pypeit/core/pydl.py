@@ -3,6 +3,7 @@
 # Also cite https://doi.org/10.5281/zenodo.1095150 when referencing PYDL
 import numpy as np
 from warnings import warn
+from scipy.linalg import lapack
 
 from pypeit import msgs
 from pypeit import debugger
@@ -403,7 +404,7 @@ class bspline(object):
                      xmax=self.xmax,
                      funcname=self.funcname))
 
-    def fit(self, xdata, ydata, invvar, x2=None):
+    def fit(self, xdata, ydata, invvar, x2=None, system=None, basis=None):
         """Calculate a B-spline in the least-squares sense.
 
         Fit is based on two variables: x which is sorted and spans a large range
@@ -420,6 +421,16 @@ class bspline(object):
             Inverse variance of `ydata`.
         x2 : :class:`numpy.ndarray`, optional
             Orthogonal dependent variable for 2d fits.
+        system : :class:`dict`, optional
+            Cache of the action matrix and normal equations to reuse
+            between fits to the same `xdata`, `ydata`, and `x2` with
+            different `invvar`, e.g. between rejection iterations.
+            The action matrix is reused as long as the breakpoint mask
+            does not change, and the normal equations are only updated
+            for the points whose inverse variance changed; see
+            :func:`workit`.  Start with an empty dictionary.
+        basis : :class:`bspline_basis`, optional
+            Cached b-spline basis at `xdata`; see :func:`action`.
 
         Returns
         -------
@@ -436,25 +447,25 @@ class bspline(object):
             return (-2, yfit)
         nfull = nn * self.npoly
         bw = self.npoly * self.nord
-        a1, lower, upper = self.action(xdata, x2=x2)
-        foo = np.tile(invvar, bw).reshape(bw, invvar.size).transpose()
-        a2 = a1 * foo
-        alpha = np.zeros((bw, nfull+bw), dtype='d')
-        beta = np.zeros((nfull+bw,), dtype='d')
-        bi = np.arange(bw, dtype='i4')
-        bo = np.arange(bw, dtype='i4')
-        for k in range(1, bw):
-            bi = np.append(bi, np.arange(bw-k, dtype='i4')+(bw+1)*k)
-            bo = np.append(bo, np.arange(bw-k, dtype='i4')+bw*k)
-        for k in range(nn-self.nord+1):
-            itop = k*self.npoly
-            ibottom = min(itop, nfull) + bw - 1
-            ict = upper[k] - lower[k] + 1
-            if ict > 0:
-                work = np.dot(a1[lower[k]:upper[k]+1, :].T, a2[lower[k]:upper[k]+1, :])
-                wb = np.dot(ydata[lower[k]:upper[k]+1], a2[lower[k]:upper[k]+1, :])
-                alpha.T.flat[bo+itop*bw] += work.flat[bi]
-                beta[itop:ibottom+1] += wb
+        if system is not None and 'action' in system and np.array_equal(system['key'], self.mask):
+            a1, lower, upper = system['action']
+        else:
+            a1, lower, upper = self.action(xdata, x2=x2, basis=basis)
+            if system is not None:
+                system.clear()
+        ilower = lower[:nn-self.nord+1]
+        iupper = upper[:nn-self.nord+1]
+        system_update = None if system is None \
+                else _update_band_system(system, self.mask, a1, ydata, invvar, ilower, iupper,
+                                         self.npoly, nfull)
+        if system_update is not None:
+            alpha, beta = system_update
+        else:
+            a2 = a1 * invvar[:,None]
+            alpha, beta = bspline_band_system(a1, a2, ydata, ilower, iupper, self.npoly, nfull)
+        if system is not None:
+            _save_band_system(system, self.mask, alpha, beta, invvar, ilower, iupper)
+            system['action'] = (a1, lower, upper)
         min_influence = 1.0e-10 * invvar.sum() / nfull
         errb = cholesky_band(alpha, mininf=min_influence)  # ,verbose=True)
         if isinstance(errb[0], int) and errb[0] == -1:
@@ -483,7 +494,7 @@ class bspline(object):
         yfit, foo = self.value(xdata, x2=x2, action=a1, upper=upper, lower=lower)
         return (0, yfit)
 
-    def action(self, x, x2=None):
+    def action(self, x, x2=None, basis=None):
         """Construct banded bspline matrix, with dimensions [ndata, bandwidth].
 
         Parameters
@@ -492,6 +503,13 @@ class bspline(object):
             Independent variable.
         x2 : :class:`numpy.ndarray`, optional
             Orthogonal dependent variable for 2d fits.
+        basis : :class:`bspline_basis`, optional
+            Cached b-spline basis at the positions `x` (in any order),
+            used instead of recomputing the breakpoint intervals and
+            basis functions.  The basis is recomputed if the good
+            breakpoints changed since it was last used.  Without `x2`
+            the returned action matrix is the cached array and must not
+            be modified.
 
         Returns
         -------
@@ -512,8 +530,13 @@ class bspline(object):
         bw = self.npoly*self.nord
         lower = np.zeros((n - self.nord + 1,), dtype=int)
         upper = np.zeros((n - self.nord + 1,), dtype=int) - 1
-        indx = self.intrv(x)
-        bf1 = self.bsplvn(x, indx)
+        if basis is None:
+            indx = self.intrv(x)
+            bf1 = self.bsplvn(x, indx)
+        else:
+            if x is not basis.xwork and not np.array_equal(x, basis.xwork):
+                raise ValueError('Basis was not computed for these positions.')
+            indx, bf1 = basis.evaluate(self)
         action = bf1
         aa = uniq(indx, np.arange(indx.size, dtype=int))
         upper[indx[aa]-self.nord+1] = aa
@@ -565,13 +588,11 @@ class bspline(object):
         """
         gb = self.breakpoints[self.mask]
         n = gb.size - self.nord
-        indx = np.zeros((x.size,), dtype=int)
-        ileft = self.nord - 1
-        for i in range(x.size):
-            while x[i] > gb[ileft+1] and ileft < n - 1:
-                ileft += 1
-            indx[i] = ileft
-        return indx
+        # First breakpoint at or above each value, limited to the
+        # valid intervals.  The running maximum reproduces the IDL
+        # loop, which never steps back, for unsorted input.
+        indx = np.clip(np.searchsorted(gb, x, side='left') - 1, self.nord - 1, n - 1)
+        return np.maximum.accumulate(indx) if indx.size > 0 else indx
 
     def bsplvn(self, x, ileft):
         """To be documented.
@@ -608,7 +629,7 @@ class bspline(object):
             vnikx[:, j] = vmprev
         return vnikx
 
-    def value(self, x, x2=None, action=None, lower=None, upper=None):
+    def value(self, x, x2=None, action=None, lower=None, upper=None, basis=None):
         """Evaluate a bspline at specified values.
 
         Parameters
@@ -625,6 +646,9 @@ class bspline(object):
         upper : :class:`numpy.ndarray`, optional
             If the action parameter is supplied, this parameter must also
             be supplied.
+        basis : :class:`bspline_basis`, optional
+            Cached b-spline basis at `x`, used to build the action
+            matrix when it is not supplied; see :func:`action`.
 
         Returns
         -------
@@ -633,8 +657,13 @@ class bspline(object):
             mask indicating where the evaluation was good.
         """
 
-        xsort = x.argsort()
-        xwork = x[xsort]
+        if basis is None:
+            xsort = x.argsort()
+        elif basis.matches(x):
+            xsort = basis.xsort
+        else:
+            raise ValueError('Basis was not computed for these positions.')
+        xwork = x[xsort] if basis is None else basis.xwork
         if x2 is not None:
             x2work = x2[xsort]
         else:
@@ -643,7 +672,7 @@ class bspline(object):
             if lower is None or upper is None:
                 raise ValueError('Must specify lower and upper if action is set.')
         else:
-            action, lower, upper = self.action(xwork, x2=x2work)
+            action, lower, upper = self.action(xwork, x2=x2work, basis=basis)
         yfit = np.zeros(x.shape, dtype=x.dtype)
         bw = self.npoly * self.nord
         spot = np.arange(bw, dtype='i4')
@@ -729,7 +758,8 @@ class bspline(object):
         else:
             return -2
 
-    def workit(self, xdata, ydata, invvar, action,lower,upper):
+    def workit(self, xdata, ydata, invvar, action, lower, upper, vectorized=True, use_lapack=True,
+               system=None):
         """An internal routine for bspline_extract and bspline_radial which solve a general
         banded correlation matrix which is represented by the variable "action".  This routine
         only solves the linear system once, and stores the coefficients in sset. A non-zero return value
@@ -750,6 +780,23 @@ class bspline(object):
             A list of pixel positions, each corresponding to the first occurence of position greater than breakpoint indx
         upper  : :class:`numpy.ndarray`
             Same as lower, but denotes the upper pixel positions
+        vectorized : :class:`bool`, optional
+            Assemble the normal equations with the vectorized path of
+            :func:`bspline_band_system` (default) instead of the loop
+            over breakpoints.
+        use_lapack : :class:`bool`, optional
+            Factor and solve the banded system with LAPACK (default)
+            instead of the python implementations in
+            :func:`cholesky_band` and :func:`cholesky_solve`.
+        system : :class:`dict`, optional
+            Cache of the normal equations to reuse between calls with
+            the same `action` matrix, e.g. between rejection
+            iterations.  On the first call (empty dictionary) the
+            system is assembled and saved.  In subsequent calls with
+            the same breakpoint mask, only the contributions of the
+            data points whose inverse variance changed are added to
+            or removed from the saved system.  The caller must empty
+            the dictionary when `action` changes.
 
         Returns
         -------
@@ -769,39 +816,29 @@ class bspline(object):
             return (-2, yfit)
         nfull = nn * self.npoly
         bw = self.npoly * self.nord
-        foo = np.sqrt(np.tile(invvar, bw).reshape(bw, invvar.size).transpose())
-        a2 = action * foo
-        #a2 = action*np.sqrt(np.outer(invvar,np.ones(bw)))
-
-        alpha = np.zeros((bw, nfull+bw), dtype='d')
-        beta = np.zeros((nfull+bw,), dtype='d')
-        bi = np.arange(bw, dtype='i4')
-        bo = np.arange(bw, dtype='i4')
-        for k in range(1, bw):
-            bi = np.append(bi, np.arange(bw-k, dtype='i4')+(bw+1)*k)
-            bo = np.append(bo, np.arange(bw-k, dtype='i4')+bw*k)
-        for k in range(nn-self.nord+1):
-            itop = k*self.npoly
-            ibottom = min(itop, nfull) + bw - 1
-            try:
-                ict = upper[k] - lower[k] + 1
-            except:
-                debugger.set_trace()
-            if ict > 0:
-                work = np.dot(a2[lower[k]:upper[k]+1, :].T, a2[lower[k]:upper[k]+1, :])
-                wb = np.dot(ydata[lower[k]:upper[k]+1]*np.sqrt(invvar[lower[k]:upper[k]+1]), a2[lower[k]:upper[k]+1, :])
-                alpha.T.flat[bo+itop*bw] += work.flat[bi]
-                beta[itop:ibottom+1] += wb
+        ilower = lower[:nn-self.nord+1]
+        iupper = upper[:nn-self.nord+1]
+        system_update = None if system is None \
+                else _update_band_system(system, nn, action, ydata, invvar, ilower, iupper,
+                                         self.npoly, nfull, vectorized=vectorized)
+        if system_update is not None:
+            alpha, beta = system_update
+        else:
+            a2 = action * np.sqrt(invvar)[:,None]
+            alpha, beta = bspline_band_system(a2, a2, ydata*np.sqrt(invvar), ilower, iupper,
+                                              self.npoly, nfull, vectorized=vectorized)
+        if system is not None:
+            _save_band_system(system, nn, alpha, beta, invvar, ilower, iupper)
         min_influence = 1.0e-10 * invvar.sum() / nfull
         # Right now we are not returning the covariance, although it may arise that we should
         covariance = alpha
-        errb = cholesky_band(alpha, mininf=min_influence)  # ,verbose=True)
+        errb = cholesky_band(alpha, mininf=min_influence, use_lapack=use_lapack)  # ,verbose=True)
         if isinstance(errb[0], int) and errb[0] == -1: # successful cholseky_band returns -1
             a = errb[1]
         else:
             yfit, foo = self.value(xdata, x2=xdata, action=action, upper=upper, lower=lower)
             return (self.maskpoints(errb[0]), yfit)
-        errs = cholesky_solve(a, beta)
+        errs = cholesky_solve(a, beta, use_lapack=use_lapack)
         if isinstance(errs[0], int) and errs[0] == -1:
             sol = errs[1]
         else:
@@ -824,17 +861,284 @@ class bspline(object):
         return (0, yfit)
 
 
+class bspline_basis(object):
+    """Cached b-spline basis at a fixed set of positions.
+
+    Finding the breakpoint interval of each position
+    (:func:`bspline.intrv`) and evaluating the `nord` non-zero
+    b-splines in that interval (:func:`bspline.bsplvn`) is most of the
+    work of :func:`bspline.action`, and it is repeated for the same
+    positions by every fit and evaluation of a bspline, e.g. when the
+    sky is fit, refit, and evaluated at the same wavelengths.  This
+    object does it once for a given order and set of good breakpoints,
+    and does it again only when they change, e.g. when
+    :func:`bspline.maskpoints` drops breakpoints.  It can be shared by
+    different bspline objects with the same breakpoints.
+
+    Parameters
+    ----------
+    x : :class:`numpy.ndarray`
+        Positions of the basis, need not be sorted.
+
+    Attributes
+    ----------
+    x
+        The input positions.
+    xsort
+        Indices that sort `x`.
+    xwork
+        The sorted positions.
+    nord
+        Order of the cached basis.
+    bkpt
+        Good breakpoints of the cached basis.
+    indx
+        Breakpoint interval of each sorted position.
+    bf1
+        Values of the `nord` non-zero b-splines at each sorted
+        position.
+    """
+    def __init__(self, x):
+        self.x = x
+        self.xsort = x.argsort()
+        self.xwork = x[self.xsort]
+        self.nord = None
+        self.bkpt = None
+        self.indx = None
+        self.bf1 = None
+
+    def matches(self, x):
+        """Check if `x` are the positions of the basis."""
+        return x is self.x or np.array_equal(x, self.x)
+
+    def evaluate(self, sset):
+        """Return the basis for the good breakpoints of a bspline.
+
+        Parameters
+        ----------
+        sset : :class:`bspline`
+            The bspline.
 
-def cholesky_band(l, mininf=0.0):
+        Returns
+        -------
+        :func:`tuple`
+            The breakpoint interval of each sorted position and the
+            values of the non-zero b-splines at each sorted position;
+            see :func:`bspline.intrv` and :func:`bspline.bsplvn`.
+        """
+        bkpt = sset.breakpoints[sset.mask]
+        if self.nord != sset.nord or not np.array_equal(bkpt, self.bkpt):
+            self.indx = sset.intrv(self.xwork)
+            self.bf1 = sset.bsplvn(self.xwork, self.indx)
+            self.nord = sset.nord
+            self.bkpt = bkpt
+        return self.indx, self.bf1
+
+
+
+def _update_band_system(system, key, action, ydata, invvar, lower, upper, npoly, nfull,
+                        vectorized=True):
+    """Update saved b-spline normal equations for points with new weights.
+
+    The normal equations are sums of the contributions of each data
+    point, so the system saved by :func:`_save_band_system` is updated
+    by adding the difference in weight of the points whose inverse
+    variance changed, times their contributions.
+
+    Parameters
+    ----------
+    system : :class:`dict`
+        The saved system.
+    key : object
+        Identifies the action matrix (and breakpoint mask) used to
+        build the saved system.  The system is only updated if the key
+        is the same.
+    action : :class:`numpy.ndarray`
+        Action matrix, shape (ndata, bandwidth).
+    ydata : :class:`numpy.ndarray`
+        Dependent variable.
+    invvar : :class:`numpy.ndarray`
+        New inverse variance of `ydata`.
+    lower, upper : :class:`numpy.ndarray`
+        First and last row of each breakpoint interval; see
+        :func:`bspline_band_system`.
+    npoly : :class:`int`
+        Number of polynomial (or profile) terms per breakpoint.
+    nfull : :class:`int`
+        Number of free coefficients.
+    vectorized : :class:`bool`, optional
+        Passed to :func:`bspline_band_system`.
+
+    Returns
+    -------
+    :func:`tuple`
+        The updated `alpha` and `beta`, or None if the saved system
+        cannot be used or if more than half of the points changed, in
+        which case the system should be assembled from scratch.
+    """
+    if 'key' not in system or not np.array_equal(system['key'], key) \
+            or system['invvar'].shape != invvar.shape:
+        return None
+    changed = np.where(invvar != system['invvar'])[0]
+    if changed.size > invvar.size//2:
+        return None
+    alpha, beta = system['alpha'], system['beta']
+    kidx = system['kidx'][changed]
+    indx = kidx >= 0
+    if not np.any(indx):
+        return alpha, beta
+    # Group the points by breakpoint interval
+    srt = np.argsort(kidx[indx], kind='stable')
+    changed = changed[indx][srt]
+    kidx = kidx[indx][srt]
+    dw = invvar[changed] - system['invvar'][changed]
+    counts = np.bincount(kidx, minlength=lower.size)
+    _upper = np.cumsum(counts) - 1
+    _alpha, _beta = bspline_band_system(action[changed]*dw[:,None], action[changed],
+                                        ydata[changed]*dw, _upper - counts + 1, _upper, npoly,
+                                        nfull, vectorized=vectorized)
+    return alpha + _alpha, beta + _beta
+
+
+def _save_band_system(system, key, alpha, beta, invvar, lower, upper):
+    """Save b-spline normal equations for :func:`_update_band_system`.
+
+    Parameters
+    ----------
+    system : :class:`dict`
+        Dictionary for the saved system; updated in place.
+    key : object
+        Identifies the action matrix used to build the system.
+    alpha, beta : :class:`numpy.ndarray`
+        The normal equations, as returned by
+        :func:`bspline_band_system`.
+    invvar : :class:`numpy.ndarray`
+        Inverse variance used to build the system.
+    lower, upper : :class:`numpy.ndarray`
+        First and last row of each breakpoint interval.
+    """
+    if 'key' not in system or not np.array_equal(system['key'], key) \
+            or system['invvar'].shape != invvar.shape:
+        # Breakpoint interval of each data point
+        kidx = np.full(invvar.size, -1, dtype=int)
+        nrow = np.fmax(upper - lower + 1, 0)
+        start = np.cumsum(nrow) - nrow
+        kidx[np.arange(np.sum(nrow)) - np.repeat(start - lower, nrow)] \
+                = np.repeat(np.arange(lower.size), nrow)
+        system.clear()
+        system['kidx'] = kidx
+    system.update(key=np.copy(key), alpha=alpha, beta=beta, invvar=np.array(invvar, copy=True))
+
+
+def bspline_band_system(left, right, rhs, lower, upper, npoly, nfull, vectorized=True):
+    """Assemble the banded normal equations of a b-spline least-squares fit.
+
+    The data points falling in breakpoint interval ``k`` (rows
+    ``lower[k]:upper[k]+1`` of the action matrices) contribute
+    ``left.T @ right`` to the band of `alpha` starting at column
+    ``k*npoly`` and ``rhs @ right`` to the corresponding elements of
+    `beta`.
+
+    Parameters
+    ----------
+    left : :class:`numpy.ndarray`
+        Action matrix for the left-hand factor, shape (ndata, bandwidth).
+    right : :class:`numpy.ndarray`
+        Weighted action matrix for the right-hand factor, same shape as
+        `left`.
+    rhs : :class:`numpy.ndarray`
+        Weighted data vector, shape (ndata,).
+    lower : :class:`numpy.ndarray`
+        First row of each breakpoint interval, as returned by
+        :func:`bspline.action`.
+    upper : :class:`numpy.ndarray`
+        Last row of each breakpoint interval.  Intervals with
+        ``upper < lower`` contain no data and are skipped.
+    npoly : :class:`int`
+        Number of polynomial (or profile) terms per breakpoint.
+    nfull : :class:`int`
+        Number of free coefficients, i.e. the number of good
+        breakpoints times `npoly`.
+    vectorized : :class:`bool`, optional
+        If ``True`` (default) sum the contributions of all intervals
+        at once using segment reductions.  If ``False``, use the
+        original loop over breakpoint intervals.  Both agree to
+        round-off.
+
+    Returns
+    -------
+    :func:`tuple`
+        The band matrix `alpha`, shape (bandwidth, nfull+bandwidth), and
+        the vector `beta`, shape (nfull+bandwidth,).
+    """
+    bw = left.shape[1]
+    alpha = np.zeros((bw, nfull+bw), dtype='d')
+    beta = np.zeros((nfull+bw,), dtype='d')
+
+    if not vectorized:
+        bi = np.arange(bw, dtype='i4')
+        bo = np.arange(bw, dtype='i4')
+        for k in range(1, bw):
+            bi = np.append(bi, np.arange(bw-k, dtype='i4')+(bw+1)*k)
+            bo = np.append(bo, np.arange(bw-k, dtype='i4')+bw*k)
+        for k in range(lower.size):
+            itop = k*npoly
+            ibottom = min(itop, nfull) + bw - 1
+            ict = upper[k] - lower[k] + 1
+            if ict > 0:
+                work = np.dot(left[lower[k]:upper[k]+1, :].T, right[lower[k]:upper[k]+1, :])
+                wb = np.dot(rhs[lower[k]:upper[k]+1], right[lower[k]:upper[k]+1, :])
+                alpha.T.flat[bo+itop*bw] += work.flat[bi]
+                beta[itop:ibottom+1] += wb
+        return alpha, beta
+
+    # Keep only the intervals that contain data
+    nrow = upper - lower + 1
+    kk = np.where(nrow > 0)[0]
+    if kk.size == 0:
+        return alpha, beta
+    nrow = nrow[kk]
+    # Start of each interval in the stacked rows
+    start = np.cumsum(nrow) - nrow
+    rows = np.arange(np.sum(nrow)) - np.repeat(start - lower[kk], nrow)
+    if np.all(np.diff(rows) == 1):
+        # Intervals are contiguous (x sorted): avoid the copy
+        rows = slice(rows[0], rows[-1]+1)
+    # Work with (bandwidth, nrows) arrays so the products and sums are
+    # along contiguous memory
+    lwork = np.ascontiguousarray(left[rows].T)
+    rwork = lwork if right is left else np.ascontiguousarray(right[rows].T)
+
+    # Column of alpha and beta touched by each (interval, band element)
+    itop = kk*npoly
+    ncol = nfull + bw
+    for m in range(bw):
+        # Band m holds left[:,p]*right[:,p+m]
+        seg = np.add.reduceat(lwork[:bw-m]*rwork[m:], start, axis=1)
+        col = (np.arange(bw-m)[:, None] + itop[None, :]).ravel()
+        alpha[m] += np.bincount(col, weights=seg.ravel(), minlength=ncol)[:ncol]
+    seg = np.add.reduceat(rhs[rows][None, :]*rwork, start, axis=1)
+    col = (np.arange(bw)[:, None] + itop[None, :]).ravel()
+    beta += np.bincount(col, weights=seg.ravel(), minlength=ncol)[:ncol]
+    return alpha, beta
+
+
+def cholesky_band(l, mininf=0.0, use_lapack=True):
     """Compute Cholesky decomposition of banded matrix.
 
     Parameters
     ----------
     l : :class:`numpy.ndarray`
-        A matrix on which to perform the Cholesky decomposition.
+        A matrix on which to perform the Cholesky decomposition.  The
+        matrix is stored in lower band form, ``l[i,j] = A[j+i,j]``,
+        padded with `bw` trailing columns, where `bw` is the first
+        dimension of `l`.
     mininf : :class:`float`, optional
         Entries in the `l` matrix are considered negative if they are less
         than this value (default 0.0).
+    use_lapack : :class:`bool`, optional
+        Use the LAPACK banded Cholesky factorization (``dpbtrf``)
+        instead of the column-by-column python implementation.
 
     Returns
     -------
@@ -861,6 +1165,21 @@ def cholesky_band(l, mininf=0.0):
 #        msgs.warn('Found {:d}'.format(len(negative.nonzero()[0])) +
 #                  ' bad entries: ' + str(negative.nonzero()[0]))
 #        return (negative.nonzero()[0], l)
+    if use_lapack:
+        # LAPACK ignores the elements of the band that fall beyond
+        # the last column of the matrix
+        c, info = lapack.dpbtrf(lower[:, :n], lower=1)
+        # info > 0 is the (1-indexed) leading minor that is not
+        # positive definite
+        bad = info - 1 if info > 0 else None
+        if bad is None and not np.all(np.isfinite(c)):
+            bad = int(np.where(np.any(np.invert(np.isfinite(c)), axis=0))[0][0])
+        if bad is not None:
+            msgs.warn('NaN found in cholesky_band.')
+            return (int(bad), l)
+        lower[:, :n] = c
+        return (-1, lower)
+
     kn = bw - 1
     spot = np.arange(kn, dtype='i4') + 1
     bi = np.arange(kn, dtype='i4')
@@ -879,15 +1198,19 @@ def cholesky_band(l, mininf=0.0):
     return (-1, lower)
 
 
-def cholesky_solve(a, bb):
+def cholesky_solve(a, bb, use_lapack=True):
     """Solve the equation Ax=b where A is a Cholesky-banded matrix.
 
     Parameters
     ----------
     a : :class:`numpy.ndarray`
-        :math:`A` in :math:`A x = b`.
+        :math:`A` in :math:`A x = b`, as returned by
+        :func:`cholesky_band`.
     bb : :class:`numpy.ndarray`
         :math:`b` in :math:`A x = b`.
+    use_lapack : :class:`bool`, optional
+        Use the LAPACK banded solver (``dpbtrs``) instead of the
+        python forward and back substitution.
 
     Returns
     -------
@@ -898,6 +1221,10 @@ def cholesky_solve(a, bb):
     b = bb.copy()
     bw = a.shape[0]
     n = b.shape[0] - bw
+    if use_lapack:
+        x, info = lapack.dpbtrs(a[:, :n], b[:n], lower=1)
+        b[:n] = x
+        return (-1, b)
     kn = bw - 1
     spot = np.arange(kn, dtype='i4') + 1
     for j in range(n):
@@ -910,7 +1237,8 @@ def cholesky_solve(a, bb):
 
 
 def iterfit(xdata, ydata, invvar=None, inmask = None, upper=5, lower=5, x2=None,
-            maxiter=10, nord = 4, bkpt = None, fullbkpt = None, kwargs_bspline={}, kwargs_reject={}):
+            maxiter=10, nord = 4, bkpt = None, fullbkpt = None, kwargs_bspline={}, kwargs_reject={},
+            incremental=True, basis=None):
     """Iteratively fit a b-spline set to data, with rejection.
 
     Parameters
@@ -931,6 +1259,14 @@ def iterfit(xdata, ydata, invvar=None, inmask = None, upper=5, lower=5, x2=None,
     maxiter : :class:`int`, optional
         Maximum number of rejection iterations, default 10.  Set this to
         zero to disable rejection.
+    incremental : :class:`bool`, optional
+        Reuse the action matrix between rejection iterations and only
+        update the normal equations for the points that were rejected
+        or restored, instead of refitting from scratch; see
+        :func:`bspline.fit`.  The results agree to round-off.
+    basis : :class:`bspline_basis`, optional
+        Cached b-spline basis at `xdata`, to share it with other fits or
+        evaluations at the same positions; see :func:`bspline.action`.
 
     Returns
     -------
@@ -1007,6 +1343,7 @@ def iterfit(xdata, ydata, invvar=None, inmask = None, upper=5, lower=5, x2=None,
         x2work = None
     iiter = 0
     error = -1
+    system = {} if incremental else None
     # JFH fixed major bug here. Codes were not iterating
     qdone = False
     while (error != 0 or qdone is False) and iiter <= maxiter:
@@ -1031,7 +1368,7 @@ def iterfit(xdata, ydata, invvar=None, inmask = None, upper=5, lower=5, x2=None,
                     else:
                         sset.mask[goodbk[ileft]] = False
             error, yfit = sset.fit(xwork, ywork, invwork*maskwork,
-                                   x2=x2work)
+                                   x2=x2work, system=system, basis=basis)
         iiter += 1
         inmask_rej = maskwork
         if error == -2:
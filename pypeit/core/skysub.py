@@ -3,7 +3,7 @@
 import numpy as np
 import sys, os
 
-from pypeit import msgs, utils, ginga
+from pypeit import msgs, utils, ginga, parallel
 from pypeit.core import pixels, extract, pydl
 from IPython import embed
 from pypeit.images import maskimage
@@ -169,11 +169,13 @@ def global_skysub(image, ivar, tilts, thismask, slit_left, slit_righ, inmask = N
 
 
     # Perform the full fit now
+    pix_basis = pydl.bspline_basis(pix)
     skyset, outmask, yfit, _, exit_status = utils.bspline_profile(pix, sky, sky_ivar,poly_basis,inmask = inmask_fit,
                                                                   nord=4,upper=sigrej, lower=sigrej,
                                                                   maxiter=maxiter,
                                                                   kwargs_bspline = {'bkspace':bsp},
-                                                                  kwargs_reject={'groupbadpix':True, 'maxrej': 10})
+                                                                  kwargs_reject={'groupbadpix':True, 'maxrej': 10},
+                                                                  basis=pix_basis)
     # TODO JFH This is a hack for now to deal with bad fits for which iterations do not converge. This is related
     # to the groupbadpix behavior requested for the djs_reject rejection. It would be good to
     # better understand what this functionality is doing, but it makes the rejection much more quickly approach a small
@@ -188,7 +190,8 @@ def global_skysub(image, ivar, tilts, thismask, slit_left, slit_righ, inmask = N
                                                                       nord=4, upper=sigrej, lower=sigrej,
                                                                       maxiter=maxiter,
                                                                       kwargs_bspline={'bkspace': bsp},
-                                                                      kwargs_reject={'groupbadpix': False, 'maxrej': 10})
+                                                                      kwargs_reject={'groupbadpix': False, 'maxrej': 10},
+                                                                      basis=pix_basis)
 
     sky_frame = np.zeros_like(image)
     ythis = np.zeros_like(yfit)
@@ -279,11 +282,16 @@ def skyoptimal(wave, data, ivar, oprof, sortpix, sigrej=3.0, npoly=1, spatial=No
 
     outmask = np.zeros(wave.shape, dtype=bool)
 
+    # Both fits use the same breakpoints at the same wavelengths, so
+    # only compute the b-splines once
+    good_basis = pydl.bspline_basis(wave[good])
+
     if ngood > 0:
         sset1, outmask_good1, yfit1, red_chi1, exit_status = utils.bspline_profile(
             wave[good], data[good], ivar[good],
             profile_basis[good, :],fullbkpt=fullbkpt, upper=sigrej, lower=sigrej,
-            relative=relative,kwargs_reject={'groupbadpix': True, 'maxrej': 5})
+            relative=relative,kwargs_reject={'groupbadpix': True, 'maxrej': 5},
+            basis=good_basis)
     else:
         msgs.warn('All pixels are masked in skyoptimal. Not performing local sky subtraction.')
         return np.zeros_like(wave), np.zeros_like(wave), outmask
@@ -301,7 +309,7 @@ def skyoptimal(wave, data, ivar, oprof, sortpix, sigrej=3.0, npoly=1, spatial=No
         sset, outmask_good, yfit, red_chi, exit_status = \
             utils.bspline_profile(wave[good], data[good], ivar[good], profile_basis[good, :], inmask=mask1,
                                   fullbkpt=fullbkpt, upper=sigrej, lower=sigrej, relative=relative,
-                                  kwargs_reject={'groupbadpix': True, 'maxrej': 1})
+                                  kwargs_reject={'groupbadpix': True, 'maxrej': 1}, basis=good_basis)
     else:
         msgs.warn('All pixels are masked in skyoptimal after first round of rejection. Not performing local sky subtraction.')
         return np.zeros_like(wave), np.zeros_like(wave), outmask
@@ -317,14 +325,16 @@ def skyoptimal(wave, data, ivar, oprof, sortpix, sigrej=3.0, npoly=1, spatial=No
     skyset.xmin = xmin
     skyset.xmax = xmax
 
-    sky_bmodel, _ = skyset.value(wave, x2=spatial)
+    # Same for the sky and object models
+    wave_basis = pydl.bspline_basis(wave)
+    sky_bmodel, _ = skyset.value(wave, x2=spatial, basis=wave_basis)
 
     obj_bmodel = np.zeros(sky_bmodel.shape)
     objset = pydl.bspline(None, fullbkpt=sset.breakpoints, nord=sset.nord)
     objset.mask = sset.mask
     for i in range(nobj):
         objset.coeff = sset.coeff[i, :]
-        obj_bmodel1, _ = objset.value(wave)
+        obj_bmodel1, _ = objset.value(wave, basis=wave_basis)
         obj_bmodel = obj_bmodel + obj_bmodel1 * profile_basis[:, i]
 
     outmask[good] = outmask_good
@@ -476,11 +486,43 @@ def optimal_bkpts(bkpts_optimal, bsp_min, piximg, sampmask, samp_frac=0.80,
     return fullbkpt
 
 
+def fit_profile_obj(ipix, sign, trace_spat, wave, flux, fluxivar, kwargs):
+    """
+    Fit the spatial profile of one object of a group in local_skysub_extract.
+
+    This is the task distributed by local_skysub_extract. The images of the slit are retrieved with
+    :func:`pypeit.parallel.get_shared`.
+
+    Args:
+        ipix: tuple
+           Indices of the sub-image of the region being modeled, as returned by np.ix_
+        sign: int
+           Sign of the object; 1 for positive objects, -1 for negative objects in difference images
+        trace_spat: ndarray, (nspec,)
+           Object trace
+        wave: ndarray, (nspec,)
+           Extracted wavelengths
+        flux: ndarray, (nspec,)
+           Extracted flux, already multiplied by sign
+        fluxivar: ndarray, (nspec,)
+           Inverse variance of the extracted flux
+        kwargs: dict
+           Other keyword arguments passed to extract.fit_profile
+
+    Returns:
+        tuple: (profile_model, trace_new, fwhmfit, med_sn2) as returned by extract.fit_profile
+    """
+    return extract.fit_profile(sign*parallel.get_shared('image')[ipix], parallel.get_shared('ivar')[ipix],
+                               parallel.get_shared('waveimg')[ipix], parallel.get_shared('thismask')[ipix],
+                               parallel.get_shared('spat_img')[ipix], trace_spat, wave, flux, fluxivar,
+                               inmask=parallel.get_shared('inmask')[ipix], **kwargs)
+
+
 def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, thismask, slit_left, slit_righ, sobjs,
                          spat_pix=None, adderr=0.01, bsp=0.6, inmask=None, extract_maskwidth=4.0, trim_edg=(3,3),
                          std=False, prof_nsigma=None, niter=4, box_rad=7, sigrej=3.5, bkpts_optimal=True,
                          debug_bkpts=False,sn_gauss=4.0, model_full_slit=False, model_noise=True, show_profile=False,
-                         show_resids=False):
+                         show_resids=False, nproc=1):
 
     """Perform local sky subtraction and  extraction
 
@@ -574,6 +616,9 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
           which will block the execution of the code until the window is closed.
     show_resids:
           Show the
+    nproc: int, default = 1
+          Number of processes used to fit the profiles of the objects in each group in parallel. The profiles
+          are always fit serially if show_profile is True.
     Returns:
         :func:`tuple`
         (skyimage[thismask], objimage[thismask], modelivar[thismask], outmask[thismask])
@@ -641,6 +686,12 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
     # TODO Can this be simply replaced with spat_img above (but not spat_pix since that could have holes)
     spatial_img = thismask * ximg * (np.outer(xsize, np.ones(nspat)))
 
+    # Pool used to fit the profiles of the objects in each group. It is started once for the slit and reused by
+    # all the groups and iterations; the images are updated in its shared memory before each set of fits.
+    pool = parallel.TaskPool(nproc=(1 if show_profile else nproc),
+                             shared=dict(image=sciimg - skyimage, ivar=modelivar * outmask, waveimg=waveimg,
+                                         thismask=thismask, spat_img=spat_pix, inmask=outmask))
+
     # Loop over objects and group them
     i1 = 0
     while i1 < nobj:
@@ -677,11 +728,28 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
         spat_vec = np.arange(min_spat, min_spat + nc, dtype=np.intp)
         ipix = np.ix_(spec_vec, spat_vec)
         obj_profiles = np.zeros((nspec, nspat, objwork), dtype=float)
+        # Spectra (flux, fluxivar, wave) of each object used for the profile fits
+        obj_spec = [None]*objwork
         sigrej_eff = sigrej
         for iiter in range(1, niter + 1):
             msgs.info('--------------------------REDUCING: Iteration # ' + '{:2d}'.format(iiter) + ' of ' +
                       '{:2d}'.format(niter) + '---------------------------------------------------')
             img_minsky = sciimg - skyimage
+            if iiter == 1:
+                # Images used by the boxcar extractions that initiate the profile fitting. These are the same
+                # for all the objects in the group, so compute them only once per iteration.
+                mvarimg = 1.0 / (modelivar + (modelivar == 0))
+                box_images = dict(flux=img_minsky * outmask, mvar=mvarimg * outmask, pixtot=np.ones_like(mvarimg),
+                                  mask=np.invert(outmask), denom=(waveimg > 0.0), wave=waveimg)
+                # Boxcar extract all the images for all the objects in the group at once
+                boxes = extract.extract_boxcar_multi(list(box_images.values()),
+                                                     np.stack([sobjs[iobj].trace_spat for iobj in group], axis=1),
+                                                     box_rad,
+                                                     ycen=np.stack([sobjs[iobj].trace_spec for iobj in group], axis=1))
+            # Extract the spectra used to fit the profiles. The profile fits of the objects in the group
+            # are independent of each other, so collect them and fit them together below.
+            fit_args = []
+            fit_objs = []
             for ii in range(objwork):
                 iobj = group[ii]
                 if iiter == 1:
@@ -691,20 +759,11 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
                     msgs.info("Fitting profile for obj # " + "{:}".format(sobjs[iobj].objid) + " of {:}".format(nobj))
                     msgs.info("At x = {:5.2f}".format(sobjs[iobj].spat_pixpos) + " on slit # {:}".format(sobjs[iobj].slitid))
                     msgs.info("------------------------------------------------------------------------------------------------------------")
-                    flux = extract.extract_boxcar(img_minsky * outmask, sobjs[iobj].trace_spat, box_rad,
-                                          ycen=sobjs[iobj].trace_spec)
-                    mvarimg = 1.0 / (modelivar + (modelivar == 0))
-                    mvar_box = extract.extract_boxcar(mvarimg * outmask, sobjs[iobj].trace_spat, box_rad,
-                                              ycen=sobjs[iobj].trace_spec)
-                    pixtot = extract.extract_boxcar(0 * mvarimg + 1.0, sobjs[iobj].trace_spat, box_rad,
-                                            ycen=sobjs[iobj].trace_spec)
-                    mask_box = (extract.extract_boxcar(np.invert(outmask), sobjs[iobj].trace_spat, box_rad,
-                                               ycen=sobjs[iobj].trace_spec) != pixtot)
-                    box_denom = extract.extract_boxcar(waveimg > 0.0, sobjs[iobj].trace_spat, box_rad,
-                                               ycen=sobjs[iobj].trace_spec)
-                    wave = extract.extract_boxcar(waveimg, sobjs[iobj].trace_spat, box_rad, ycen=sobjs[iobj].trace_spec) / (
-                                box_denom + (box_denom == 0.0))
-                    fluxivar = mask_box / (mvar_box + (mvar_box == 0.0))
+                    box = dict(zip(box_images.keys(), boxes[:,:,ii]))
+                    mask_box = box['mask'] != box['pixtot']
+                    wave = box['wave'] / (box['denom'] + (box['denom'] == 0.0))
+                    fluxivar = mask_box / (box['mvar'] + (box['mvar'] == 0.0))
+                    obj_spec[ii] = (box['flux'], fluxivar, wave)
                 else:
                     # For later iterations, profile fitting is based on an optimal extraction
                     last_profile = obj_profiles[:, :, ii]
@@ -714,38 +773,42 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
                                     box_rad, sobjs[iobj])
                     # If the extraction is bad do not update
                     if sobjs[iobj].optimal['MASK'].any():
-                        flux = sobjs[iobj].optimal['COUNTS']
-                        fluxivar = sobjs[iobj].optimal['COUNTS_IVAR']*sobjs[iobj].optimal['MASK']
-                        wave = sobjs[iobj].optimal['WAVE']
+                        obj_spec[ii] = (sobjs[iobj].optimal['COUNTS'],
+                                        sobjs[iobj].optimal['COUNTS_IVAR']*sobjs[iobj].optimal['MASK'],
+                                        sobjs[iobj].optimal['WAVE'])
+                flux, fluxivar, wave = obj_spec[ii]
 
                 obj_string = 'obj # {:}'.format(sobjs[iobj].objid) + ' on slit # {:}'.format(sobjs[iobj].slitid) + ', iter # {:}'.format(iiter) + ':'
                 if wave.any():
                     sign = sobjs[iobj].sign
                     # TODO This is "sticky" masking. Do we want it to be?
-                    profile_model, trace_new, fwhmfit, med_sn2 = extract.fit_profile(
-                        sign*img_minsky[ipix], (modelivar * outmask)[ipix],waveimg[ipix], thismask[ipix], spat_pix[ipix], sobjs[iobj].trace_spat,
-                        wave, sign*flux, fluxivar, inmask = outmask[ipix],
-                        thisfwhm=sobjs[iobj].fwhm, maskwidth=sobjs[iobj].maskwidth,
-                        prof_nsigma=sobjs[iobj].prof_nsigma, sn_gauss=sn_gauss, obj_string=obj_string,
-                        show_profile=show_profile)
-                    #proc_list.append(show_proc)
-
-                    # Update the object profile and the fwhm and mask parameters
-                    obj_profiles[ipix[0], ipix[1], ii] = profile_model
-                    sobjs[iobj].trace_spat = trace_new
-                    sobjs[iobj].fwhmfit = fwhmfit
-                    sobjs[iobj].fwhm = np.median(fwhmfit)
-                    mask_fact = 1.0 + 0.5 * np.log10(np.fmax(np.sqrt(np.fmax(med_sn2, 0.0)), 1.0))
-                    maskwidth = extract_maskwidth*np.median(fwhmfit) * mask_fact
-                    if sobjs[iobj].prof_nsigma is None:
-                        sobjs[iobj].maskwidth = maskwidth
-                    else:
-                        sobjs[iobj].maskwidth = sobjs[iobj].prof_nsigma * (sobjs[iobj].fwhm / 2.3548)
-
+                    fit_objs.append(ii)
+                    fit_args.append((ipix, sign, sobjs[iobj].trace_spat, wave, sign*flux, fluxivar,
+                                     dict(thisfwhm=sobjs[iobj].fwhm, maskwidth=sobjs[iobj].maskwidth,
+                                          prof_nsigma=sobjs[iobj].prof_nsigma, sn_gauss=sn_gauss,
+                                          obj_string=obj_string, show_profile=show_profile)))
                 else:
                     msgs.warn("Bad extracted wavelengths in local_skysub_extract")
                     msgs.warn("Skipping this profile fit and continuing.....")
 
+            pool.update(image=img_minsky, ivar=modelivar * outmask, inmask=outmask)
+            fits = pool.map(fit_profile_obj, fit_args)
+            for ii, (profile_model, trace_new, fwhmfit, med_sn2) in zip(fit_objs, fits):
+                iobj = group[ii]
+                #proc_list.append(show_proc)
+
+                # Update the object profile and the fwhm and mask parameters
+                obj_profiles[ipix[0], ipix[1], ii] = profile_model
+                sobjs[iobj].trace_spat = trace_new
+                sobjs[iobj].fwhmfit = fwhmfit
+                sobjs[iobj].fwhm = np.median(fwhmfit)
+                mask_fact = 1.0 + 0.5 * np.log10(np.fmax(np.sqrt(np.fmax(med_sn2, 0.0)), 1.0))
+                maskwidth = extract_maskwidth*np.median(fwhmfit) * mask_fact
+                if sobjs[iobj].prof_nsigma is None:
+                    sobjs[iobj].maskwidth = maskwidth
+                else:
+                    sobjs[iobj].maskwidth = sobjs[iobj].prof_nsigma * (sobjs[iobj].fwhm / 2.3548)
+
             sky_bmodel = np.array(0.0)
             iterbsp = 0
             while (not sky_bmodel.any()) & (iterbsp <= 5):
@@ -838,6 +901,7 @@ def local_skysub_extract(sciimg, sciivar, tilts, waveimg, global_sky, rn2_img, t
             sobjs[iobj].min_spat = min_spat
             sobjs[iobj].max_spat = max_spat
 
+    pool.close()
 
     # If requested display the model fits for this slit
     if show_resids:
@@ -886,7 +950,7 @@ def ech_local_skysub_extract(sciimg, sciivar, mask, tilts, waveimg, global_sky,
                              spat_pix=None, fit_fwhm=False, min_snr=2.0,bsp=0.6, extract_maskwidth=4.0, trim_edg=(3,3),
                              std=False, prof_nsigma=None, niter=4, box_rad_order=7, sigrej=3.5, bkpts_optimal=True,
                              sn_gauss=4.0, model_full_slit=False, model_noise=True, debug_bkpts=False,
-                             show_profile=False, show_resids=False, show_fwhm=False):
+                             show_profile=False, show_resids=False, show_fwhm=False, nproc=1):
     """
     Perform local sky subtraction, profile fitting, and optimal extraction slit by slit
 
@@ -921,6 +985,8 @@ def ech_local_skysub_extract(sciimg, sciivar, mask, tilts, waveimg, global_sky,
         show_profile:
         show_resids:
         show_fwhm:
+        nproc (int):
+            Number of processes used to fit the object profiles; passed to local_skysub_extract
 
     Returns:
         skymodel, objmodel, ivarmodel, outmask, sobjs
@@ -1053,7 +1119,7 @@ def ech_local_skysub_extract(sciimg, sciivar, mask, tilts, waveimg, global_sky,
                 inmask=inmask,std = std, bsp=bsp, extract_maskwidth=extract_maskwidth, trim_edg=trim_edg,
                 prof_nsigma=prof_nsigma, niter=niter, box_rad=box_rad_order[iord], sigrej=sigrej, bkpts_optimal=bkpts_optimal,
                 sn_gauss=sn_gauss, model_full_slit=model_full_slit, model_noise=model_noise, debug_bkpts=debug_bkpts,
-                show_resids=show_resids, show_profile=show_profile)
+                show_resids=show_resids, show_profile=show_profile, nproc=nproc)
         except:
             embed(header='1037 of skysub.py')
 
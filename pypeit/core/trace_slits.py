@@ -2770,8 +2770,11 @@ def trace_fweight(fimage, xinit_in, radius = 3.0, ycen=None, invvar=None):
 #        raise ValueError('Number of elements in xinit npix = {:d} does not match spectral dimension of '
 #                         'input image {:d}'.format(npix,fimage.shape[0]))
 
-    if invvar is None:
-        invvar = np.zeros_like(fimage) + 1.
+    # Pixels are gathered from the flattened images for all traces at
+    # once; the inverse variance is only gathered if provided
+    _fimage = fimage.ravel()
+    _invvar = None if invvar is None else invvar.ravel()
+    row = ycen_out*nx
 
     x1 = xinit - radius_out + 0.5
     x2 = xinit + radius_out + 0.5
@@ -2794,17 +2797,18 @@ def trace_fweight(fimage, xinit_in, radius = 3.0, ycen=None, invvar=None):
         xdiff = spot - xinit
         #
         wt = np.clip(radius_out - np.abs(xdiff) + 0.5,0,1) * ((spot >= 0) & (spot < nx))
-        sumw = sumw + fimage[ycen_out,ih] * wt
+        flux = _fimage[row + ih]
+        sumw = sumw + flux * wt
         sumwt = sumwt + wt
-        sumxw = sumxw + fimage[ycen_out,ih] * xdiff * wt
-        var_term = wt**2 / (invvar[ycen_out,ih] + (invvar[ycen_out,ih] == 0))
+        sumxw = sumxw + flux * xdiff * wt
+        if _invvar is None:
+            var_term = wt**2
+        else:
+            ivar = _invvar[row + ih]
+            var_term = wt**2 / (ivar + (ivar == 0))
+            qbad = qbad | (ivar <= 0)
         sumsx2 = sumsx2 + var_term
         sumsx1 = sumsx1 + xdiff**2 * var_term
-        #qbad = qbad or (invvar[ycen_out,ih] <= 0)
-        #qbad = np.any([qbad, invvar[ycen_out,ih] <= 0], axis=0)
-        qbad = qbad | (invvar[ycen_out,ih] <= 0)
-
-
 
     # Fill up
     good = (sumw > 0) &  (~qbad)
@@ -2933,10 +2937,12 @@ def trace_gweight(fimage, xinit_in, sigma = 1.0, ycen = None, invvar=None, maskv
 #        raise ValueError('Number of elements in xinit npix = {:d} does not match spectral dimension of '
 #                         'input image {:d}'.format(npix,fimage.shape[0]))
 
-    if invvar is None:
-        invvar = np.zeros_like(fimage) + 1.
+    # Pixels are gathered from the flattened images for all traces at
+    # once; the inverse variance is only gathered if provided
+    _fimage = fimage.ravel()
+    _invvar = None if invvar is None else invvar.ravel()
+    row = ycen_out*nx
 
-    var = utils.inverse(invvar, positive=True)
     # More setting up
     x_int = np.rint(xinit).astype(int)
     nstep = 2*int(3.0*np.max(sigma_out)) - 1
@@ -2953,12 +2959,19 @@ def trace_gweight(fimage, xinit_in, sigma = 1.0, ycen = None, invvar=None, maskv
         xtemp = (xh - xinit - 0.5)/sigma_out/np.sqrt(2.0)
         g_int = (erf(xtemp+1./sigma_out/np.sqrt(2.0)) - erf(xtemp))/2.
         xs = np.fmin(np.fmax(xh,0),(nx-1))
-        cur_weight = fimage[ycen_out, xs] * (invvar[ycen_out, xs] > 0) * g_int * ((xh >= 0) & (xh < nx))
+        inimg = (xh >= 0) & (xh < nx)
+        if _invvar is None:
+            ivar = np.ones(xinit.size, dtype=float)
+        else:
+            ivar = _invvar[row + xs]
+        gpm = ivar > 0
+        var = utils.inverse(ivar, positive=True)
+        cur_weight = _fimage[row + xs] * gpm * g_int * inimg
         weight += cur_weight
         numer += cur_weight * xh
-        numer_var += var[ycen_out,xs]*(invvar[ycen_out, xs] > 0) * (g_int**2) *((xh >= 0) & (xh < nx))
+        numer_var += var * gpm * (g_int**2) * inimg
         # Below is Burles calculation of the error which I'm not following
-        meanvar += cur_weight * cur_weight * (xinit-xh)**2/(invvar[ycen_out, xs] + (invvar[ycen_out, xs] == 0))
+        meanvar += cur_weight * cur_weight * (xinit-xh)**2/(ivar + (ivar == 0))
         qbad = qbad | (xh < 0) | (xh >= nx)
         # bad = np.any([bad, xh < 0, xh >= nx], axis=0)
 
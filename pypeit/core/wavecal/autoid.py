@@ -1,5 +1,8 @@
 """ Module for finding patterns in arc line spectra
 """
+import time
+from collections import OrderedDict
+
 from scipy.ndimage.filters import gaussian_filter
 from scipy.spatial import cKDTree
 import itertools
@@ -26,6 +29,7 @@ from pypeit import utils
 
 from pypeit import msgs
 from pypeit import debugger
+from pypeit import parallel
 from matplotlib import pyplot as plt
 from matplotlib import gridspec
 from matplotlib.backends.backend_pdf import PdfPages
@@ -513,7 +517,7 @@ def semi_brute(spec, lines, wv_cen, disp, sigdetect=30., nonlinear_counts = 1e10
 
 def reidentify(spec, spec_arxiv_in, wave_soln_arxiv_in, line_list, nreid_min, det_arxiv=None, detections=None, cc_thresh=0.8,cc_local_thresh = 0.8,
                match_toler=2.0, nlocal_cc=11, nonlinear_counts=1e10,sigdetect=5.0,fwhm=4.0,
-               debug_xcorr=False, debug_reid=False, debug_peaks = False):
+               debug_xcorr=False, debug_reid=False, debug_peaks = False, xcorr_arxiv=None):
     """ Determine  a wavelength solution for a set of spectra based on archival wavelength solutions
 
     Parameters
@@ -577,6 +581,10 @@ def reidentify(spec, spec_arxiv_in, wave_soln_arxiv_in, line_list, nreid_min, de
     debug_reid: bool, default = False
        Show plots useful for debugging the line reidentification
 
+    xcorr_arxiv: float ndarray, shape of spec_arxiv, default = None
+       The arxiv spectra resized to the size of spec and prepared for the cross-correlation by xcorr_prep. If None, they
+       are computed here. Provide them (and det_arxiv) when the same arxiv is used to reidentify many spectra.
+
     Returns
     -------
     (detections, spec_cont_sub, patt_dict)
@@ -645,19 +653,16 @@ def reidentify(spec, spec_arxiv_in, wave_soln_arxiv_in, line_list, nreid_min, de
     if detections is None:
         detections = tcent[icut]
 
-    spec_arxiv_cont_sub = np.zeros_like(spec_arxiv)
-
-    # Search for lines no matter what to continuum subtract the arxiv arc, also determine the central wavelength and
-    # dispersion of wavelength arxiv
-    det_arxiv1 = {}
-    for iarxiv in range(narxiv):
-        tcent_arxiv, ecent_arxiv, cut_tcent_arxiv, icut_arxiv, spec_cont_sub_now = wvutils.arc_lines_from_spec(
-            spec_arxiv[:,iarxiv], sigdetect=sigdetect,nonlinear_counts=nonlinear_counts, fwhm = fwhm, debug = debug_peaks)
-        spec_arxiv_cont_sub[:,iarxiv] = spec_cont_sub_now
-        det_arxiv1[str(iarxiv)] = tcent_arxiv[icut_arxiv]
-
+    # If they were not passed in, detect the lines in the arxiv arcs
     if det_arxiv is None:
-        det_arxiv = det_arxiv1
+        det_arxiv = detect_arxiv(spec_arxiv, sigdetect=sigdetect, nonlinear_counts=nonlinear_counts, fwhm=fwhm,
+                                 debug_peaks=debug_peaks)
+    # Spectra used for the shift/stretch cross-correlation
+    y1 = xcorr_prep(spec_cont_sub, fwhm=fwhm)
+    if xcorr_arxiv is None:
+        xcorr_arxiv = xcorr_prep(spec_arxiv, fwhm=fwhm)
+    else:
+        xcorr_arxiv = xcorr_arxiv.reshape(spec_arxiv.shape)
 
     wvc_arxiv = np.zeros(narxiv, dtype=float)
     disp_arxiv = np.zeros(narxiv, dtype=float)
@@ -687,7 +692,7 @@ def reidentify(spec, spec_arxiv_in, wave_soln_arxiv_in, line_list, nreid_min, de
         # Match the peaks between the two spectra. This code attempts to compute the stretch if cc > cc_thresh
         success, shift_vec[iarxiv], stretch_vec[iarxiv], ccorr_vec[iarxiv], _, _ = \
             wvutils.xcorr_shift_stretch(spec_cont_sub, spec_arxiv[:, iarxiv], cc_thresh=cc_thresh, fwhm = fwhm, seed = random_state,
-                                        debug=debug_xcorr)
+                                        debug=debug_xcorr, y1=y1, y2=xcorr_arxiv[:, iarxiv])
         # If cc < cc_thresh or if this optimization failed, don't reidentify from this arxiv spectrum
         if success != 1:
             continue
@@ -807,6 +812,53 @@ def reidentify(spec, spec_arxiv_in, wave_soln_arxiv_in, line_list, nreid_min, de
     return detections, spec_cont_sub, patt_dict_slit
 
 
+def detect_arxiv(spec_arxiv, sigdetect=5.0, nonlinear_counts=1e10, fwhm=4.0, debug_peaks=False):
+    """ Detect the lines in a set of arxiv arc spectra for reidentify
+
+    Parameters
+    ----------
+    spec_arxiv:  float ndarray shape (nspec, narxiv)
+       Arxiv arc spectra
+    sigdetect, nonlinear_counts, fwhm, debug_peaks:
+       Line detection parameters; see reidentify
+
+    Returns
+    -------
+    det_arxiv: dict
+       Pixel locations of the lines detected in each arxiv spectrum, with keys '0', '1', ... up to str(narxiv-1)
+    """
+    det_arxiv = {}
+    for iarxiv in range(spec_arxiv.shape[1]):
+        tcent_arxiv, ecent_arxiv, cut_tcent_arxiv, icut_arxiv, spec_cont_sub_now = wvutils.arc_lines_from_spec(
+            spec_arxiv[:,iarxiv], sigdetect=sigdetect,nonlinear_counts=nonlinear_counts, fwhm = fwhm, debug = debug_peaks)
+        det_arxiv[str(iarxiv)] = tcent_arxiv[icut_arxiv]
+    return det_arxiv
+
+
+def xcorr_prep(spec, fwhm=4.0):
+    """ Continuum subtract, clip, and smooth arc spectra for the shift/stretch cross-correlation in reidentify
+
+    This is the preprocessing done by wvutils.xcorr_shift_stretch with its default parameters, such that it can be done
+    once for spectra that are cross-correlated many times.
+
+    Parameters
+    ----------
+    spec:  float ndarray shape (nspec,) or (nspec, nspectra)
+       Arc spectra
+    fwhm: float, default = 4.0
+       Line width in pixels for the line detection
+
+    Returns
+    -------
+    y: ndarray, same shape as spec
+       The prepared spectra
+    """
+    if spec.ndim == 1:
+        return wvutils.smooth_ceil_cont(spec, 1.0, percent_ceil=80.0, fwhm=fwhm)
+    return np.stack([wvutils.smooth_ceil_cont(spec[:,i], 1.0, percent_ceil=80.0, fwhm=fwhm)
+                        for i in range(spec.shape[1])], axis=1)
+
+
 def full_template(spec, par, ok_mask, det, binspectral, nsnippet=2, debug_xcorr=False,
                   x_percentile=50., template_dict=None, debug=False):
     """
@@ -969,6 +1021,100 @@ def full_template(spec, par, ok_mask, det, binspectral, nsnippet=2, debug_xcorr=
     return wvcalib
 
 
+def reidentify_slit(slit, ind_sp, nreid_min, det_arxiv, reid_kwargs, fit_kwargs):
+    """ Reidentify the lines of one slit and fit its wavelength solution, for ArchiveReid
+
+    The slit and arxiv spectra and the line list are obtained with pypeit.parallel.get_shared, such that the slits can
+    be distributed over a pool of processes with pypeit.parallel.map_tasks.
+
+    Parameters
+    ----------
+    slit: int
+       Index of the slit in the 'spec' shared array
+    ind_sp: int or int ndarray
+       Indices of the arxiv spectra to use
+    nreid_min: int
+       See reidentify
+    det_arxiv: dict
+       Lines detected in the selected arxiv spectra; see reidentify
+    reid_kwargs: dict
+       Other keyword arguments for reidentify
+    fit_kwargs: dict
+       Keyword arguments for fitting.fit_slit
+
+    Returns
+    -------
+    (detections, spec_cont_sub, patt_dict, final_fit, timing)
+
+    detections, spec_cont_sub, patt_dict:
+       See reidentify
+    final_fit: dict
+       The wavelength solution, None if the reidentification or the fit failed
+    timing: tuple
+       Time in seconds spent on the reidentification and the fit
+    """
+    line_list = parallel.get_shared('line_list')
+    t0 = time.perf_counter()
+    detections, spec_cont_sub, patt_dict = \
+        reidentify(parallel.get_shared('spec')[:,slit], parallel.get_shared('spec_arxiv')[:,ind_sp],
+                   parallel.get_shared('wave_soln_arxiv')[:,ind_sp], line_list, nreid_min,
+                   det_arxiv=det_arxiv, xcorr_arxiv=parallel.get_shared('xcorr_arxiv')[:,ind_sp],
+                   **reid_kwargs)
+    t1 = time.perf_counter()
+    final_fit = None if not patt_dict['acceptable'] \
+                    else fitting.fit_slit(spec_cont_sub, patt_dict, detections, line_list, **fit_kwargs)
+    return detections, spec_cont_sub, patt_dict, final_fit, (t1 - t0, time.perf_counter() - t1)
+
+
+def brute_slit(slit, tcent_ecent):
+    """ Run the brute force pattern matching of HolyGrail for one slit
+
+    The HolyGrail object is obtained with pypeit.parallel.get_shared('holygrail'), such that the slits can be
+    distributed over a pool of processes with pypeit.parallel.iter_tasks.
+
+    Parameters
+    ----------
+    slit: int
+       Index of the slit
+    tcent_ecent: list of ndarrays
+       [tcent, ecent] of the lines detected in the slit
+
+    Returns
+    -------
+    best_patt_dict, best_final_fit: dict
+       See HolyGrail.run_brute_loop
+    """
+    return parallel.get_shared('holygrail').run_brute_loop(slit, tcent_ecent)
+
+
+def brute_pattern(slit, tcent_ecent, wavedata, poly, detsrch, lstsrch, pix_tol):
+    """ Generate and solve the patterns of one slit for one set of pattern matching parameters
+
+    The HolyGrail object is obtained with pypeit.parallel.get_shared('holygrail'), such that the parameters searched
+    by HolyGrail.run_brute_loop can be distributed over a pool of processes with pypeit.parallel.iter_tasks.
+
+    Parameters
+    ----------
+    slit: int
+       Index of the slit
+    tcent_ecent: list of ndarrays
+       [tcent, ecent] of the lines detected in the slit
+    wavedata: ndarray
+       Line list used for the patterns; see HolyGrail.results_brute
+    poly, detsrch, lstsrch, pix_tol:
+       Pattern matching parameters; see HolyGrail.results_brute
+
+    Returns
+    -------
+    patt_dict, final_fit: dict
+       See HolyGrail.solve_slit
+    """
+    holygrail = parallel.get_shared('holygrail')
+    psols, msols = holygrail.results_brute(tcent_ecent, poly=poly, pix_tol=pix_tol, detsrch=detsrch,
+                                           lstsrch=lstsrch, wavedata=wavedata)
+    return holygrail.solve_slit(slit, psols, msols, tcent_ecent)
+
+
 class ArchiveReid:
     """ Algorithm to wavelength calibrate spectroscopic data based on an archive of wavelength solutions.
 
@@ -1026,6 +1172,10 @@ class ArchiveReid:
        be added to it to make it odd.
     slit_spat_pos: np.ndarray, optional
        For figuring out the echelle order
+    nproc: int, default = 1
+       Number of processes used to reidentify and fit the slits. The arxiv spectra are prepared (line detection and
+       continuum subtraction) once for all the slits. The time spent in each phase is reported at the end and saved in
+       the timing attribute.
 
     For iterative wavelength solution fitting
     --------------------
@@ -1164,12 +1314,29 @@ class ArchiveReid:
         self.detections = {}
         self.wv_calib = {}
         self.bad_slits = np.array([], dtype=np.int)
+        # Time spent in each phase
+        self.timing = OrderedDict([('arxiv', 0.), ('reidentify', 0.), ('fit', 0.)])
+
+        # The arxiv spectra are prepared once for all the slits: resized
+        # to the size of the slit spectra, and with their lines detected
+        # for each value of sigdetect
+        t0 = time.perf_counter()
+        self.spec_arxiv = arc.resize_spec(self.spec_arxiv, self.nspec)
+        self.wave_soln_arxiv = arc.resize_spec(self.wave_soln_arxiv, self.nspec)
+        self.xcorr_arxiv = xcorr_prep(self.spec_arxiv, fwhm=self.fwhm)
+        slits = [slit for slit in range(self.nslits) if slit in self.ok_mask]
+        det_arxiv = {}
+        for slit in slits:
+            sigdetect = self._parse_param(self.par, 'sigdetect', slit)
+            if sigdetect not in det_arxiv:
+                det_arxiv[sigdetect] = detect_arxiv(self.spec_arxiv, sigdetect=sigdetect,
+                                                    nonlinear_counts=self.nonlinear_counts, fwhm=self.fwhm,
+                                                    debug_peaks=self.debug_peaks)
+        self.timing['arxiv'] = time.perf_counter() - t0
+
         # Reidentify each slit, and perform a fit
-        for slit in range(self.nslits):
-            # ToDO should we still be populating wave_calib with an empty dict here?
-            if slit not in self.ok_mask:
-                continue
-            msgs.info('Reidentifying and fitting slit # {0:d}/{1:d}'.format(slit,self.nslits-1))
+        args = []
+        for slit in slits:
             # If this is a fixed format echelle, arxiv has exactly the same orders as the data and so
             # we only pass in the relevant arxiv spectrum to make this much faster
             if self.ech_fix_format:
@@ -1179,31 +1346,36 @@ class ArchiveReid:
                 ind_sp = arxiv_orders.index(order)
             else:
                 ind_sp = np.arange(narxiv,dtype=int)
-
             sigdetect = self._parse_param(self.par, 'sigdetect', slit)
-            cc_thresh = self._parse_param(self.par, 'cc_thresh', slit)
-            self.detections[str(slit)], self.spec_cont_sub[:,slit], self.all_patt_dict[str(slit)] = \
-                reidentify(self.spec[:,slit], self.spec_arxiv[:,ind_sp], self.wave_soln_arxiv[:,ind_sp],
-                           self.tot_line_list, self.nreid_min, cc_thresh=cc_thresh, match_toler=self.match_toler,
-                           cc_local_thresh=self.cc_local_thresh, nlocal_cc=self.nlocal_cc, nonlinear_counts=self.nonlinear_counts,
-                           sigdetect=sigdetect, fwhm=self.fwhm, debug_peaks=self.debug_peaks, debug_xcorr=self.debug_xcorr,
-                           debug_reid=self.debug_reid)
+            reid_kwargs = dict(cc_thresh=self._parse_param(self.par, 'cc_thresh', slit),
+                               match_toler=self.match_toler, cc_local_thresh=self.cc_local_thresh,
+                               nlocal_cc=self.nlocal_cc, nonlinear_counts=self.nonlinear_counts,
+                               sigdetect=sigdetect, fwhm=self.fwhm, debug_peaks=self.debug_peaks,
+                               debug_xcorr=self.debug_xcorr, debug_reid=self.debug_reid)
+            fit_kwargs = dict(match_toler=self.match_toler, func=self.func, n_first=self.n_first,
+                              sigrej_first=self.sigrej_first,
+                              n_final=self._parse_param(self.par, 'n_final', slit),
+                              sigrej_final=self.sigrej_final)
+            _det_arxiv = dict([(str(i), det_arxiv[sigdetect][str(j)])
+                                    for i, j in enumerate(np.atleast_1d(ind_sp))])
+            args += [(slit, ind_sp, self.nreid_min, _det_arxiv, reid_kwargs, fit_kwargs)]
+        # The slits are independent, so they can be done in parallel.
+        # Plotting requires them to be done serially.
+        debug = self.debug_peaks or self.debug_xcorr or self.debug_reid
+        nproc = 1 if debug else self.par['nproc']
+        shared = dict(spec=self.spec.reshape(self.nspec, -1), spec_arxiv=self.spec_arxiv,
+                      wave_soln_arxiv=self.wave_soln_arxiv, xcorr_arxiv=self.xcorr_arxiv,
+                      line_list=self.tot_line_list)
+        for slit, result in zip(slits, parallel.iter_tasks(reidentify_slit, args, nproc=nproc,
+                                                           shared=shared)):
+            msgs.info('Reidentified and fit slit # {0:d}/{1:d}'.format(slit,self.nslits-1))
+            self.detections[str(slit)], self.spec_cont_sub[:,slit], self.all_patt_dict[str(slit)], \
+                    final_fit, timing = result
+            self.timing['reidentify'] += timing[0]
+            self.timing['fit'] += timing[1]
             # Check if an acceptable reidentification solution was found
-            if not self.all_patt_dict[str(slit)]['acceptable']:
-                self.wv_calib[str(slit)] = {}
-                self.bad_slits = np.append(self.bad_slits, slit)
-                continue
-
-            # Perform the fit
-            n_final = self._parse_param(self.par, 'n_final', slit)
-            final_fit = fitting.fit_slit(self.spec_cont_sub[:, slit], self.all_patt_dict[str(slit)],
-                                         self.detections[str(slit)],
-                                         self.tot_line_list, match_toler=self.match_toler,func=self.func, n_first=self.n_first,
-                                         sigrej_first=self.sigrej_first, n_final=n_final,sigrej_final=self.sigrej_final)
-
-            # Did the fit succeed?
-            if final_fit is None:
-                # This pattern wasn't good enough
+            # and if the fit succeeded
+            if not self.all_patt_dict[str(slit)]['acceptable'] or final_fit is None:
                 self.wv_calib[str(slit)] = {}
                 self.bad_slits = np.append(self.bad_slits, slit)
                 continue
@@ -1219,10 +1391,15 @@ class ArchiveReid:
                 # Note this result in new_bad_slits, but store the solution since this might be the best possible
 
             # Add the patt_dict and wv_calib to the output dicts
-            self.wv_calib[str(slit)] = copy.deepcopy(final_fit)
+            self.wv_calib[str(slit)] = final_fit
             if self.debug_fits:
                 arc_fit_qa(self.wv_calib[str(slit)], title='Silt: {}'.format(str(slit)))
 
+        msgs.info('Time spent on the arxiv preparation: {0:.1f} s; '.format(self.timing['arxiv'])
+                  + 'reidentification: {0:.1f} s; fits: {1:.1f} s'.format(self.timing['reidentify'],
+                                                                          self.timing['fit'])
+                  + ('' if nproc == 1 else ' (summed over {0} processes)'.format(nproc)))
+
         # Print the final report of all lines
         self.report_final()
         #embed()
@@ -1296,7 +1473,7 @@ class HolyGrail:
     -------------------
     par : ParSet or dict, default = default parset
        This is the parset par['calibrations']['wavelengths']. A dictionary with the corresponding parameter names also
-       works.
+       works. The brute force search uses par['nproc'] processes.
     ok_mask : ndarray
       Array of good slits
     islinelist : bool
@@ -1370,6 +1547,8 @@ class HolyGrail:
 
         self._debug = debug
         self._verbose = verbose
+        # Debugging plots require a single process
+        self._nproc = 1 if self._debug else self._par['nproc']
 
         # Load the linelist to be used for pattern matching
         if self._islinelist:
@@ -1434,6 +1613,28 @@ class HolyGrail:
         return
 
     def run_brute_loop(self, slit, tcent_ecent, wavedata=None):
+        """ Search the pattern matching parameters for the best solution of one slit
+
+        The parameter sets are distributed over self._nproc processes, unless this is called by a worker process
+        (see run_brute). The results are inspected in order, and the search stops, cancelling the pending parameter
+        sets, as soon as enough lines have been identified on both sides of the spectrum.
+
+        Parameters
+        ----------
+        slit : int
+          Index of the slit
+        tcent_ecent : list of ndarrays
+          [tcent, ecent] of the lines detected in the slit
+        wavedata : ndarray, optional
+          Line list used for the patterns; see results_brute
+
+        Returns
+        -------
+        best_patt_dict : dict
+          Results of the pattern matching of the best solution; None if no solution was found
+        best_final_fit : dict
+          Fit of the best solution; None if no solution was found
+        """
         # Set the parameter space that gets searched
         rng_poly = [3, 4]            # Range of algorithms to check (only trigons+tetragons are supported)
         rng_list = range(3, 6)       # Number of lines to search over for the linelist
@@ -1442,41 +1643,47 @@ class HolyGrail:
         idthresh = 0.5               # Criteria for early return (at least this fraction of lines must have
                                      # an ID on either side of the spectrum)
 
+        # JFH Note that results_brute and solve_slit are running on the same set of detections. I think this is the way
+        # it should be.
+        args = [(slit, tcent_ecent, wavedata, poly, detsrch, lstsrch, pix_tol)
+                    for poly in rng_poly for detsrch in rng_detn for lstsrch in rng_list for pix_tol in rng_pixt]
+        results = parallel.iter_tasks(brute_pattern, args, nproc=self._nproc, shared={'holygrail': self})
+
         best_patt_dict, best_final_fit = None, None
         # Loop through parameter space
-        for poly in rng_poly:
-            for detsrch in rng_detn:
-                for lstsrch in rng_list:
-                    for pix_tol in rng_pixt:
-                        # JFH Note that results_brute and solve_slit are running on the same set of detections. I think this is the way
-                        # it should be.
-                        psols, msols = self.results_brute(tcent_ecent,poly=poly, pix_tol=pix_tol,
-                                                          detsrch=detsrch, lstsrch=lstsrch,wavedata=wavedata)
-                        patt_dict, final_fit = self.solve_slit(slit, psols, msols,tcent_ecent)
-                        if final_fit is None:
-                            # This is not a good solution
-                            continue
-                        # Test if this solution is better than the currently favoured solution
-                        if best_patt_dict is None:
-                            # First time a fit is found
-                            best_patt_dict, best_final_fit = copy.deepcopy(patt_dict), copy.deepcopy(final_fit)
-                            continue
-                        elif final_fit['rms'] < self._rms_threshold:
-                            # Has a better fit been identified (i.e. more lines identified)?
-                            if len(final_fit['pixel_fit']) > len(best_final_fit['pixel_fit']):
-                                best_patt_dict, best_final_fit = copy.deepcopy(patt_dict), copy.deepcopy(final_fit)
-                            # Decide if an early return is acceptable
-                            nlft = np.sum(best_final_fit['tcent'] < best_final_fit['nspec']/2.0)
-                            nrgt = best_final_fit['tcent'].size-nlft
-                            if np.sum(best_final_fit['pixel_fit'] < 0.5)/nlft > idthresh and\
-                                np.sum(best_final_fit['pixel_fit'] >= 0.5) / nrgt > idthresh:
-                                # At least half of the lines on either side of the spectrum have been identified
-                                return best_patt_dict, best_final_fit
+        try:
+            for patt_dict, final_fit in results:
+                if final_fit is None:
+                    # This is not a good solution
+                    continue
+                # Test if this solution is better than the currently favoured solution
+                if best_patt_dict is None:
+                    # First time a fit is found
+                    best_patt_dict, best_final_fit = patt_dict, final_fit
+                    continue
+                elif final_fit['rms'] < self._rms_threshold:
+                    # Has a better fit been identified (i.e. more lines identified)?
+                    if len(final_fit['pixel_fit']) > len(best_final_fit['pixel_fit']):
+                        best_patt_dict, best_final_fit = patt_dict, final_fit
+                    # Decide if an early return is acceptable
+                    nlft = np.sum(best_final_fit['tcent'] < best_final_fit['nspec']/2.0)
+                    nrgt = best_final_fit['tcent'].size-nlft
+                    if np.sum(best_final_fit['pixel_fit'] < 0.5)/nlft > idthresh and\
+                        np.sum(best_final_fit['pixel_fit'] >= 0.5) / nrgt > idthresh:
+                        # At least half of the lines on either side of the spectrum have been identified
+                        return best_patt_dict, best_final_fit
+        finally:
+            # Cancel any remaining parameter sets
+            results.close()
 
         return best_patt_dict, best_final_fit
 
     def run_brute(self, min_nlines=10):
         """Run through the parameter space and determine the best solution
+
+        The lines of all slits are detected first. The slits are then searched independently, distributed over
+        self._nproc processes when there is more than one slit to search; otherwise the parameter space of the single
+        slit is distributed (see run_brute_loop).
         """
 
         # ToDo This code appears to use the weak lines for everything throughout
@@ -1485,6 +1692,7 @@ class HolyGrail:
         good_fit = np.zeros(self._nslit, dtype=np.bool)
         self._det_weak = {}
         self._det_stro = {}
+        search_slits = []
         for slit in range(self._nslit):
             msgs.info("Working on slit: {}".format(slit))
             if slit not in self._ok_mask:
@@ -1509,10 +1717,12 @@ class HolyGrail:
             # Setup up the line detection dicts
             self._det_weak[str(slit)] = [self._all_tcent_weak[self._icut_weak].copy(),self._all_ecent_weak[self._icut_weak].copy()]
             self._det_stro[str(slit)] = [self._all_tcent[self._icut].copy(),self._all_ecent[self._icut].copy()]
+            search_slits.append(slit)
 
-            # Run brute force algorithm on the weak lines
-            best_patt_dict, best_final_fit = self.run_brute_loop(slit,self._det_weak[str(slit)])
-
+        # Run brute force algorithm on the weak lines
+        results = parallel.iter_tasks(brute_slit, [(slit, self._det_weak[str(slit)]) for slit in search_slits],
+                                      nproc=self._nproc, shared={'holygrail': self})
+        for slit, (best_patt_dict, best_final_fit) in zip(search_slits, results):
             # Print preliminary report
             good_fit[slit] = self.report_prelim(slit, best_patt_dict, best_final_fit)
 
@@ -2321,9 +2531,9 @@ class HolyGrail:
         #histimgp = gaussian_filter(histimgp, 3)
         #histimgm = gaussian_filter(histimgm, 3)
         histimg = histimgp - histimgm
-        sm_histimg = gaussian_filter(histimg, [30, 15])
 
-        #histpeaks = patterns.detect_2Dpeaks(np.abs(sm_histimg))
+        # Peaks are found in the unsmoothed histogram; smoothing it with
+        # gaussian_filter(histimg, [30, 15]) dominated the run time
         histpeaks = patterns.detect_2Dpeaks(np.abs(histimg))
 
         # Find the indices of the nstore largest peaks
@@ -2421,7 +2631,7 @@ class HolyGrail:
             elif tfinal_dict['rms'] < self._rms_threshold:
                 # Has a better fit been identified (i.e. more lines ID)?
                 if len(tfinal_dict['pixel_fit']) > len(final_dict['pixel_fit']):
-                    patt_dict, final_dict = copy.deepcopy(tpatt_dict), copy.deepcopy(tfinal_dict)
+                    patt_dict, final_dict = tpatt_dict, tfinal_dict
         return patt_dict, final_dict
 
     def solve_patterns(self, bestlist, tcent_ecent):
@@ -2461,7 +2671,7 @@ class HolyGrail:
             msgs.info('---------------------------------------------------' + msgs.newline() +
                       'Initial report:' + msgs.newline() +
                       '  Pixels {:s} with wavelength'.format(signtxt) + msgs.newline() +
-                      '  Number of lines recovered    = {:d}'.format(self._all_tcent.size) + msgs.newline() +
+                      '  Number of lines recovered    = {:d}'.format(tcent_ecent[0].size) + msgs.newline() +
                       '  Number of lines analyzed     = {:d}'.format(use_tcent.size) + msgs.newline() +
                       '  Number of acceptable matches = {:d}'.format(patt_dict['nmatch']) + msgs.newline() +
                       '  Best central wavelength      = {:g}A'.format(patt_dict['bwv']) + msgs.newline() +
@@ -2571,8 +2781,8 @@ class HolyGrail:
                             outfile=self._outroot + slittxt + '.pdf')
                 msgs.info("Wrote: {:s}".format(self._outroot + slittxt + '.pdf'))
             # Perform the final fit for the best solution
-            best_final_fit = self.fit_slit(slit, self._all_patt_dict[str(slit)], use_tcent, outroot=self._outroot, slittxt=slittxt)
-            self._all_final_fit[str(slit)] = copy.deepcopy(best_final_fit)
+            self._all_final_fit[str(slit)] = self.fit_slit(slit, self._all_patt_dict[str(slit)], use_tcent,
+                                                           outroot=self._outroot, slittxt=slittxt)
 
     def report_prelim(self, slit, best_patt_dict, best_final_fit):
 
@@ -2611,8 +2821,8 @@ class HolyGrail:
                       '  Best patt match wave/disp    = {:g}'.format(best_patt_dict['bwv']/best_patt_dict['bdisp']) + msgs.newline() +
                       '  Final RMS of fit             = {:g}'.format(best_final_fit['rms']) + msgs.newline() +
                       '---------------------------------------------------')
-            self._all_patt_dict[str(slit)] = copy.deepcopy(best_patt_dict)
-            self._all_final_fit[str(slit)] = copy.deepcopy(best_final_fit)
+            self._all_patt_dict[str(slit)] = best_patt_dict
+            self._all_final_fit[str(slit)] = best_final_fit
         return good_fit
 
     def report_final(self):
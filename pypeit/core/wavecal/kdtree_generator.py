@@ -4,9 +4,9 @@ present, this method is only used for calibrating ThAr lamps.
 
 You should not run this script unless you know what you're doing,
 since you could mess up the ThAr patterns that are used in the
-wavelength calibration routine. This script should not be called
-from within PypeIt - it should be run as a standalone script, and
-it's only purpose is to generate a KD Tree with the desired patterns.
+wavelength calibration routine. The trees used by PypeIt should be
+built ahead of time with the pypeit_build_kdtree script, which calls
+main for each polygon and number of lines to search.
 """
 
 # NOTE: No longer used.  Use KD tree in scikit-learn:
@@ -19,7 +19,7 @@ from astropy.table import vstack
 import numba as nb
 from scipy.spatial import cKDTree
 import numpy as np
-import pickle
+import hashlib
 
 
 @nb.jit(nopython=True, cache=True)
@@ -230,6 +230,47 @@ def hexagon(linelist, numsrch, maxlin):
     return pattern, index
 
 
+def thar_lines(use_unknowns=True):
+    """ Sorted wavelengths of the ThAr lines used to generate the patterns
+
+    Parameters
+    ----------
+    use_unknowns : bool
+      Include unknown lines in the wavelength calibration (these may arise from lines other than Th I/II and Ar I/II)
+
+    Returns
+    -------
+    wvdata : ndarray
+      Wavelengths of the lines
+    """
+    line_lists_all = waveio.load_line_lists(['ThAr'])
+    line_lists = line_lists_all[np.where(line_lists_all['ion'] != 'UNKNWN')]
+    unknwns = line_lists_all[np.where(line_lists_all['ion'] == 'UNKNWN')]
+    if use_unknowns:
+        tot_list = vstack([line_lists, unknwns])
+    else:
+        tot_list = line_lists
+    wvdata = np.array(tot_list['wave'].data)  # Removes mask if any
+    wvdata.sort()
+    return wvdata
+
+
+def line_checksum(use_unknowns=True):
+    """ Checksum of the ThAr lines, used to detect trees generated from an older linelist
+
+    Parameters
+    ----------
+    use_unknowns : bool
+      See thar_lines
+
+    Returns
+    -------
+    checksum : str
+      MD5 checksum of the wavelengths of the lines
+    """
+    return hashlib.md5(np.ascontiguousarray(thar_lines(use_unknowns), dtype=float).tobytes()).hexdigest()
+
+
 def main(polygon, numsearch=8, maxlinear=100.0, use_unknowns=True, leafsize=30, verbose=False,
          ret_treeindx=False, outname=None, ):
     """Driving method for generating the KD Tree
@@ -246,18 +287,16 @@ def main(polygon, numsearch=8, maxlinear=100.0, use_unknowns=True, leafsize=30,
       Include unknown lines in the wavelength calibration (these may arise from lines other than Th I/II and Ar I/II)
     leafsize : int
       The leaf size of the tree
+    verbose : bool
+      Print the progress
+    ret_treeindx : bool
+      Return the tree and the index
+    outname : str, optional
+      Root name of the output files; see waveio.tree_root, which is the default
     """
 
     # Load the ThAr linelist
-    line_lists_all = waveio.load_line_lists(['ThAr'])
-    line_lists = line_lists_all[np.where(line_lists_all['ion'] != 'UNKNWN')]
-    unknwns = line_lists_all[np.where(line_lists_all['ion'] == 'UNKNWN')]
-    if use_unknowns:
-        tot_list = vstack([line_lists, unknwns])
-    else:
-        tot_list = line_lists
-    wvdata = np.array(tot_list['wave'].data)  # Removes mask if any
-    wvdata.sort()
+    wvdata = thar_lines(use_unknowns)
 
     # NIST_lines = (line_lists_all['NIST'] > 0) & (np.char.find(line_lists_all['Source'].data, 'MURPHY') >= 0)
     # wvdata = line_lists_all['wave'].data[NIST_lines]
@@ -280,17 +319,13 @@ def main(polygon, numsearch=8, maxlinear=100.0, use_unknowns=True, leafsize=30,
         return None
 
     if outname is None:
-        outname = '../../data/arc_lines/lists/ThAr_patterns_poly{0:d}_search{1:d}.kdtree'.format(polygon, numsearch)
-    outindx = outname.replace('.kdtree', '.index')
-    print("Generating Tree")
+        outname = waveio.tree_root(polygon, numsearch)
+    if verbose: print("Generating Tree")
     tree = cKDTree(pattern, leafsize=leafsize)
-    print("Saving Tree")
-    pickle.dump(tree, open(outname, 'wb'))
-    print("Written KD Tree file:\n{0:s}".format(outname))
-    np.save(outindx, index)
-    print("Written index file:\n{0:s}".format(outindx))
-    #_ = pickle.load(open(outname, 'rb'))
-    #print("loaded successfully")
+    if verbose: print("Saving Tree")
+    waveio.save_tree(outname, tree, index, dict(polygon=polygon, numsearch=numsearch, maxlinear=maxlinear,
+                                                use_unknowns=use_unknowns, checksum=line_checksum(use_unknowns)))
+    if verbose: print("Written KD Tree files:\n{0:s}.*".format(outname))
     if ret_treeindx:
         return tree, index
 
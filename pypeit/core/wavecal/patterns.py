@@ -1,9 +1,11 @@
 """ Module for finding patterns in arc line spectra
 """
+import itertools
+import functools
+
 import numpy as np
 from scipy.ndimage.filters import maximum_filter
 from scipy.ndimage.morphology import generate_binary_structure, binary_erosion
-import numba as nb
 
 
 def detect_2Dpeaks(image):
@@ -259,7 +261,198 @@ def score_quad_matches(fidx):
     return scores
 
 
-@nb.jit(nopython=True, cache=True)
+def to_ulong(arr):
+    """ Truncate an array to unsigned integers. Values that cannot be
+        represented (negative, too large or NaN) are set to the largest
+        unsigned integer.
+
+    Parameters
+    ----------
+    arr : ndarray
+      Array to truncate
+
+    Returns
+    -------
+    ulong : ndarray
+      Truncated array of type uint64
+    """
+    ulong = np.full(arr.shape, np.iinfo(np.uint64).max, dtype=np.uint64)
+    valid = (arr > -1) & (arr < 2.0**64)
+    ulong[valid] = arr[valid].astype(np.uint64)
+    return ulong
+
+
+@functools.lru_cache(maxsize=None)
+def pattern_indices(nlines, nptn, srch, ordered=True):
+    """ Indices of all the patterns that can be built from a set of lines.
+        A pattern consists of a start line, an end line that is less than
+        srch lines away, and nptn-2 lines in between. The patterns are sorted
+        by start line, end line and then by the lines in between.
+
+    Parameters
+    ----------
+    nlines : int
+      Number of lines (sorted, increasing)
+    nptn : int
+      Number of lines used to create a pattern
+    srch : int
+      Number of consecutive lines to use to create a pattern (-1 means all lines)
+    ordered : bool
+      If True, the lines in between are increasing. Otherwise, all
+      permutations of the lines in between are used.
+
+    Returns
+    -------
+    index : ndarray
+      Read-only index array of the lines used in each pattern, with shape (npatterns, nptn)
+    """
+    maxspan = nlines if srch == -1 else min(srch, nlines)
+    select = itertools.combinations if ordered else itertools.permutations
+    index = [np.zeros((0, nptn), dtype=int)]
+    for span in range(nptn-1, maxspan):
+        mid = np.array(list(select(range(1, span), nptn-2)), dtype=int).reshape(-1, nptn-2)
+        start = np.arange(nlines-span)
+        patt = np.empty((start.size, mid.shape[0], nptn), dtype=int)
+        patt[:, :, 0] = start[:, None]
+        patt[:, :, 1:-1] = start[:, None, None] + mid[None, :, :]
+        patt[:, :, -1] = start[:, None] + span
+        index.append(patt.reshape(-1, nptn))
+    index = np.concatenate(index)
+    # Sort by start line, end line and then the lines in between
+    keys = tuple(index[:, k] for k in range(nptn-2, 0, -1)) + (index[:, -1], index[:, 0])
+    index = index[np.lexsort(keys)]
+    index.flags.writeable = False
+    return index
+
+
+def pattern_values(lines, index):
+    """ Positions of the lines in between, relative to the start and end
+        lines of each pattern.
+
+    Parameters
+    ----------
+    lines : ndarray
+      list of lines (sorted, increasing)
+    index : ndarray
+      Index array of the lines used in each pattern (see pattern_indices)
+
+    Returns
+    -------
+    vals : ndarray
+      (b-s)/(e-s) for each line in between (b) of each pattern, with shape (npatterns, nptn-2)
+    span : ndarray
+      e-s for each pattern
+    """
+    span = lines[index[:, -1]] - lines[index[:, 0]]
+    vals = (lines[index[:, 1:-1]] - lines[index[:, :1]]) / span[:, None]
+    return vals, span
+
+
+# Patterns of the line lists, which do not change between slits or
+# between the parameters searched by the brute force algorithm
+_linelist_patterns = {}
+
+
+def linelist_patterns(linelist, nptn, lstsrch):
+    """ Memoized patterns of a line list.
+
+    Parameters
+    ----------
+    linelist : ndarray
+      list of lines that should be detected (sorted, increasing)
+    nptn : int
+      Number of lines used to create a pattern
+    lstsrch : int
+      Number of consecutive elements in linelist to use to create a pattern (-1 means all lines in linelist)
+
+    Returns
+    -------
+    index : ndarray
+      Index array of the lines used in each pattern
+    vals : ndarray
+      Relative positions of the lines in between (see pattern_values)
+    span : ndarray
+      Wavelength range of each pattern
+    srt : ndarray
+      Indices that sort the patterns by the first column of vals
+    """
+    key = (linelist.dtype.str, linelist.tobytes(), nptn, lstsrch)
+    if key not in _linelist_patterns:
+        if len(_linelist_patterns) >= 32:
+            _linelist_patterns.clear()
+        index = pattern_indices(linelist.size, nptn, lstsrch)
+        vals, span = pattern_values(linelist, index)
+        srt = np.argsort(vals[:, 0], kind='stable')
+        for arr in [vals, span, srt]:
+            arr.flags.writeable = False
+        _linelist_patterns[key] = (index, vals, span, srt)
+    return _linelist_patterns[key]
+
+
+def match_patterns(detlines, linelist, npixels, nptn, detsrch, lstsrch, pixtol, ordered=True):
+    """ Match the patterns of detlines to the patterns of linelist. A pair
+        of patterns matches when all the relative positions of the lines in
+        between agree to within pixtol.
+
+    Parameters
+    ----------
+    detlines : ndarray
+      list of detected lines in pixels (sorted, increasing)
+    linelist : ndarray
+      list of lines that should be detected (sorted, increasing)
+    npixels : float
+      Number of pixels along the dispersion direction
+    nptn : int
+      Number of lines used to create a pattern
+    detsrch : int
+      Number of consecutive elements in detlines to use to create a pattern (-1 means all lines in detlines)
+    lstsrch : int
+      Number of consecutive elements in linelist to use to create a pattern (-1 means all lines in linelist)
+    pixtol : float
+      tolerance that is used to determine if a match is successful (in units of pixels)
+    ordered : bool
+      If False, the lines in between of the detlines patterns are not required to be increasing
+
+    Returns
+    -------
+    dindex : ndarray
+      Index array of all detlines used in each pattern
+    lindex : ndarray
+      Index array of the assigned line to each index in dindex
+    wvcen : ndarray
+      central wavelength of each pattern
+    disps : ndarray
+      Dispersion of each pattern (angstroms/pixel)
+    """
+    didx = pattern_indices(detlines.size, nptn, detsrch, ordered)
+    dvals, dspan = pattern_values(detlines, didx)
+    tol = pixtol / dspan
+    lidx, lvals, lspan, srt = linelist_patterns(linelist, nptn, lstsrch)
+
+    # Find the candidate matches of the first line in between. The search
+    # window is slightly wider than the tolerance so that no match is lost
+    # to round-off; the tolerance is applied exactly below.
+    lsrt = lvals[srt, 0]
+    lo = np.searchsorted(lsrt, dvals[:, 0] - tol - 1e-10, side='left')
+    hi = np.searchsorted(lsrt, dvals[:, 0] + tol + 1e-10, side='right')
+    ncand = hi - lo
+    di = np.repeat(np.arange(didx.shape[0]), ncand)
+    li = srt[np.repeat(lo, ncand) + np.arange(di.size) - np.repeat(np.cumsum(ncand) - ncand, ncand)]
+
+    # Check all the lines in between
+    good = np.all(np.abs(lvals[li] - dvals[di]) <= tol[di, None], axis=1)
+    di, li = di[good], li[good]
+    # Sort by detlines pattern and then linelist pattern
+    srt = np.lexsort((li, di))
+    di, li = di[srt], li[srt]
+
+    dindex = didx[di].astype(np.uint64)
+    lindex = lidx[li].astype(np.uint64)
+    disps = lspan[li] / dspan[di]
+    wvcen = (npixels/2.0) * disps + (linelist[lidx[li, -1]] - disps*detlines[didx[di, -1]])
+    return dindex, lindex, wvcen, disps
+
+
 def triangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixtol=1.0):
     """ Brute force pattern recognition using triangles. A triangle contains
         (for either detlines or linelist):
@@ -302,79 +495,12 @@ def triangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixtol=1.0):
       central wavelength of each triangle
     disps : ndarray
       Dispersion of each triangle (angstroms/pixel)
-    """
-
-    nptn = 3  # Number of lines used to create a pattern
-
-    sz_d = detlines.size
-    sz_l = linelist.size
 
-    # Count the number of detlines patterns that will be created
-    cntdet = 0
-    dup = 0
-    for d in range(detsrch-nptn+1):
-        dup += d+1
-        if d == detsrch-nptn:
-            cntdet += dup*(sz_d-detsrch+1)
-        else:
-            cntdet += dup
-
-    # Count the number of linelist patterns that will be created
-    cntlst = 0
-    lup = 0
-    for l in range(lstsrch-nptn+1):
-        lup += l+1
-        if l == lstsrch-nptn:
-            cntlst += lup*(sz_l-lstsrch+1)
-        else:
-            cntlst += lup
-
-    lindex = np.zeros((cntdet*cntlst, nptn), dtype=nb.types.uint64)
-    dindex = np.zeros((cntdet*cntlst, nptn), dtype=nb.types.uint64)
-    wvcen = np.zeros((cntdet*cntlst))
-    disps = np.zeros((cntdet*cntlst))
-
-    # Test each detlines combination
-    cntdet = 0
-    for d in range(0, sz_d-nptn+1):      # d is the starting point of the pattern
-        dup = d + detsrch
-        if dup > sz_d:
-            dup = sz_d
-        if detsrch == -1:
-            dup = sz_d
-        for dd in range(d+nptn-1, dup):  # dd is the end point of the pattern
-            for xd in range(d+1, dd):  # xd is the mid point of the pattern
-                # Create the test pattern
-                dval = (detlines[xd]-detlines[d])/(detlines[dd]-detlines[d])
-                tol = pixtol/(detlines[dd]-detlines[d])
-                # Search through all possible patterns in the linelist
-                for l in range(0, sz_l-nptn+1):
-                    lup = l + lstsrch
-                    if lup > sz_l:
-                        lup = sz_l
-                    if lstsrch == -1:
-                        lup = sz_l
-                    for ll in range(l+nptn-1, lup):
-                        for xl in range(l+1, ll):
-                            lval = (linelist[xl]-linelist[l])/(linelist[ll]-linelist[l])
-                            tst = lval-dval
-                            if tst < 0.0:
-                                tst *= -1.0
-                            if tst <= tol:
-                                lindex[cntdet, 0] = l
-                                lindex[cntdet, 1] = xl
-                                lindex[cntdet, 2] = ll
-                                dindex[cntdet, 0] = d
-                                dindex[cntdet, 1] = xd
-                                dindex[cntdet, 2] = dd
-                                tst = (linelist[ll]-linelist[l]) / (detlines[dd]-detlines[d])
-                                wvcen[cntdet] = (npixels/2.0) * tst + (linelist[ll]-tst*detlines[dd])
-                                disps[cntdet] = tst
-                            cntdet += 1
-    return dindex, lindex, wvcen, disps
+    Only the pairs of matching triangles are returned.
+    """
+    return match_patterns(detlines, linelist, npixels, 3, detsrch, lstsrch, pixtol)
 
 
-@nb.jit(nopython=True, cache=True)
 def quadrangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixtol=1.0):
     """ Brute force pattern recognition using quadrangles. A quadrangle contains
         (for either detlines or linelist):
@@ -414,70 +540,15 @@ def quadrangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixtol=1.0):
     lindex : ndarray
       Index array of the assigned line to each index in dindex
     wvcen : ndarray
-      central wavelength of each triangle
+      central wavelength of each quadrangle, truncated to an unsigned integer
     disps : ndarray
-      Dispersion of each triangle (angstroms/pixel)
+      Dispersion of each quadrangle (angstroms/pixel), truncated to an
+      unsigned integer such that dispersions below 1 Angstrom/pixel are 0
     """
+    dindex, lindex, wvcen, disps = match_patterns(detlines, linelist, npixels, 4, detsrch, lstsrch, pixtol)
+    return dindex, lindex, to_ulong(wvcen), to_ulong(disps)
+
 
-    nptn = 4  # Number of lines used to create a pattern
-
-    sz_d = detlines.size
-    sz_l = linelist.size
-
-    lindex = np.zeros((1, nptn), dtype=nb.types.uint64)
-    dindex = np.zeros((1, nptn), dtype=nb.types.uint64)
-    wvcen = np.zeros((1,), dtype=nb.types.ulong)
-    disps = np.zeros((1,), dtype=nb.types.ulong)
-
-    # Generate the patterns
-    for dl in range(0, sz_d-nptn+1):  # dl is the starting point of the detlines pattern
-        dup = dl + detsrch
-        if dup > sz_d:
-            dup = sz_d
-        if detsrch == -1:
-            dup = sz_d
-        for dr in range(dl+nptn-1, dup):  # dr is the end point of the detlines pattern
-            # Set the tolerance
-            tol = pixtol / (detlines[dr] - detlines[dl])
-            for da in range(dl+1, dr-1):  # da is the left mid point of the detlines pattern
-                # Create the test pattern
-                daval = (detlines[da]-detlines[dl])/(detlines[dr]-detlines[dl])
-                for db in range(da+1, dr):  # db is the right mid point of the detlines pattern
-                    # Create the test pattern
-                    dbval = (detlines[db]-detlines[dl])/(detlines[dr]-detlines[dl])
-                    # Search through all possible patterns in the linelist
-                    for ll in range(0, sz_l-nptn+1):  # ll is the start point of the linelist pattern
-                        lup = ll + lstsrch
-                        if lup > sz_l:
-                            lup = sz_l
-                        if lstsrch == -1:
-                            lup = sz_l
-                        for lr in range(ll+nptn-1, lup):  # lr is the end point of the linelist pattern
-                            for la in range(ll+1, lr-1):  # la is the end point of the linelist pattern
-                                laval = (linelist[la] - linelist[ll]) / (linelist[lr] - linelist[ll])
-                                tst = laval - daval
-                                if tst < 0.0:
-                                    tst *= -1.0
-                                if tst <= tol:
-                                    # The first pattern matches, check the second one.
-                                    for lb in range(la+1, lr):  # la is the end point of the linelist pattern
-                                        lbval = (linelist[lb] - linelist[ll]) / (linelist[lr] - linelist[ll])
-                                        tst = lbval - dbval
-                                        if tst < 0.0:
-                                            tst *= -1.0
-                                        if tst <= tol:
-                                            # The second pattern matches, store the result!
-                                            lindex = np.vstack((lindex, np.array([[ll, la, lb, lr]], dtype=nb.types.uint64)))
-                                            dindex = np.vstack((dindex, np.array([[dl, da, db, dr]], dtype=nb.types.uint64)))
-                                            tst = (linelist[lr] - linelist[ll]) / (detlines[dr] - detlines[dl])
-                                            wvl = (npixels/2.)*tst + (linelist[lr]-tst*detlines[dr])
-                                            wvcen = np.hstack((wvcen, np.array([wvl], dtype=nb.types.ulong)))
-                                            disps = np.hstack((disps, np.array([tst], dtype=nb.types.ulong)))
-    # Return, but first remove the spurious first entry due to array creation
-    return dindex[1:, :], lindex[1:, :], wvcen[1:], disps[1:]
-
-
-@nb.jit(nopython=True, cache=True)
 def curved_quadrangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixtol=1.0):
     """ Brute force pattern recognition using curved quadrangles.
         A curved quadrangle contains (for either detlines or linelist):
@@ -514,73 +585,15 @@ def curved_quadrangles(detlines, linelist, npixels, detsrch=5, lstsrch=10, pixto
     Returns
     -------
     dindex : ndarray
-      Index array of all detlines used in each triangle
+      Index array of all detlines used in each quadrangle, ordered as (l, m, c, r)
     lindex : ndarray
       Index array of the assigned line to each index in dindex
     wvcen : ndarray
-      central wavelength of each triangle
+      central wavelength of each quadrangle
     disps : ndarray
-      Dispersion of each triangle (angstroms/pixel)
+      Dispersion of each quadrangle (angstroms/pixel)
     """
-
-    nptn = 4  # Number of lines used to create a pattern
-
-    sz_d = detlines.size
-    sz_l = linelist.size
-
-    lindex = np.zeros((1, nptn), dtype=nb.types.uint64)
-    dindex = np.zeros((1, nptn), dtype=nb.types.uint64)
-    wvcen = np.zeros((1,), dtype=nb.types.ulong)
-    disps = np.zeros((1,), dtype=nb.types.ulong)
-
-    # Generate the patterns
-    for dl in range(0, sz_d-nptn+1):  # dl is the starting point of the detlines pattern
-        dup = dl + detsrch
-        if dup > sz_d:
-            dup = sz_d
-        if detsrch == -1:
-            dup = sz_d
-        for dr in range(dl+nptn-1, dup):  # dr is the end point of the detlines pattern
-            # Set the tolerance
-            tol = pixtol / (detlines[dr] - detlines[dl])
-            for dm in range(dl+1, dr):  # dm is the left mid point of the detlines pattern
-                # Prepare the pattern
-                coeffs = np.linalg.lstsq(detlines[dm]-detlines[dl])/(detlines[dr]-detlines[dl])
-                for da in range(dl+1, dr):  # da is the right mid point of the detlines pattern
-                    if dm == da:
-                        continue
-                    # Create the test pattern
-                    daval = (detlines[da]-detlines[dl])/(detlines[dr]-detlines[dl])
-                    # Search through all possible patterns in the linelist
-                    for ll in range(0, sz_l-nptn+1):  # ll is the start point of the linelist pattern
-                        lup = ll + lstsrch
-                        if lup > sz_l:
-                            lup = sz_l
-                        if lstsrch == -1:
-                            lup = sz_l
-                        for lr in range(ll+nptn-1, lup):  # lr is the end point of the linelist pattern
-                            for la in range(ll+1, lr-1):  # la is the end point of the linelist pattern
-                                laval = (linelist[la] - linelist[ll]) / (linelist[lr] - linelist[ll])
-                                tst = laval - daval
-                                if tst < 0.0:
-                                    tst *= -1.0
-                                if tst <= tol:
-                                    # The first pattern matches, check the second one.
-                                    for lb in range(la+1, lr):  # la is the end point of the linelist pattern
-                                        lbval = (linelist[lb] - linelist[ll]) / (linelist[lr] - linelist[ll])
-                                        tst = lbval - dbval
-                                        if tst < 0.0:
-                                            tst *= -1.0
-                                        if tst <= tol:
-                                            # The second pattern matches, store the result!
-                                            lindex = np.vstack((lindex, np.array([[ll, la, lb, lr]], dtype=nb.types.uint64)))
-                                            dindex = np.vstack((dindex, np.array([[dl, dm, da, dr]], dtype=nb.types.uint64)))
-                                            tst = (linelist[lr] - linelist[ll]) / (detlines[dr] - detlines[dl])
-                                            wvl = (npixels/2.)*tst + (linelist[lr]-tst*detlines[dr])
-                                            wvcen = np.hstack((wvcen, np.array([wvl], dtype=nb.types.ulong)))
-                                            disps = np.hstack((disps, np.array([tst], dtype=nb.types.ulong)))
-    # Return, but first remove the spurious first entry due to array creation
-    return dindex[1:, :], lindex[1:, :], wvcen[1:], disps[1:]
+    return match_patterns(detlines, linelist, npixels, 4, detsrch, lstsrch, pixtol, ordered=False)
 
 
 def empty_patt_dict(nlines):
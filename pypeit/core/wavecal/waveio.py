@@ -25,6 +25,12 @@ line_path = resource_filename('pypeit', '/data/arc_lines/lists/')
 nist_path = resource_filename('pypeit','/data/arc_lines/NIST/')
 reid_arxiv_path = resource_filename('pypeit','/data/arc_lines/reid_arxiv/')
 
+# Version of the format used to store the KD trees of ThAr patterns
+KDTREE_VERSION = 1
+
+# KD trees of ThAr patterns already loaded by this process
+_kdtrees = {}
+
 def save_wavelength_calibration(outfile, wv_calib, overwrite=True):
     """
     Save a wavelength solution to a file.
@@ -324,9 +330,126 @@ def load_source_table():
     return sources
 
 
+def tree_root(polygon=4, numsearch=20):
+    """ Root name of the files storing a KDTree of ThAr patterns
+
+    Parameters
+    ----------
+    polygon : int
+      Number of sides to the polygon used in pattern matching
+    numsearch : int
+      Number of consecutive lines used to generate a pattern
+
+    Returns
+    -------
+    root : str
+      Path of the files without their extensions
+    """
+    return os.path.join(line_path, 'ThAr_patterns_poly{0:d}_search{1:d}'.format(polygon, numsearch))
+
+
+def save_tree(root, tree, index, meta):
+    """ Save a KDTree of patterns without pickling it
+
+    The patterns, the tree nodes and the index are written to .npy files
+    that can be memory-mapped, and everything else to a JSON file. The
+    layout of the tree nodes is internal to scipy, so the scipy version is
+    recorded with them.
+
+    Parameters
+    ----------
+    root : str
+      Root name of the files; see tree_root
+    tree : scipy.spatial.cKDTree
+      The KDTree containing the patterns
+    index : ndarray
+      For each pattern in the KDTree, the corresponding index in the linelist
+    meta : dict
+      Parameters used to generate the patterns, saved with the tree
+    """
+    import scipy
+    tree_buffer, data, n, m, leafsize, maxes, mins, indices, boxsize, _ = tree.__getstate__()
+    if boxsize is not None:
+        msgs.error('Periodic KD trees cannot be saved.')
+    np.save(root + '.patterns.npy', data, allow_pickle=False)
+    np.save(root + '.nodes.npy', tree_buffer, allow_pickle=False)
+    np.save(root + '.order.npy', indices, allow_pickle=False)
+    np.save(root + '.index.npy', index, allow_pickle=False)
+    meta = dict(meta, version=KDTREE_VERSION, scipy=scipy.__version__, leafsize=leafsize,
+                maxes=maxes, mins=mins)
+    # Written last, such that incomplete trees are not read
+    linetools.utils.savejson(root + '.json', linetools.utils.jsonify(meta), easy_to_read=True,
+                             overwrite=True)
+
+
+def tree_meta(root):
+    """ Read the parameters of a stored KDTree of ThAr patterns
+
+    Parameters
+    ----------
+    root : str
+      Root name of the files; see tree_root
+
+    Returns
+    -------
+    meta : dict
+      The parameters saved with the tree; None if the tree does not exist,
+      was saved in an older format, or was generated from a different ThAr
+      linelist
+    """
+    if not os.path.isfile(root + '.json'):
+        return None
+    meta = linetools.utils.loadjson(root + '.json')
+    from pypeit.core.wavecal import kdtree_generator
+    if meta['version'] != KDTREE_VERSION \
+            or meta['checksum'] != kdtree_generator.line_checksum(meta['use_unknowns']):
+        return None
+    return meta
+
+
+def read_tree(root):
+    """ Read a KDTree of patterns saved by save_tree
+
+    The arrays are memory-mapped. The tree itself is restored from the saved
+    nodes if they were written by the installed version of scipy, and rebuilt
+    from the patterns otherwise.
+
+    Parameters
+    ----------
+    root : str
+      Root name of the files; see tree_root
+
+    Returns
+    -------
+    tree : scipy.spatial.cKDTree
+      The KDTree containing the patterns; None if the tree is not available
+    index : ndarray
+      For each pattern in the KDTree, the corresponding index in the linelist
+    """
+    import scipy
+    from scipy.spatial import cKDTree
+    meta = tree_meta(root)
+    if meta is None:
+        return None, None
+    patterns = np.load(root + '.patterns.npy', mmap_mode='r')
+    index = np.asarray(np.load(root + '.index.npy', mmap_mode='r'))
+    if meta['scipy'] == scipy.__version__:
+        tree = cKDTree.__new__(cKDTree)
+        tree.__setstate__((np.load(root + '.nodes.npy', mmap_mode='r'), np.asarray(patterns),
+                           patterns.shape[0], patterns.shape[1], meta['leafsize'],
+                           np.array(meta['maxes']), np.array(meta['mins']),
+                           np.asarray(np.load(root + '.order.npy', mmap_mode='r')), None, None))
+    else:
+        tree = cKDTree(patterns, leafsize=meta['leafsize'])
+    return tree, index
+
+
 def load_tree(polygon=4, numsearch=20):
     """ Load a KDTree of ThAr patterns that is stored on disk
 
+    Each tree is only read once per process. If the tree has not been built
+    (see the pypeit_build_kdtree script), it is generated and saved first.
+
     Parameters
     ----------
     polygon : int
@@ -351,23 +474,19 @@ def load_tree(polygon=4, numsearch=20):
       For each pattern in the KDTree, this array stores the corresponding index in
       the linelist
     """
-
-    import pickle
-    filename = pypeit.__path__[0] +\
-               '/data/arc_lines/lists/ThAr_patterns_poly{0:d}_search{1:d}.kdtree'.format(polygon, numsearch)
-    fileindx = pypeit.__path__[0] +\
-               '/data/arc_lines/lists/ThAr_patterns_poly{0:d}_search{1:d}.index.npy'.format(polygon, numsearch)
-    try:
-        file_load = pickle.load(open(filename, 'rb'))
-        index = np.load(fileindx)
-    except FileNotFoundError:
-        msgs.info('The requested KDTree was not found on disk' + msgs.newline() +
-                  'please be patient while the ThAr KDTree is built and saved to disk.')
-        from pypeit.core.wavecal import kdtree_generator
-        file_load, index = kdtree_generator.main(polygon, numsearch=numsearch, verbose=True,
-                                                 ret_treeindx=True, outname=filename)
-
-    return file_load, index
+    key = (polygon, numsearch)
+    if key not in _kdtrees:
+        root = tree_root(polygon, numsearch)
+        file_load, index = read_tree(root)
+        if file_load is None:
+            msgs.warn('The requested KDTree was not found on disk' + msgs.newline() +
+                      'please be patient while the ThAr KDTree is built and saved to disk.'
+                      + msgs.newline() + 'Use pypeit_build_kdtree to build it ahead of time.')
+            from pypeit.core.wavecal import kdtree_generator
+            file_load, index = kdtree_generator.main(polygon, numsearch=numsearch, verbose=True,
+                                                     ret_treeindx=True, outname=root)
+        _kdtrees[key] = (file_load, index)
+    return _kdtrees[key]
 
 
 def load_nist(ion):
@@ -121,11 +121,124 @@ def zerolag_shift_stretch(theta, y1, y2):
     corr_norm = corr_zero/corr_denom
     return -corr_norm
 
+def cubic_resample(spec, pos):
+    """ Interpolate a spectrum at fractional pixel positions using cubic convolution (Keys 1981, a = -0.5).
+
+    This is a single, local interpolation and is much faster than building interp1d objects, which makes it
+    suitable to evaluate many shifts and stretches of the same spectrum.
+
+    Parameters
+    ----------
+    spec : ndarray, shape = (nspec,)
+      Spectrum to interpolate
+    pos: ndarray
+      Pixel positions at which to interpolate, any shape
+
+    Returns
+    -------
+    spec_out: ndarray
+      Interpolated spectrum with the shape of pos. Positions outside the spectrum are set to zero.
+    """
+    nspec = spec.size
+    # Pad with zeros so that the four pixels of the kernel are always in the array
+    _spec = np.concatenate((np.zeros(2), spec, np.zeros(3)))
+    outside = (pos < 0) | (pos > nspec - 1) | np.invert(np.isfinite(pos))
+    _pos = np.where(outside, 0.0, pos)
+    i0 = np.floor(_pos).astype(int)
+    t = _pos - i0
+    spec_out = ((-0.5*t + 1.0)*t - 0.5)*t*_spec[i0+1] + ((1.5*t - 2.5)*t*t + 1.0)*_spec[i0+2] \
+                    + ((-1.5*t + 2.0)*t + 0.5)*t*_spec[i0+3] + (0.5*t - 0.5)*t*t*_spec[i0+4]
+    spec_out[outside] = 0.0
+    return spec_out
+
+
+def fft_shift_stretch(y1, y2, shift_bounds, stretch_bounds, dstretch=None):
+    """ Find the shift and stretch of y2 that maximize the zero lag cross-correlation with y1.
+
+    For a grid of stretches, y2 is resampled at all stretches at once with cubic convolution (see
+    :func:`cubic_resample`), and the cross-correlations at all integer lags are computed with a single FFT per
+    stretch. The best grid point within the bounds is then refined with a Nelder-Mead optimization of the zero
+    lag cross-correlation. The transformed spectrum is y2 evaluated at pixel (x - shift)/stretch, which is the
+    same convention as :func:`shift_and_stretch`, so that the pixel x of y2 maps to x*stretch + shift.
+
+    Parameters
+    ----------
+    y1: ndarray, shape = (nspec,)
+      First spectrum which acts as the reference
+    y2: ndarray,  shape = (nspec,)
+      Second spectrum which will be transformed by a shift and stretch to match y1
+    shift_bounds: tuple of floats
+      Range of shifts in pixels to search
+    stretch_bounds: tuple of floats
+      Range of stretches to search
+    dstretch: float, default = None
+      Spacing of the stretch grid. The default is 2/nspec, such that neighboring stretches differ by two pixels at
+      the end of the spectrum.
+
+    Returns
+    -------
+    success: int
+      1 if the refinement converged, 0 otherwise
+    shift: float
+      the optimal shift
+    stretch: float
+      the optimal stretch
+    corr: float
+      the zero lag cross-correlation coefficient at the optimal shift and stretch, normalized as in
+      :func:`zerolag_shift_stretch`
+    """
+    nspec = y1.size
+    corr_denom = np.sqrt(np.sum(y1*y1)*np.sum(y2*y2))
+    if corr_denom == 0:
+        return 0, np.mean(shift_bounds), 1.0, 0.0
+    if dstretch is None:
+        dstretch = 2.0/nspec
+    stretch_grid = np.linspace(stretch_bounds[0], stretch_bounds[1],
+                               int(np.ceil((stretch_bounds[1] - stretch_bounds[0])/dstretch)) + 1)
+    lags = np.arange(int(np.ceil(shift_bounds[0])), int(np.floor(shift_bounds[1])) + 1)
+    if lags.size == 0:
+        lags = np.atleast_1d(int(np.round(np.mean(shift_bounds))))
+
+    # The stretched spectra must cover y2 at the largest stretch
+    nout = int(np.floor((nspec - 1)*stretch_grid.max())) + 1
+    nfft = scipy.fftpack.next_fast_len(nspec + nout - 1)
+    fft_y1 = np.fft.rfft(y1, nfft)
+    pos = np.arange(nout)
+    # Do the stretches in chunks to limit the memory use
+    nchunk = max(1, 2**20//nfft)
+    corr_max = -np.inf
+    for i in range(0, stretch_grid.size, nchunk):
+        stretch = stretch_grid[i:i+nchunk]
+        y2_str = cubic_resample(y2, pos[None,:]/stretch[:,None])
+        # Cross-correlation at all lags: corr[lag] = sum_x y1[x]*y2_str[x-lag]
+        corr = np.fft.irfft(fft_y1[None,:]*np.conj(np.fft.rfft(y2_str, nfft, axis=1)), nfft,
+                            axis=1)[:,lags % nfft]
+        indx = np.argmax(corr)
+        if corr.flat[indx] > corr_max:
+            corr_max = corr.flat[indx]
+            shift_grid, stretch_max = lags[indx % lags.size], stretch[indx // lags.size]
+
+    # Refine; the stretch is scaled to pixels at the end of the spectrum to get a well-conditioned simplex
+    x = np.arange(nspec)
+    lo = np.array([shift_bounds[0], stretch_bounds[0]*nspec])
+    hi = np.array([shift_bounds[1], stretch_bounds[1]*nspec])
+    def _neg_corr(p):
+        shift, stretch = np.clip(p, lo, hi)
+        return -np.sum(y1*cubic_resample(y2, (x - shift)*nspec/stretch))/corr_denom
+    p0 = np.array([shift_grid, stretch_max*nspec])
+    result = scipy.optimize.minimize(_neg_corr, p0, method='Nelder-Mead',
+                                     options={'xatol': 1e-3, 'fatol': 1e-7,
+                                              'initial_simplex': [p0, p0 + [0.5, 0.], p0 + [0., 0.5]]})
+    shift, stretch = np.clip(result.x, lo, hi)
+    return int(result.success), shift, stretch/nspec, -result.fun
+
+
 def smooth_ceil_cont(inspec1, smooth, percent_ceil = None, use_raw_arc=False,sigdetect = 10.0, fwhm = 4.0):
     """ Utility routine to smooth and apply a ceiling to spectra """
 
-    # ToDO can we improve the logic here. Technically if use_raw_arc = True and perecent_ceil=None
-    # we don't need to peak find or continuum subtract, but this makes the code pretty uggly.
+    if use_raw_arc == True and percent_ceil is None:
+        # Neither the continuum subtracted arc nor the line amplitudes are needed
+        return np.copy(inspec1) if smooth is None else scipy.ndimage.filters.gaussian_filter(inspec1, smooth)
 
     # Run line detection to get the continuum subtracted arc
     tampl1, tampl1_cont, tcent1, twid1, centerr1, w1, arc1, nsig1 = arc.detect_lines(inspec1, sigdetect=sigdetect, fwhm=fwhm)
@@ -213,12 +326,15 @@ def xcorr_shift(inspec1,inspec2,smooth=1.0,percent_ceil=80.0, use_raw_arc=False,
 
 
 def xcorr_shift_stretch(inspec1, inspec2, cc_thresh=-1.0, smooth=1.0, percent_ceil=80.0, use_raw_arc=False,
-                        shift_mnmx=(-0.05,0.05), stretch_mnmx=(0.95,1.05), sigdetect = 10.0, fwhm = 4.0,debug=False, seed = None):
+                        shift_mnmx=(-0.05,0.05), stretch_mnmx=(0.95,1.05), sigdetect = 10.0, fwhm = 4.0,debug=False, seed = None,
+                        method='fft', y1=None, y2=None):
 
     """ Determine the shift and stretch of inspec2 relative to inspec1.  This routine computes an initial
     guess for the shift via maximimizing the cross-correlation. It then performs a two parameter search for the shift and stretch
     by optimizing the zero lag cross-correlation between the inspec1 and the transformed inspec2 (shifted and stretched via
-    wvutils.shift_and_stretch()) in a narrow window about the initial estimated shift. The convention for the shift is that
+    wvutils.shift_and_stretch()) in a narrow window about the initial estimated shift, either with FFT cross-correlations
+    over a grid of stretches followed by a local refinement (see fft_shift_stretch), or with a differential evolution
+    optimizer. The convention for the shift is that
     positive shift means inspec2 is shifted to the right (higher pixel values) relative to inspec1. The convention for the stretch is
     that it is float near unity that increases the size of the inspec2 relative to the original size (which is the size of inspec1)
 
@@ -253,7 +369,16 @@ def xcorr_shift_stretch(inspec1, inspec2, cc_thresh=-1.0, smooth=1.0, percent_ce
       Range to search for the stretch in the optimization. The code may not work well if this range is significantly expanded
       because the linear approximation used to transform the arc starts to break down.
     seed: int or np.random.RandomState, optional, default = None
-       Seed for scipy.optimize.differential_evolution optimizer. If not specified, the calculation will not be repeatable
+       Seed for scipy.optimize.differential_evolution optimizer. If not specified, the calculation will not be repeatable.
+       Only used if method = 'de'.
+    method: str, default = 'fft'
+       Optimization method. 'fft' uses fft_shift_stretch, which is deterministic and much faster, and 'de' uses
+       scipy.optimize.differential_evolution on zerolag_shift_stretch.
+    y1: ndarray, default = None
+       inspec1 already smoothed and clipped by smooth_ceil_cont with the smooth, percent_ceil, use_raw_arc, sigdetect and
+       fwhm parameters above. Use this to avoid repeating the line detection when inspec1 is matched to many spectra.
+    y2: ndarray, default = None
+       Same as y1 for inspec2.
     debug = False
        Show plots to the screen useful for debugging.
 
@@ -284,8 +409,10 @@ def xcorr_shift_stretch(inspec1, inspec2, cc_thresh=-1.0, smooth=1.0, percent_ce
 
     nspec = inspec1.size
 
-    y1 = smooth_ceil_cont(inspec1,smooth,percent_ceil=percent_ceil,use_raw_arc=use_raw_arc, sigdetect = sigdetect, fwhm = fwhm)
-    y2 = smooth_ceil_cont(inspec2,smooth,percent_ceil=percent_ceil,use_raw_arc=use_raw_arc, sigdetect = sigdetect, fwhm = fwhm)
+    if y1 is None:
+        y1 = smooth_ceil_cont(inspec1,smooth,percent_ceil=percent_ceil,use_raw_arc=use_raw_arc, sigdetect = sigdetect, fwhm = fwhm)
+    if y2 is None:
+        y2 = smooth_ceil_cont(inspec2,smooth,percent_ceil=percent_ceil,use_raw_arc=use_raw_arc, sigdetect = sigdetect, fwhm = fwhm)
 
     # Do the cross-correlation first and determine the initial shift
     shift_cc, corr_cc = xcorr_shift(y1, y2, smooth = None, percent_ceil = None, use_raw_arc = True, sigdetect = sigdetect, fwhm=fwhm, debug = debug)
@@ -294,13 +421,18 @@ def xcorr_shift_stretch(inspec1, inspec2, cc_thresh=-1.0, smooth=1.0, percent_ce
         return -1, shift_cc, 1.0, corr_cc, shift_cc, corr_cc
     else:
         bounds = [(shift_cc + nspec*shift_mnmx[0],shift_cc + nspec*shift_mnmx[1]), stretch_mnmx]
-        # TODO Can we make the differential evolution run faster?
-        result = scipy.optimize.differential_evolution(zerolag_shift_stretch, args=(y1,y2), tol=1e-4,
-                                                       bounds=bounds, disp=False, polish=True, seed=seed)
-        corr_de = -result.fun
-        shift_de = result.x[0]
-        stretch_de = result.x[1]
-        if not result.success:
+        if method == 'fft':
+            success, shift_de, stretch_de, corr_de = fft_shift_stretch(y1, y2, bounds[0], bounds[1])
+        elif method == 'de':
+            result = scipy.optimize.differential_evolution(zerolag_shift_stretch, args=(y1,y2), tol=1e-4,
+                                                           bounds=bounds, disp=False, polish=True, seed=seed)
+            success = int(result.success)
+            corr_de = -result.fun
+            shift_de = result.x[0]
+            stretch_de = result.x[1]
+        else:
+            msgs.error('Unknown shift/stretch optimization method: {0}'.format(method))
+        if not success:
             msgs.warn('Fit for shift and stretch did not converge!')
 
         if(corr_de < corr_cc):
@@ -317,7 +449,7 @@ def xcorr_shift_stretch(inspec1, inspec2, cc_thresh=-1.0, smooth=1.0, percent_ce
             corr_out = corr_de
             shift_out = shift_de
             stretch_out = stretch_de
-            result_out = int(result.success)
+            result_out = success
 
         if debug:
             x1 = np.arange(nspec)
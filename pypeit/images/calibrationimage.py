@@ -7,6 +7,8 @@ import numpy as np
 
 
 from pypeit import msgs
+from pypeit import utils
+from pypeit import parallel
 
 from pypeit.core import combine
 from pypeit.par import pypeitpar
@@ -135,31 +137,39 @@ class CalibrationImage(pypeitimage.PypeItImage):
         if self.nfiles == 0:
             msgs.warn("Need to provide a non-zero list of files")
             return
-        # Load up image array
+        # Process the raw files, in parallel if requested, and load up
+        # the image array; the stack is memory-mapped to a scratch
+        # file if requested
         image_arr = None
-        for kk,file in enumerate(self.file_list):
-            # Process raw file
-            processrawImage = processrawimage.ProcessRawImage(file, self.spectrograph,
-                                                           self.det, self.proc_par)
-            image = processrawImage.process(self.process_steps, bias=bias, bpm=bpm)
+        shared = dict(spectrograph=self.spectrograph, proc_par=self.proc_par, bias=bias, bpm=bpm)
+        for kk, image in enumerate(parallel.iter_tasks(process_raw_file,
+                                        [(f, self.det, self.process_steps) for f in self.file_list],
+                                        nproc=self.proc_par['nproc'], shared=shared)):
+            if self.nfiles == 1:
+                image_arr = image[None,:,:]
+                break
             # Instantiate the image stack
             if image_arr is None:
-                image_arr = np.zeros((image.shape[0], image.shape[1], self.nfiles))
+                image_arr = utils.scratch_array((self.nfiles,) + image.shape,
+                                                dtype=self.proc_par['stack_dtype'],
+                                                scratch_dir=self.proc_par['scratch_dir'])
             # Hold
-            image_arr[:,:,kk] = image
+            image_arr[kk,:,:] = image
 
         # Combine
         if self.nfiles == 1:
-            self.image = image_arr[:,:,0]
+            self.image = image_arr[0]
         else:
-            self.image = combine.comb_frames(image_arr,
+            # The frames are read from the stack block by block
+            self.image = combine.comb_frames(list(image_arr),
                                          saturation=self.spectrograph.detector[self.det-1]['saturation'],
                                          method=self.proc_par['combine'],
                                          satpix=self.proc_par['satpix'],
                                          cosmics=self.proc_par['sigrej'],
                                          n_lohi=self.proc_par['n_lohi'],
                                          sig_lohi=self.proc_par['sig_lohi'],
-                                         replace=self.proc_par['replace'])
+                                         replace=self.proc_par['replace'],
+                                         block_size=self.proc_par['combine_block'])
         # Return
         return self.image.copy()
 
@@ -168,6 +178,31 @@ class CalibrationImage(pypeitimage.PypeItImage):
             self.__class__.__name__, self.nfiles, self.process_steps))
 
 
+def process_raw_file(filename, det, process_steps):
+    """
+    Process one raw file for :func:`CalibrationImage.build_image`.
+
+    The spectrograph, processing parameters, bias, and bad-pixel mask
+    are provided by :func:`pypeit.parallel.get_shared`.
+
+    Args:
+        filename (:obj:`str`):
+            Raw file to process.
+        det (:obj:`int`):
+            1-indexed detector number.
+        process_steps (:obj:`list`):
+            Processing steps; see
+            :func:`pypeit.images.processrawimage.ProcessRawImage.process`.
+
+    Returns:
+        `numpy.ndarray`_: The processed image.
+    """
+    processrawImage = processrawimage.ProcessRawImage(filename, parallel.get_shared('spectrograph'),
+                                                      det, parallel.get_shared('proc_par'))
+    return processrawImage.process(process_steps, bias=parallel.get_shared('bias'),
+                                   bpm=parallel.get_shared('bpm'))
+
+
 
 
 
@@ -101,7 +101,9 @@ class ImageMask(object):
                                   remove_compact_obj=par['rmcompact'],
                                   sigclip=par['sigclip'],
                                   sigfrac=par['sigfrac'],
-                                  objlim=par['objlim'])
+                                  objlim=par['objlim'],
+                                  dtype=par['ladtype'],
+                                  nthreads=par['lathreads'])
         # Return
         return self.crmask.copy()
 
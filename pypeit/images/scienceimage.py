@@ -12,6 +12,7 @@ from pypeit.core import procimg
 from pypeit.core import coadd2d
 from pypeit.par import pypeitpar
 from pypeit import utils
+from pypeit import parallel
 
 from pypeit.images import pypeitimage
 from pypeit.images import processrawimage
@@ -218,47 +219,50 @@ class ScienceImage(pypeitimage.PypeItImage, maskimage.ImageMask):
                          file_list[0], bias, pixel_flat, illum_flat=illum_flat)
 
         # Continue with an actual list
-        # Get it ready
+        # Get it ready; the stacks are memory-mapped to scratch files
+        # if requested
         nimages = len(file_list)
         shape = (nimages, bpm.shape[0], bpm.shape[1])
-        sciimg_stack = np.zeros(shape)
-        sciivar_stack= np.zeros(shape)
-        rn2img_stack = np.zeros(shape)
-        crmask_stack = np.zeros(shape, dtype=bool)
-
-        # Mask
+        sciimg_stack = utils.scratch_array(shape, dtype=par['stack_dtype'],
+                                           scratch_dir=par['scratch_dir'])
+        var_stack = utils.scratch_array(shape, dtype=par['stack_dtype'],
+                                        scratch_dir=par['scratch_dir'])
+        rn2img_stack = utils.scratch_array(shape, dtype=par['stack_dtype'],
+                                           scratch_dir=par['scratch_dir'])
+
+        # Mask; the cosmic rays are flagged in the mask of each image
         bitmask = maskimage.ImageBitMask()
-        mask_stack = np.zeros(shape, bitmask.minimum_dtype(asuint=True))
-
-        # Loop on the files
-        for kk, ifile in enumerate(file_list):
-            # Instantiate
-            sciImage = ScienceImage.from_single_file(spectrograph, det, par, bpm,
-                ifile, bias, pixel_flat, illum_flat=illum_flat)
-            # Process
-            sciimg_stack[kk,:,:] = sciImage.image
-            # Construct raw variance image and turn into inverse variance
-            sciivar_stack[kk, :, :] = sciImage.ivar
-            # Mask cosmic rays
-            crmask_stack[kk, :, :] = sciImage.crmask
-            # Build read noise squared image
-            rn2img_stack[kk, :, :] = sciImage.build_rn2img()
-            # Final mask for this image
-            mask_stack[kk, :, :] = sciImage.mask
+        mask_stack = utils.scratch_array(shape, dtype=bitmask.minimum_dtype(asuint=True),
+                                         scratch_dir=par['scratch_dir'])
+
+        # Process the files, in parallel if requested, and fill the
+        # stacks as each one is done
+        shared = dict(spectrograph=spectrograph, par=par, bpm=bpm, bias=bias,
+                      pixel_flat=pixel_flat, illum_flat=illum_flat)
+        for kk, (image, var, rn2img, mask) in enumerate(
+                parallel.iter_tasks(process_science_file, [(f, det) for f in file_list],
+                                    nproc=par['nproc'], shared=shared)):
+            sciimg_stack[kk,:,:] = image
+            var_stack[kk,:,:] = var
+            rn2img_stack[kk,:,:] = rn2img
+            mask_stack[kk,:,:] = mask
 
         # Coadd them
         weights = np.ones(nimages)/float(nimages)
         img_list = [sciimg_stack]
-        var_stack = utils.inverse(sciivar_stack, positive=True)
         var_list = [var_stack, rn2img_stack]
         img_list_out, var_list_out, outmask, nused = coadd2d.weighted_combine(
             weights, img_list, var_list, (mask_stack == 0),
-            sigma_clip=sigma_clip, sigma_clip_stack=sciimg_stack, sigrej=sigrej, maxiters=maxiters)
+            sigma_clip=sigma_clip, sigma_clip_stack=sciimg_stack, sigrej=sigrej, maxiters=maxiters,
+            block_size=par['combine_block'])
 
         # Build the last one
-        slf = ScienceImage.from_images(spectrograph, det, par, bpm, img_list_out[0],
-                                       utils.inverse(var_list_out[0], positive=True),
-                                       var_list_out[1], np.invert(outmask), files=file_list)
+        slf = ScienceImage.from_images(spectrograph, det, par, bpm,
+                                       np.asarray(img_list_out[0], dtype=float),
+                                       utils.inverse(np.asarray(var_list_out[0], dtype=float),
+                                                     positive=True),
+                                       np.asarray(var_list_out[1], dtype=float),
+                                       np.invert(outmask), files=file_list)
         slf.build_mask(saturation=slf.spectrograph.detector[slf.det-1]['saturation'],
                        mincounts=slf.spectrograph.detector[slf.det-1]['mincounts'])
         # Return
@@ -455,5 +459,29 @@ class ScienceImage(pypeitimage.PypeItImage, maskimage.ImageMask):
         return repr
 
 
+def process_science_file(filename, det):
+    """
+    Process one raw file for :func:`ScienceImage.from_file_list`.
 
+    The spectrograph, processing parameters, bad-pixel mask, bias, and
+    flat-field images are provided by
+    :func:`pypeit.parallel.get_shared`.
 
+    Args:
+        filename (:obj:`str`):
+            Raw file to process.
+        det (:obj:`int`):
+            1-indexed detector number.
+
+    Returns:
+        tuple: The processed image, its variance, the read-noise
+        variance, and the mask.
+    """
+    sciImage = ScienceImage.from_single_file(parallel.get_shared('spectrograph'), det,
+                                             parallel.get_shared('par'),
+                                             parallel.get_shared('bpm'), filename,
+                                             parallel.get_shared('bias'),
+                                             parallel.get_shared('pixel_flat'),
+                                             illum_flat=parallel.get_shared('illum_flat'))
+    return sciImage.image, utils.inverse(sciImage.ivar, positive=True), \
+                sciImage.build_rn2img(), sciImage.mask
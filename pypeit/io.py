@@ -4,12 +4,18 @@
 Provides a set of I/O routines.
 """
 import os
+import bz2
 import gzip
 import shutil
+import threading
 import numpy
 
+from collections import OrderedDict
+
 from astropy.io import fits
 
+from pypeit import msgs
+
 
 def init_record_array(shape, dtype):
     r"""
@@ -177,3 +183,192 @@ def parse_hdr_key_group(hdr, prefix='F'):
     return [values[i] for i in range(max(values.keys())+1)]
 
 
+
+
+def fits_data_size(hdr):
+    """
+    Return the number of bytes, including the padding, occupied in a
+    fits file by the data that follow the provided header.
+
+    Args:
+        hdr (`fits.Header`):
+            Header of the HDU.
+
+    Returns:
+        int: Size of the data block.
+    """
+    naxis = hdr.get('NAXIS', 0)
+    if naxis == 0:
+        return 0
+    shape = [hdr['NAXIS{0}'.format(i+1)] for i in range(naxis)]
+    if shape[0] == 0 and hdr.get('GROUPS', False):
+        # Random groups
+        shape[0] = 1
+    size = abs(hdr['BITPIX'])//8 * hdr.get('GCOUNT', 1) \
+                * (hdr.get('PCOUNT', 0) + int(numpy.prod(shape)))
+    return -(-size // fits.Card.length // 36) * fits.Card.length * 36
+
+
+def read_fits_headers(ifile, nhead=None):
+    """
+    Read the headers of a fits file without reading its data.
+
+    The header blocks are parsed directly and the data blocks are
+    skipped, which avoids the overhead of constructing the HDUs.  Only
+    the first `nhead` headers are read, such that the rest of the file
+    is never accessed, or decompressed for gzipped files.
+
+    Tile-compressed images are returned as the headers of their binary
+    tables; use `astropy.io.fits.open`_ to get the image headers.
+
+    Args:
+        ifile (:obj:`str`):
+            Name of the fits file; can be gzipped.
+        nhead (:obj:`int`, optional):
+            Number of headers to read.  If None, read all of them.
+
+    Returns:
+        list: List of `fits.Header` objects.
+
+    Raises:
+        OSError:
+            Raised if the file is not a valid fits file or has fewer
+            than `nhead` extensions.
+    """
+    headers = []
+    with (gzip.open(ifile, 'rb') if ifile.split('.')[-1] == 'gz' else open(ifile, 'rb')) as f:
+        while nhead is None or len(headers) < nhead:
+            try:
+                hdr = fits.Header.fromfile(f, endcard=True, padding=True)
+            except EOFError:
+                if nhead is None and len(headers) > 0:
+                    break
+                raise OSError('{0} has {1} headers, fewer than requested.'.format(
+                              ifile, len(headers)))
+            headers += [hdr]
+            if nhead is None or len(headers) < nhead:
+                f.seek(fits_data_size(hdr), 1)
+    return headers
+
+
+def read_file_bytes(ifile):
+    """
+    Read the full contents of a file, decompressing it if it is
+    gzipped or bzip2-compressed.
+
+    Args:
+        ifile (:obj:`str`):
+            Name of the file.
+
+    Returns:
+        :obj:`bytes`: The (decompressed) contents of the file.
+    """
+    with open(ifile, 'rb') as f:
+        magic = f.read(3)
+    opener = gzip.open if magic[:2] == b'\x1f\x8b' \
+                else (bz2.open if magic == b'BZh' else open)
+    with opener(ifile, 'rb') as f:
+        return f.read()
+
+
+class HDUListCache(object):
+    """
+    Bounded, thread-safe cache of fits files read into memory.
+
+    Each file is read, and decompressed, once and kept as an
+    `astropy.io.fits.HDUList`_ that is independent of the file on disk.
+    The least recently used files are dropped when the total size of
+    the cached files exceeds :attr:`max_size`.  A cached file is reread
+    if its size or modification time changes.
+
+    The returned `astropy.io.fits.HDUList`_ objects are shared by all
+    the callers and should be treated as read-only.  Closing them is
+    harmless.
+
+    Args:
+        max_size (:obj:`float`, optional):
+            Maximum total size in MB of the (decompressed) cached
+            files.  Files are still read through the cache if this is
+            0, but they are not kept.
+
+    Attributes:
+        hits (:obj:`int`):
+            Number of requests for files in the cache.
+        misses (:obj:`int`):
+            Number of requests that required reading the file.
+    """
+    def __init__(self, max_size=1024.):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def nbytes(self):
+        """Total size in bytes of the cached files."""
+        return sum([entry[1] for entry in self._cache.values()])
+
+    def open(self, ifile):
+        """
+        Return the `astropy.io.fits.HDUList`_ with the contents of a
+        file.
+
+        Args:
+            ifile (:obj:`str`):
+                Name of the fits file.
+
+        Returns:
+            `astropy.io.fits.HDUList`_: The cached HDUs.
+        """
+        path = os.path.abspath(ifile)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        with self._lock:
+            if path in self._cache and self._cache[path][0] == signature:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return self._cache[path][2]
+        # Read outside the lock so that different files can be read
+        # concurrently
+        contents = read_file_bytes(path)
+        hdu = fits.HDUList.fromstring(contents)
+        with self._lock:
+            self.misses += 1
+            self._cache[path] = (signature, len(contents), hdu)
+            self._cache.move_to_end(path)
+            while len(self._cache) > 0 and self.nbytes > self.max_size*1024**2:
+                self._cache.popitem(last=False)
+        return hdu
+
+    def clear(self):
+        """Remove all files from the cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def reset_stats(self):
+        """Reset the hit and miss counts."""
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        """The hit and miss counts."""
+        return [self.hits, self.misses]
+
+    def add_stats(self, stats):
+        """
+        Add the hit and miss counts of another cache instance, e.g.
+        from another process.
+        """
+        self.hits += stats[0]
+        self.misses += stats[1]
+
+    def report(self):
+        """Print the number of hits and misses."""
+        msgs.info('Raw file cache: {0} hits, {1} files read ({2:.2f} MB of {3:.2f} MB '
+                  'used).'.format(self.hits, self.misses, self.nbytes/1024**2, self.max_size))
+
+
+#: Cache of the raw files, shared by all the detectors and image
+#: sections of an exposure; see :class:`HDUListCache`.
+raw_file_cache = HDUListCache()
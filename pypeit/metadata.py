@@ -9,6 +9,7 @@ import numpy as np
 import yaml
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import datetime
 from astropy import table, coordinates, time
@@ -16,6 +17,7 @@ from astropy import table, coordinates, time
 from pypeit import msgs
 from pypeit import utils
 from pypeit.core import framematch
+from pypeit.metaindex import MetadataIndex
 from pypeit.core import flux
 from pypeit.core import parse
 from pypeit.par import PypeItPar
@@ -73,6 +75,14 @@ class PypeItMetaData:
             the header for any of the provided files; see
             :func:`pypeit.spectrographs.spectrograph.get_headarr`.  Set
             to False to instead report a warning and continue.
+        index_file (:obj:`str`, optional):
+            Name of the file with the persistent index of the metadata
+            read from previously processed files; see
+            :class:`pypeit.metaindex.MetadataIndex`.  If provided, the
+            headers are only read for files that are not in the index
+            or have changed since they were indexed, and the index is
+            updated with the metadata of those files.  If None, the
+            headers of all the files are read.
 
     Attributes:
         spectrograph
@@ -95,7 +105,8 @@ class PypeItMetaData:
             use in the data reduction.
 
     """
-    def __init__(self, spectrograph, par, files=None, data=None, usrdata=None, strict=True):
+    def __init__(self, spectrograph, par, files=None, data=None, usrdata=None, strict=True,
+                 index_file=None):
 
         if data is None and files is None:
             # Warn that table will be empty
@@ -111,7 +122,8 @@ class PypeItMetaData:
 
         # Build table
         self.table = table.Table(data if files is None 
-                                 else self._build(files, strict=strict, usrdata=usrdata))
+                                 else self._build(files, strict=strict, usrdata=usrdata,
+                                                  index_file=index_file))
 
         # Sort on filename
         self.table.sort('filename')
@@ -252,7 +264,7 @@ class PypeItMetaData:
         # Return
         return meta_data_model
 
-    def _build(self, files, strict=True, usrdata=None):
+    def _build(self, files, strict=True, usrdata=None, index_file=None):
         """
         Generate the fitstbl that will be at the heart of PypeItMetaData.
 
@@ -266,6 +278,9 @@ class PypeItMetaData:
             usrdata (astropy.table.Table, optional):
                 Parsed for frametype for a few instruments (e.g. VLT)
                 where meta data may not be required
+            index_file (:obj:`str`, optional):
+                Persistent index with the metadata of previously read
+                files; see :class:`pypeit.metaindex.MetadataIndex`.
 
         Returns:
             dict: Dictionary with the data to assign to :attr:`table`.
@@ -279,25 +294,59 @@ class PypeItMetaData:
         data['directory'] = ['None']*len(_files)
         data['filename'] = ['None']*len(_files)
 
+        # Get the metadata of the unchanged files from the index
+        index = None if index_file is None else MetadataIndex(index_file)
+        indexed = [None]*len(_files) if index is None \
+                        else index.lookup(self.spectrograph.spectrograph, _files)
+        to_read = [f for f, m in zip(_files, indexed) if m is None]
+        if index is not None:
+            msgs.info('Found {0} of {1} files in the metadata index'.format(
+                      len(_files)-len(to_read), len(_files)))
+
+        # Read the fits headers of the rest; the reading is dominated by
+        # I/O and decompression, so use multiple threads
+        nthreads = self.par['rdx']['header_threads']
+        if nthreads > 1 and len(to_read) > 1:
+            with ThreadPoolExecutor(max_workers=min(nthreads, len(to_read))) as executor:
+                headarrs = list(executor.map(lambda f: self.spectrograph.get_headarr(f, strict=strict),
+                                             to_read))
+        else:
+            headarrs = [self.spectrograph.get_headarr(f, strict=strict) for f in to_read]
+        headarrs = iter(headarrs)
+
         # Build the table
+        new_files, new_meta = [], []
         for idx, ifile in enumerate(_files):
-            # User data (for frame type)
-            usr_row = None if usrdata is None else usrdata[idx]
-
             # Add the directory and file name to the table
             data['directory'][idx], data['filename'][idx] = os.path.split(ifile)
 
-            # Read the fits headers
-            headarr = self.spectrograph.get_headarr(ifile, strict=strict)
+            if indexed[idx] is not None:
+                for meta_key in self.spectrograph.meta.keys():
+                    data[meta_key].append(indexed[idx][meta_key])
+                continue
+
+            # User data (for frame type)
+            usr_row = None if usrdata is None else usrdata[idx]
+            headarr = next(headarrs)
 
             # Grab Meta
+            cards = self.spectrograph.get_meta_cards(headarr)
             for meta_key in self.spectrograph.meta.keys():
                 value = self.spectrograph.get_meta_value(ifile, meta_key, headarr=headarr,
                                                          required=strict, usr_row=usr_row,
-                                        ignore_bad_header=self.par['rdx']['ignore_bad_headers'])
+                                        ignore_bad_header=self.par['rdx']['ignore_bad_headers'],
+                                                         cards=cards)
                 data[meta_key].append(value)
             msgs.info('Added metadata for {0}'.format(os.path.split(ifile)[1]))
 
+            # Index the metadata, including the keys without a value
+            if index is not None:
+                new_files += [ifile]
+                new_meta += [dict([(k, data[k][idx]) for k in self.spectrograph.meta.keys()])]
+
+        if len(new_files) > 0:
+            index.update(self.spectrograph.spectrograph, new_files, new_meta)
+
         # JFH Changed the below to now crash if some files have None in their MJD. This is the desired behavior
         # since if there are empty or corrupt files we still want this to run.
 
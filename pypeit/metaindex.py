@@ -0,0 +1,103 @@
+"""
+Implements a persistent index of the metadata read from the raw files.
+
+The index is an sqlite database that stores the metadata extracted
+from each file by a given spectrograph, keyed by the path to the file.
+An entry is only used if the size and modification time of the file,
+and the PypeIt version, are the same as when the entry was written,
+such that only the headers of new or changed files need to be read
+when rebuilding the metadata table; see
+:class:`pypeit.metadata.PypeItMetaData`.
+"""
+import os
+import json
+import sqlite3
+
+import numpy as np
+
+from pypeit import msgs
+
+import pypeit
+
+
+class MetadataIndex(object):
+    """
+    Persistent index of the metadata of the raw files.
+
+    Args:
+        filename (:obj:`str`):
+            Name of the sqlite file with the index.  Created, along
+            with its directory, if it does not exist.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        _dir = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(_dir):
+            os.makedirs(_dir)
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS metadata '
+                       '(path TEXT, spectrograph TEXT, size INTEGER, mtime REAL, '
+                       'version TEXT, meta TEXT, PRIMARY KEY (path, spectrograph))')
+
+    def _connect(self):
+        """Connect to the database."""
+        return sqlite3.connect(self.filename, timeout=60)
+
+    @staticmethod
+    def _signature(ifile):
+        """Return the absolute path, size, and modification time of a file."""
+        stat = os.stat(ifile)
+        return os.path.abspath(ifile), stat.st_size, stat.st_mtime
+
+    def lookup(self, spectrograph, files):
+        """
+        Find the metadata of a list of files in the index.
+
+        Args:
+            spectrograph (:obj:`str`):
+                Name of the spectrograph used to read the metadata.
+            files (:obj:`list`):
+                Files to look for.
+
+        Returns:
+            :obj:`list`: The dictionary with the metadata of each file,
+            or None if the file is not in the index or has changed
+            since it was indexed.
+        """
+        with self._connect() as db:
+            rows = db.execute('SELECT path, size, mtime, version, meta FROM metadata '
+                              'WHERE spectrograph = ?', (spectrograph,)).fetchall()
+        index = dict([(r[0], r[1:]) for r in rows])
+        meta = []
+        for ifile in files:
+            try:
+                path, size, mtime = self._signature(ifile)
+            except OSError:
+                meta += [None]
+                continue
+            entry = index.get(path)
+            meta += [json.loads(entry[3]) if entry is not None
+                        and entry[:3] == (size, mtime, pypeit.__version__) else None]
+        return meta
+
+    def update(self, spectrograph, files, meta):
+        """
+        Add or replace the metadata of a set of files in the index.
+
+        Args:
+            spectrograph (:obj:`str`):
+                Name of the spectrograph used to read the metadata.
+            files (:obj:`list`):
+                Files to index.
+            meta (:obj:`list`):
+                Dictionary with the metadata of each file.  Values
+                must be scalars or strings.
+        """
+        rows = []
+        for ifile, m in zip(files, meta):
+            path, size, mtime = self._signature(ifile)
+            _m = dict([(k, v.item() if isinstance(v, np.generic) else v) for k, v in m.items()])
+            rows += [(path, spectrograph, size, mtime, pypeit.__version__, json.dumps(_m))]
+        with self._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)', rows)
+        msgs.info('Added {0} files to the metadata index {1}'.format(len(rows), self.filename))
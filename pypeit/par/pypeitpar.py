@@ -190,7 +190,9 @@ class ProcessImagesPar(ParSet):
     """
     def __init__(self, overscan=None, overscan_par=None, match=None, combine=None, satpix=None,
                  sigrej=None, n_lohi=None, sig_lohi=None, replace=None, lamaxiter=None, grow=None,
-                 rmcompact=None, sigclip=None, sigfrac=None, objlim=None, bias=None):
+                 rmcompact=None, sigclip=None, sigfrac=None, objlim=None, bias=None,
+                 combine_block=None, stack_dtype=None, scratch_dir=None, nproc=None,
+                 ladtype=None, lathreads=None):
 
         # Grab the parameter names and values from the function
         # arguments
@@ -265,6 +267,31 @@ class ProcessImagesPar(ParSet):
         descr['replace'] = 'If all pixels are rejected, replace them using this method.  ' \
                            'Options are: {0}'.format(', '.join(options['replace']))
 
+        defaults['combine_block'] = 256.
+        dtypes['combine_block'] = [int, float]
+        descr['combine_block'] = 'Maximum size in MB of the block of the stacked frames that ' \
+                                 'is rejected and combined at once.  The memory used when ' \
+                                 'combining frames is proportional to this size instead of the ' \
+                                 'size of the full stack.'
+
+        defaults['stack_dtype'] = 'float64'
+        options['stack_dtype'] = ProcessImagesPar.valid_stack_dtypes()
+        dtypes['stack_dtype'] = str
+        descr['stack_dtype'] = 'Data type used to store the stack of processed frames before ' \
+                               'they are combined.  Options are: {0}'.format(
+                                       ', '.join(options['stack_dtype']))
+
+        dtypes['scratch_dir'] = str
+        descr['scratch_dir'] = 'Directory for the memory-mapped scratch files used to store ' \
+                               'the stack of processed frames before they are combined.  The ' \
+                               'files are removed once the frames are combined.  If None, the ' \
+                               'stack is held in memory.'
+
+        defaults['nproc'] = 1
+        dtypes['nproc'] = int
+        descr['nproc'] = 'Number of processes used to process the raw frames to combine in ' \
+                         'parallel.  Use 1 to process them serially.'
+
         defaults['lamaxiter'] = 1
         dtypes['lamaxiter'] = int
         descr['lamaxiter'] = 'Maximum number of iterations for LA cosmics routine.'
@@ -290,6 +317,19 @@ class ProcessImagesPar(ParSet):
         dtypes['objlim'] = [int, float]
         descr['objlim'] = 'Object detection limit in LA cosmics routine'
 
+        defaults['ladtype'] = 'float64'
+        options['ladtype'] = ProcessImagesPar.valid_stack_dtypes()
+        dtypes['ladtype'] = str
+        descr['ladtype'] = 'Data type used for the calculations in LA cosmics routine.  ' \
+                           'Using float32 halves the memory used but can change the ' \
+                           'detection of pixels at the thresholds.  Options are: {0}'.format(
+                                   ', '.join(options['ladtype']))
+
+        defaults['lathreads'] = 1
+        dtypes['lathreads'] = int
+        descr['lathreads'] = 'Number of threads used to compute the median filters in LA ' \
+                             'cosmics routine.'
+
         # Instantiate the parameter set
         super(ProcessImagesPar, self).__init__(list(pars.keys()),
                                                values=list(pars.values()),
@@ -307,7 +347,8 @@ class ProcessImagesPar(ParSet):
         parkeys = [ 'bias', 'overscan', 'overscan_par', 'match',
                     'combine', 'satpix', 'sigrej', 'n_lohi',
                     'sig_lohi', 'replace', 'lamaxiter', 'grow',
-                    'rmcompact', 'sigclip', 'sigfrac', 'objlim']
+                    'rmcompact', 'sigclip', 'sigfrac', 'objlim', 'combine_block',
+                    'stack_dtype', 'scratch_dir', 'nproc', 'ladtype', 'lathreads']
         kwargs = {}
         for pk in parkeys:
             kwargs[pk] = cfg[pk] if pk in k else None
@@ -348,6 +389,13 @@ class ProcessImagesPar(ParSet):
         """
         return [ 'min', 'max', 'mean', 'median', 'weightmean', 'maxnonsat' ]
 
+    @staticmethod
+    def valid_stack_dtypes():
+        """
+        Return the valid data types for the stack of processed frames.
+        """
+        return [ 'float64', 'float32' ]
+
     def validate(self):
         """
         Check the parameters are valid for the provided method.
@@ -355,6 +403,10 @@ class ProcessImagesPar(ParSet):
 
         if self.data['n_lohi'] is not None and len(self.data['n_lohi']) != 2:
             raise ValueError('n_lohi must be a list of two numbers.')
+        if self.data['nproc'] < 1:
+            raise ValueError('nproc must be at least 1.')
+        if self.data['lathreads'] < 1:
+            raise ValueError('lathreads must be at least 1.')
         if self.data['sig_lohi'] is not None and len(self.data['sig_lohi']) != 2:
             raise ValueError('n_lohi must be a list of two numbers.')
 
@@ -916,7 +968,8 @@ class ReducePar(ParSet):
     see :ref:`pypeitpar`.
     """
     def __init__(self, spectrograph=None, detnum=None, sortroot=None, calwin=None, scidir=None,
-                 qadir=None, redux_path=None, ignore_bad_headers=None):
+                 qadir=None, redux_path=None, ignore_bad_headers=None, header_threads=None,
+                 raw_cache_size=None):
 
         # Grab the parameter names and values from the function
         # arguments
@@ -955,6 +1008,17 @@ class ReducePar(ParSet):
         dtypes['ignore_bad_headers'] = bool
         descr['ignore_bad_headers'] = 'Ignore bad headers (NOT recommended unless you know it is safe).'
 
+        defaults['header_threads'] = 8
+        dtypes['header_threads'] = int
+        descr['header_threads'] = 'Number of threads used to read the headers of the raw files ' \
+                                  'when building the metadata table.'
+
+        defaults['raw_cache_size'] = 1024.
+        dtypes['raw_cache_size'] = [int, float]
+        descr['raw_cache_size'] = 'Maximum size in MB of the raw files kept in memory, such ' \
+                                  'that each file is only read and decompressed once for all ' \
+                                  'its detectors.  Use 0 to not keep any files.'
+
         defaults['scidir'] = 'Science'
         dtypes['scidir'] = str
         descr['scidir'] = 'Directory relative to calling directory to write science files.'
@@ -983,7 +1047,8 @@ class ReducePar(ParSet):
 
         # Basic keywords
         parkeys = [ 'spectrograph', 'detnum', 'sortroot', 'calwin', 'scidir', 'qadir',
-                    'redux_path', 'ignore_bad_headers']
+                    'redux_path', 'ignore_bad_headers', 'header_threads',
+                    'raw_cache_size']
         kwargs = {}
         for pk in parkeys:
             kwargs[pk] = cfg[pk] if pk in k else None
@@ -1006,7 +1071,8 @@ class ReducePar(ParSet):
                 'lbt_mods1r', 'lbt_mods1b', 'lbt_mods2r', 'lbt_mods2b', 'vlt_fors2']
 
     def validate(self):
-        pass
+        if self.data['header_threads'] < 1:
+            raise ValueError('header_threads must be at least 1.')
 
     
 class WavelengthSolutionPar(ParSet):
@@ -1024,7 +1090,7 @@ class WavelengthSolutionPar(ParSet):
                  rms_threshold=None, match_toler=None, func=None, n_first=None, n_final=None,
                  sigrej_first=None, sigrej_final=None, wv_cen=None, disp=None, numsearch=None,
                  nfitpix=None, IDpixels=None, IDwaves=None, medium=None, frame=None,
-                 nsnippet=None):
+                 nsnippet=None, nproc=None):
 
         # Grab the parameter names and values from the function
         # arguments
@@ -1136,6 +1202,13 @@ class WavelengthSolutionPar(ParSet):
         dtypes['nsnippet'] = int
         descr['nsnippet'] = 'Number of spectra to chop the arc spectrum into when using the full_template method'
 
+        defaults['nproc'] = 1
+        dtypes['nproc'] = int
+        descr['nproc'] = 'Number of processes used to identify the slits when using the ' \
+                         'reidentify or holy-grail methods.  For holy-grail with a single ' \
+                         'slit, the pattern matching parameters are searched in parallel ' \
+                         'instead.'
+
         defaults['cc_thresh'] = 0.70
         dtypes['cc_thresh'] = [float, list, numpy.ndarray]
         descr['cc_thresh'] = 'Threshold for the *global* cross-correlation coefficient between an input spectrum and member ' \
@@ -1257,7 +1330,7 @@ class WavelengthSolutionPar(ParSet):
                    'fwhm', 'reid_arxiv', 'nreid_min', 'cc_thresh', 'cc_local_thresh',
                    'nlocal_cc', 'rms_threshold', 'match_toler', 'func', 'n_first','n_final',
                    'sigrej_first', 'sigrej_final', 'wv_cen', 'disp', 'numsearch', 'nfitpix',
-                   'IDpixels', 'IDwaves', 'medium', 'frame', 'nsnippet']
+                   'IDpixels', 'IDwaves', 'medium', 'frame', 'nsnippet', 'nproc']
         kwargs = {}
         for pk in parkeys:
             kwargs[pk] = cfg[pk] if pk in k else None
@@ -1299,7 +1372,8 @@ class WavelengthSolutionPar(ParSet):
         return [ 'observed', 'heliocentric', 'barycentric' ]
 
     def validate(self):
-        pass
+        if self.data['nproc'] < 1:
+            raise ValueError('nproc must be at least 1.')
 
 
 class TraceSlitsPar(ParSet):
@@ -1688,7 +1762,7 @@ class ScienceImagePar(ParSet):
     def __init__(self, bspline_spacing=None, boxcar_radius=None, trace_npoly=None,
                  global_sky_std=None, sig_thresh=None, maxnumber=None, sn_gauss=None,
                  find_trim_edge=None, std_prof_nsigma=None,
-                 model_full_slit=None, no_poly=None, manual=None, sky_sigrej=None):
+                 model_full_slit=None, no_poly=None, manual=None, sky_sigrej=None, nproc=None):
 
         # Grab the parameter names and values from the function
         # arguments
@@ -1773,6 +1847,12 @@ class ScienceImagePar(ParSet):
         dtypes['manual'] = list
         descr['manual'] = 'List of manual extraction parameter sets'
 
+        defaults['nproc'] = 1
+        dtypes['nproc'] = int
+        descr['nproc'] = 'Number of processes used to perform the global sky subtraction of ' \
+                         'the slits and the profile fits of neighboring objects in the local ' \
+                         'sky subtraction in parallel.  Use 1 to process them serially.'
+
         # Instantiate the parameter set
         super(ScienceImagePar, self).__init__(list(pars.keys()),
                                               values=list(pars.values()),
@@ -1789,7 +1869,7 @@ class ScienceImagePar(ParSet):
         parkeys = ['bspline_spacing', 'boxcar_radius', 'trace_npoly', 'global_sky_std',
                    'sig_thresh', 'maxnumber', 'sn_gauss', 'model_full_slit', 'no_poly', 'manual',
                    'find_trim_edge', 'std_prof_nsigma',
-                   'sky_sigrej']
+                   'sky_sigrej', 'nproc']
         kwargs = {}
         for pk in parkeys:
             kwargs[pk] = cfg[pk] if pk in k else None
@@ -1797,7 +1877,8 @@ class ScienceImagePar(ParSet):
         return cls(**kwargs)
 
     def validate(self):
-        pass
+        if self.data['nproc'] < 1:
+            raise ValueError('nproc must be at least 1.')
 
 
 class CalibrationsPar(ParSet):
@@ -1811,10 +1892,11 @@ class CalibrationsPar(ParSet):
     For a table with the current keywords, defaults, and descriptions,
     see :ref:`pypeitpar`.
     """
-    def __init__(self, caldir=None, setup=None, trim=None, badpix=None, biasframe=None,
-                 darkframe=None, arcframe=None, tiltframe=None, pixelflatframe=None,
-                 pinholeframe=None, traceframe=None, standardframe=None, flatfield=None,
-                 wavelengths=None, slits=None, tilts=None):
+    def __init__(self, caldir=None, cachedir=None, cache_size=None, memory_limit=None,
+                 setup=None, trim=None, badpix=None, biasframe=None, darkframe=None,
+                 arcframe=None, tiltframe=None, pixelflatframe=None, pinholeframe=None,
+                 traceframe=None, standardframe=None, flatfield=None, wavelengths=None,
+                 slits=None, tilts=None):
 
         # Grab the parameter names and values from the function
         # arguments
@@ -1834,6 +1916,21 @@ class CalibrationsPar(ParSet):
         dtypes['caldir'] = str
         descr['caldir'] = 'Directory relative to calling directory to write master files.'
 
+        dtypes['cachedir'] = str
+        descr['cachedir'] = 'Directory with a persistent cache of the calibrations, reused when ' \
+                            'their raw files, parameters, and PypeIt version are unchanged.  ' \
+                            'If None, the cache is not used.'
+
+        defaults['cache_size'] = 10.
+        dtypes['cache_size'] = [int, float]
+        descr['cache_size'] = 'Maximum size of the calibration cache in GB.  The least ' \
+                              'recently used calibrations are removed when it is exceeded.'
+
+        dtypes['memory_limit'] = [int, float]
+        descr['memory_limit'] = 'Memory limit in GB for the calibrations held during the ' \
+                                'reduction; the least recently used are moved to a temporary ' \
+                                'directory when exceeded.  If None, there is no limit.'
+
         dtypes['setup'] = str
         descr['setup'] = 'If masters=\'force\', this is the setup name to be used: e.g., ' \
                          'C_02_aa .  The detector number is ignored but the other information ' \
@@ -1912,7 +2009,8 @@ class CalibrationsPar(ParSet):
         k = cfg.keys()
 
         # Basic keywords
-        parkeys = [ 'caldir', 'setup', 'trim', 'badpix' ]
+        parkeys = [ 'caldir', 'cachedir', 'cache_size', 'memory_limit', 'setup', 'trim',
+                    'badpix' ]
         kwargs = {}
         for pk in parkeys:
             kwargs[pk] = cfg[pk] if pk in k else None
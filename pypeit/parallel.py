@@ -0,0 +1,402 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+"""
+Utilities used to distribute independent pieces of a reduction step
+(e.g. slits or detectors) over a pool of worker processes.
+
+Large images needed by all the workers are copied once into shared
+memory, instead of being pickled and sent along with every task.
+Workers access them by name with :func:`get_shared`::
+
+    def work(slit):
+        image = parallel.get_shared('image')
+        ...
+
+    results = parallel.map_tasks(work, slits, nproc=4, shared={'image': image})
+
+Tasks executed by a worker process cannot start their own pool; any
+call to :func:`map_tasks` within a worker is executed serially.
+
+:func:`map_tasks` starts and stops a pool for each call.  Steps that
+distribute tasks repeatedly (e.g. once per iteration) use a
+:class:`TaskPool` instead, which keeps its workers and shared arrays
+between calls::
+
+    with parallel.TaskPool(nproc=4, shared={'image': image}) as pool:
+        for i in range(niter):
+            pool.update(image=image)
+            results = pool.map(work, slits)
+"""
+import weakref
+import multiprocessing
+from multiprocessing import sharedctypes
+
+import numpy as np
+
+from pypeit import msgs
+
+# Arrays and objects available to the task functions; filled by the
+# initializer of each worker process or, when running serially, by
+# map_tasks itself.
+_shared_arrays = {}
+
+# Set in the worker processes to prevent them from starting nested
+# pools
+_in_worker = False
+
+
+def share_arrays(arrays):
+    """
+    Copy a set of arrays into shared memory.
+
+    Args:
+        arrays (:obj:`dict`):
+            Dictionary with the `numpy.ndarray`_ objects to share.
+
+    Returns:
+        :obj:`dict`: Dictionary with the same keys as the input.
+        Each value is a tuple with the shared buffer, the data type,
+        and the shape of the array.
+    """
+    shared = {}
+    for key, arr in arrays.items():
+        _arr = np.ascontiguousarray(arr)
+        buf = sharedctypes.RawArray('b', max(_arr.nbytes, 1))
+        np.frombuffer(buf, dtype=_arr.dtype, count=_arr.size)[...] = _arr.ravel()
+        shared[key] = (buf, _arr.dtype.str, _arr.shape)
+    return shared
+
+
+def _init_worker(shared, objects):
+    """
+    Initialize a worker process by constructing read-only array views
+    of the shared buffers created by :func:`share_arrays` and
+    registering any other shared objects.
+    """
+    global _shared_arrays, _in_worker
+    _in_worker = True
+    _shared_arrays = dict(objects)
+    for key, (buf, dtype, shape) in shared.items():
+        arr = np.frombuffer(buf, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        arr.flags.writeable = False
+        _shared_arrays[key] = arr
+
+
+def in_worker():
+    """
+    Return True if called by a task executed in a worker process.
+    """
+    return _in_worker
+
+
+def get_shared(key):
+    """
+    Return one of the arrays or objects shared with the worker
+    processes.
+
+    Args:
+        key (:obj:`str`):
+            Name of the array provided to :func:`map_tasks`.
+
+    Returns:
+        `numpy.ndarray`_, object: The shared array or object.  Arrays
+        should be treated as read-only.
+    """
+    if key not in _shared_arrays:
+        msgs.error('No shared array or object called {0}.'.format(key))
+    return _shared_arrays[key]
+
+
+def map_tasks(func, args, nproc=1, shared=None):
+    """
+    Apply a function to each element of a list of arguments.
+
+    With ``nproc > 1``, the tasks are distributed over a pool of
+    worker processes.  The results are always returned in the order
+    of the input arguments, so that they can be merged
+    deterministically.
+
+    Args:
+        func (callable):
+            Function to apply.  It must be defined at the top level of
+            a module so that it can be sent to the worker processes.
+        args (:obj:`list`):
+            List of the arguments for each call.  Tuples are unpacked
+            as positional arguments.
+        nproc (:obj:`int`, optional):
+            Number of processes to use.  If 1 or None, all the calls are
+            executed in the current process.
+        shared (:obj:`dict`, optional):
+            Dictionary of arrays made available to `func` through
+            :func:`get_shared`.  The arrays are only copied into
+            shared memory when more than one process is used.  Values
+            that are not `numpy.ndarray`_ objects are handed to each
+            worker as they are; they are not copied when the worker
+            processes are forked, otherwise they are pickled once per
+            worker.  Changes made to them by the workers are not seen
+            by the calling process.
+
+    Returns:
+        :obj:`list`: The result of each call.
+    """
+    return list(iter_tasks(func, args, nproc=nproc, shared=shared))
+
+
+def _run_task(task):
+    """Execute one task, a tuple with a function and its arguments, for :func:`iter_tasks`."""
+    func, args = task
+    return func(*args)
+
+
+def iter_tasks(func, args, nproc=1, shared=None):
+    """
+    Iterate over the results of applying a function to each element of
+    a list of arguments.
+
+    This is the same as :func:`map_tasks`, except that the results are
+    yielded one at a time, in the order of the input arguments, as
+    soon as they are available.  This allows the caller to consume
+    each result (e.g. copy it into a preallocated array) while the
+    remaining tasks are still executing, without holding all the
+    results in memory.  If the caller stops iterating before all the
+    results have been consumed (e.g. with ``break``, or by calling
+    ``close()`` on the returned generator), the tasks that have not
+    completed are cancelled; this allows searches to stop as soon as
+    an acceptable result is found.
+
+    Args:
+        func (callable):
+            Function to apply; see :func:`map_tasks`.
+        args (:obj:`list`):
+            List of the arguments for each call; see :func:`map_tasks`.
+        nproc (:obj:`int`, optional):
+            Number of processes to use; see :func:`map_tasks`.
+        shared (:obj:`dict`, optional):
+            Arrays and objects made available to `func`; see
+            :func:`map_tasks`.
+
+    Yields:
+        object: The result of each call.
+    """
+    global _shared_arrays
+    _args = [a if isinstance(a, tuple) else (a,) for a in args]
+    _shared = {} if shared is None else shared
+    if nproc is None or nproc < 2 or len(_args) < 2 or _in_worker:
+        # Serial execution; the shared arrays are used directly
+        for a in _args:
+            _previous = _shared_arrays
+            _shared_arrays = dict(_previous, **_shared)
+            try:
+                result = func(*a)
+            finally:
+                _shared_arrays = _previous
+            yield result
+        return
+
+    nproc = min(nproc, len(_args))
+    msgs.info('Distributing {0} tasks over {1} processes'.format(len(_args), nproc))
+    arrays = dict([(k, v) for k, v in _shared.items() if isinstance(v, np.ndarray)])
+    objects = dict([(k, v) for k, v in _shared.items() if not isinstance(v, np.ndarray)])
+    pool = multiprocessing.Pool(processes=nproc, initializer=_init_worker,
+                                initargs=(share_arrays(arrays), objects))
+    completed = False
+    try:
+        for result in pool.imap(_run_task, [(func, a) for a in _args], chunksize=1):
+            yield result
+        completed = True
+    finally:
+        if completed:
+            pool.close()
+        else:
+            # The caller stopped early; cancel the pending tasks
+            pool.terminate()
+        pool.join()
+
+
+class TaskPool(object):
+    """
+    Pool of worker processes reused to execute several sets of tasks.
+
+    The worker processes and the shared memory are created by the
+    first call to :func:`map` with more than one task, and kept until
+    :func:`close` is called or the object is deleted; use the object
+    as a context manager to make sure the workers are stopped.  The values of the shared
+    arrays can be changed between calls with :func:`update`, without
+    restarting the workers.  As with :func:`map_tasks`, the tasks are
+    executed serially with ``nproc < 2`` or in a worker process.
+
+    Args:
+        nproc (:obj:`int`, optional):
+            Number of processes to use.
+        shared (:obj:`dict`, optional):
+            Arrays and objects made available to the tasks; see
+            :func:`map_tasks`.
+    """
+    def __init__(self, nproc=1, shared=None):
+        self.nproc = 1 if nproc is None or _in_worker else nproc
+        self.shared = {} if shared is None else dict(shared)
+        self._pool = None
+        self._arrays = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close(terminate=exc[0] is not None)
+
+    def _start(self):
+        """Copy the shared arrays into shared memory and start the workers."""
+        arrays = dict([(k, v) for k, v in self.shared.items() if isinstance(v, np.ndarray)])
+        objects = dict([(k, v) for k, v in self.shared.items() if not isinstance(v, np.ndarray)])
+        buffers = share_arrays(arrays)
+        # Views used to update the shared memory
+        self._arrays = dict([(k, np.frombuffer(buf, dtype=dtype,
+                                               count=int(np.prod(shape))).reshape(shape))
+                                for k, (buf, dtype, shape) in buffers.items()])
+        msgs.info('Starting a pool of {0} processes'.format(self.nproc))
+        self._pool = multiprocessing.Pool(processes=self.nproc, initializer=_init_worker,
+                                          initargs=(buffers, objects))
+        self._finalizer = weakref.finalize(self, self._pool.terminate)
+
+    def update(self, **arrays):
+        """
+        Change the values of shared arrays.
+
+        Args:
+            **arrays:
+                New values of the arrays, which must have the shape
+                of the arrays provided when the pool was created.
+        """
+        for key, arr in arrays.items():
+            if self._arrays is not None:
+                if arr.shape != self._arrays[key].shape:
+                    msgs.error('Cannot change the shape of shared array {0}.'.format(key))
+                self._arrays[key][...] = arr
+            self.shared[key] = arr
+
+    def map(self, func, args):
+        """
+        Apply a function to each element of a list of arguments.
+
+        Args:
+            func (callable):
+                Function to apply; see :func:`map_tasks`.
+            args (:obj:`list`):
+                List of the arguments for each call; see
+                :func:`map_tasks`.
+
+        Returns:
+            :obj:`list`: The result of each call, in the order of the
+            input arguments.
+        """
+        if self.nproc < 2 or (self._pool is None and len(args) < 2):
+            return map_tasks(func, args, nproc=1, shared=self.shared)
+        if self._pool is None:
+            self._start()
+        _args = [a if isinstance(a, tuple) else (a,) for a in args]
+        return self._pool.map(_run_task, [(func, a) for a in _args], chunksize=1)
+
+    def close(self, terminate=False):
+        """
+        Stop the worker processes, if started.
+
+        Args:
+            terminate (:obj:`bool`, optional):
+                Stop the workers without waiting for pending tasks.
+        """
+        if self._pool is None:
+            return
+        self._finalizer.detach()
+        if terminate:
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        self._pool.join()
+        self._pool = None
+        self._arrays = None
+
+
+def graph_levels(depends):
+    """
+    Sort the nodes of a dependency graph into levels of independent
+    nodes.
+
+    Each node only depends on nodes in the preceding levels, and the
+    order of the nodes within each level follows the order of the
+    input.
+
+    Args:
+        depends (:obj:`dict`):
+            Dictionary with the list of nodes that each node depends
+            on.  All the dependencies must also be keys of the
+            dictionary.
+
+    Returns:
+        :obj:`list`: The list of nodes in each level.
+
+    Raises:
+        PypeItError:
+            Raised if a dependency is not a node of the graph or the
+            graph has a cycle.
+    """
+    for node, deps in depends.items():
+        missing = [d for d in deps if d not in depends]
+        if len(missing) > 0:
+            msgs.error('Unknown dependencies of {0}: {1}'.format(node, missing))
+    levels = []
+    done = set()
+    remaining = list(depends.keys())
+    while len(remaining) > 0:
+        ready = [node for node in remaining if all([d in done for d in depends[node]])]
+        if len(ready) == 0:
+            msgs.error('Dependency graph has a cycle among: {0}'.format(remaining))
+        levels += [ready]
+        done.update(ready)
+        remaining = [node for node in remaining if node not in done]
+    return levels
+
+
+def _run_node(func, args):
+    """Execute one node of the graph in :func:`run_graph`."""
+    return func(*args)
+
+
+def run_graph(tasks, nproc=1, shared=None, merge=None):
+    """
+    Execute a set of tasks with dependencies.
+
+    The graph is executed one level (see :func:`graph_levels`) at a
+    time, with the independent tasks of each level distributed over
+    `nproc` processes by :func:`map_tasks`.  The results of each level
+    are passed to `merge` in the calling process before the next level
+    starts, so that the worker processes of the next level see them.
+
+    Args:
+        tasks (:obj:`dict`):
+            Dictionary with the tasks to execute.  Each value is a
+            tuple with the function to call, the tuple of its
+            arguments, and the list of the names of the tasks that
+            must be completed first.  With a
+            `collections.OrderedDict`_, the tasks of each level are
+            executed (and merged) in order.
+        nproc (:obj:`int`, optional):
+            Number of processes to use.
+        shared (:obj:`dict`, optional):
+            Arrays and objects made available to the tasks; see
+            :func:`map_tasks`.
+        merge (callable, optional):
+            Function called as ``merge(name, result)`` in the calling
+            process for each completed task.
+
+    Returns:
+        :obj:`dict`: The result of each task.
+    """
+    results = {}
+    for level in graph_levels(dict([(name, task[2]) for name, task in tasks.items()])):
+        result = map_tasks(_run_node, [tasks[name][:2] for name in level], nproc=nproc,
+                           shared=shared)
+        for name, r in zip(level, result):
+            results[name] = r
+            if merge is not None:
+                merge(name, r)
+    return results
@@ -13,6 +13,8 @@ from pypeit import calibrations
 from pypeit.images import scienceimage
 from pypeit import ginga
 from pypeit import reduce
+from pypeit import parallel
+from pypeit import io
 from pypeit.core import qa
 from pypeit.core import wave
 from pypeit.core import save
@@ -52,6 +54,10 @@ class PypeIt(object):
             remote control ginga session via "ginga --modules=RC &"
         redux_path (:obj:`str`, optional):
             Over-ride reduction path in PypeIt file (e.g. Notebook usage)
+        ncpu (:obj:`int`, optional):
+            Number of processes used to calibrate and reduce the
+            detectors of each exposure in parallel.  Ignored if `show`
+            is True.
 
     Attributes:
         TODO: Come back to this...
@@ -64,7 +70,7 @@ class PypeIt(object):
 #    __metaclass__ = ABCMeta
 
     def __init__(self, pypeit_file, verbosity=2, overwrite=True, reuse_masters=False, logname=None,
-                 show=False, redux_path=None):
+                 show=False, redux_path=None, ncpu=1):
 
         # Load
         cfg_lines, data_files, frametype, usrdata, setups \
@@ -120,6 +126,13 @@ class PypeIt(object):
         # reuse_masters.
         self.reuse_masters = reuse_masters
         self.show = show
+        self.ncpu = ncpu
+
+        # Keep the raw files in memory while all their detectors are
+        # processed
+        io.raw_file_cache.max_size = self.par['rdx']['raw_cache_size']
+        io.raw_file_cache.clear()
+        io.raw_file_cache.reset_stats()
 
         # Check the output paths are ready
         self.par['rdx']['redux_path'] = os.getcwd() if redux_path is None else redux_path
@@ -236,8 +249,14 @@ class PypeIt(object):
         """
         Main driver of the entire reduction
 
-        Calibration and extraction via a series of calls to reduce_exposure()
-
+        Calibration and extraction via a series of calls to
+        reduce_exposure(), scheduled by :func:`reduction_graph`.  The
+        calibration groups are reduced in the batches returned by
+        :func:`calib_group_batches`: the calibrations of each batch
+        are built, followed by its standard and science exposures,
+        and the calibrations are then moved from memory to disk
+        before the next batch.  Independent steps are executed in
+        parallel if :attr:`ncpu` is larger than 1.
         """
         # Validate the parameter set
         required = ['rdx', 'calibrations', 'scienceframe', 'scienceimage', 'flexure', 'fluxcalib']
@@ -246,6 +265,95 @@ class PypeIt(object):
 
         self.tstart = time.time()
 
+        # Build the graph of reduction steps of each batch of
+        # calibration groups and run it
+        nproc = 1 if self.show else self.ncpu
+        batches = self.calib_group_batches(nproc)
+        done = set()
+        for i, groups in enumerate(batches):
+            tasks = self.reduction_graph(groups=groups, skip=done)
+            parallel.run_graph(tasks, nproc=nproc, shared={'pypeit': self},
+                               merge=self._merge_task)
+            done.update(tasks.keys())
+            if i < len(batches)-1:
+                # Bound the calibrations held in memory to one batch
+                self.caliBrate.calib_dict.spill_all()
+
+        # Report the use of the calibration and raw-file caches
+        self.caliBrate.calib_dict.report()
+        if self.caliBrate.cache is not None:
+            self.caliBrate.cache.report()
+        io.raw_file_cache.report()
+
+        # Finish
+        self.print_end_time()
+
+    def calib_group_batches(self, nproc=1):
+        """
+        Split the calibration groups into the batches reduced by
+        :func:`reduce_all`.
+
+        Each batch has as many groups as needed to build the
+        calibrations of all their detectors with `nproc` processes,
+        and at least one; i.e., the groups are reduced one at a time
+        when `nproc` is 1.  The science exposures use the first
+        standard (see :func:`get_std_outfile`), so the group of this
+        standard is reduced first.  The other groups follow in order.
+
+        Args:
+            nproc (:obj:`int`, optional):
+                Number of processes used to reduce each batch.
+
+        Returns:
+            :obj:`list`: The list of calibration groups in each batch.
+        """
+        groups = list(range(self.fitstbl.n_calib_groups))
+        is_standard = self.fitstbl.find_frames('standard')
+        if np.any(is_standard):
+            std_frame = np.where(is_standard)[0][0]
+            std_groups = [i for i in groups if self.fitstbl.find_calib_group(i)[std_frame]]
+            if len(std_groups) > 0:
+                groups.remove(std_groups[0])
+                groups.insert(0, std_groups[0])
+        ndet = len(PypeIt.select_detectors(detnum=self.par['rdx']['detnum'],
+                                           ndet=self.spectrograph.ndet))
+        ngroup = max(1, nproc//ndet)
+        return [groups[i:i+ngroup] for i in range(0, len(groups), ngroup)]
+
+    def reduction_graph(self, groups=None, skip=None):
+        """
+        Construct the graph of the steps needed to reduce the standard
+        and science exposures of a set of calibration groups.
+
+        The graph has three kinds of tasks:
+            - ``('calib', i, det)``: Build the calibrations of detector
+              `det` for calibration group `i`.
+            - ``('standard', comb_id)``: Reduce and save the standard
+              star exposure `comb_id`, which depends on the
+              calibrations of its group.
+            - ``('science', comb_id)``: Reduce and save the science
+              exposure `comb_id`, which depends on the calibrations of
+              its group and on the standard used to trace the objects
+              (see :func:`get_std_outfile`).
+
+        Exposures with existing output files are skipped unless
+        :attr:`overwrite` is True, as are the calibrations of groups
+        without any exposure to reduce.
+
+        Args:
+            groups (:obj:`list`, optional):
+                Calibration groups to reduce.  If None, reduce all the
+                groups.
+            skip (:obj:`set`, optional):
+                Names of tasks already executed, e.g. for exposures
+                that belong to more than one calibration group.  A
+                science exposure only depends on its standard if the
+                standard is reduced in the same graph.
+
+        Returns:
+            `collections.OrderedDict`_: The tasks to execute with
+            :func:`pypeit.parallel.run_graph`.
+        """
         # Find the standard frames
         is_standard = self.fitstbl.find_frames('standard')
 
@@ -255,42 +363,44 @@ class PypeIt(object):
         # Frame indices
         frame_indx = np.arange(len(self.fitstbl))
 
-        # Iterate over each calibration group and reduce the standards
-        for i in range(self.fitstbl.n_calib_groups):
+        # Find the detectors to reduce
+        detectors = PypeIt.select_detectors(detnum=self.par['rdx']['detnum'],
+                                            ndet=self.spectrograph.ndet)
+
+        # Associate the standard used for the science frames; see
+        # get_std_outfile
+        std_frame = frame_indx[is_standard][0] if np.any(is_standard) else None
 
+        _groups = range(self.fitstbl.n_calib_groups) if groups is None else groups
+        _skip = set() if skip is None else skip
+
+        calib_tasks = OrderedDict()
+        tasks = OrderedDict()
+        for i in _groups:
             # Find all the frames in this calibration group
             in_grp = self.fitstbl.find_calib_group(i)
+            calibs = [('calib', i, det) for det in detectors]
+            # First frame of each exposure to reduce in this group
+            grp_frames = []
 
-            # Find the indices of the standard frames in this calibration group:
+            # Reduce the standards first, loop on unique comb_id
             grp_standards = frame_indx[is_standard & in_grp]
-
-            # Reduce all the standard frames, loop on unique comb_id
-            u_combid_std= np.unique(self.fitstbl['comb_id'][grp_standards])
-            for j, comb_id in enumerate(u_combid_std):
+            for comb_id in np.unique(self.fitstbl['comb_id'][grp_standards]):
                 frames = np.where(self.fitstbl['comb_id'] == comb_id)[0]
                 bg_frames = np.where(self.fitstbl['bkg_id'] == comb_id)[0]
-                if not self.outfile_exists(frames[0]) or self.overwrite:
-                    std_dict = self.reduce_exposure(frames, bg_frames=bg_frames)
-                    # TODO come up with sensible naming convention for save_exposure for combined files
-                    self.save_exposure(frames[0], std_dict, self.basename)
-                else:
-                    msgs.info('Output file: {:s} already exists'.format(self.fitstbl.construct_basename(frames[0])) +
-                              '. Set overwrite=True to recreate and overwrite.')
-
-        # Iterate over each calibration group again and reduce the science frames
-        for i in range(self.fitstbl.n_calib_groups):
-            # Find all the frames in this calibration group
-            in_grp = self.fitstbl.find_calib_group(i)
-
-            # Find the indices of the science frames in this calibration group:
+                if self.outfile_exists(frames[0]) and not self.overwrite:
+                    msgs.info('Output file: {:s} already exists'.format(
+                              self.fitstbl.construct_basename(frames[0]))
+                              + '. Set overwrite=True to recreate and overwrite.')
+                    continue
+                if ('standard', comb_id) not in tasks and ('standard', comb_id) not in _skip:
+                    tasks[('standard', comb_id)] = (reduce_and_save, (frames, bg_frames, None),
+                                                    calibs)
+                    grp_frames += [frames[0]]
+
+            # Then the science frames, loop on unique comb_id
             grp_science = frame_indx[is_science & in_grp]
-            # Associate standards (previously reduced above) for this setup
-            std_outfile = self.get_std_outfile(frame_indx[is_standard])
-            # Reduce all the science frames; keep the basenames of the science frames for use in flux calibration
-            science_basename = [None]*len(grp_science)
-            # Loop on unique comb_id
-            u_combid = np.unique(self.fitstbl['comb_id'][grp_science])
-            for j, comb_id in enumerate(u_combid):
+            for comb_id in np.unique(self.fitstbl['comb_id'][grp_science]):
                 frames = np.where(self.fitstbl['comb_id'] == comb_id)[0]
                 # Find all frames whose comb_id matches the current frames bkg_id.
                 bg_frames = np.where((self.fitstbl['comb_id'] == self.fitstbl['bkg_id'][frames][0]) &
@@ -299,19 +409,68 @@ class PypeIt(object):
                 # as a background image. The syntax below would require that we could somehow list multiple
                 # numbers for the bkg_id which is impossible without a comma separated list
 #                bg_frames = np.where(self.fitstbl['bkg_id'] == comb_id)[0]
-                if not self.outfile_exists(frames[0]) or self.overwrite:
-                    sci_dict = self.reduce_exposure(frames, bg_frames=bg_frames, std_outfile=std_outfile)
-                    science_basename[j] = self.basename
-                    # TODO come up with sensible naming convention for save_exposure for combined files
-                    self.save_exposure(frames[0], sci_dict, self.basename)
-                else:
-                    msgs.warn('Output file: {:s} already exists'.format(self.fitstbl.construct_basename(frames[0])) +
-                              '. Set overwrite=True to recreate and overwrite.')
-
-            msgs.info('Finished calibration group {0}'.format(i))
+                if self.outfile_exists(frames[0]) and not self.overwrite:
+                    msgs.warn('Output file: {:s} already exists'.format(
+                              self.fitstbl.construct_basename(frames[0]))
+                              + '. Set overwrite=True to recreate and overwrite.')
+                    continue
+                if ('science', comb_id) in tasks or ('science', comb_id) in _skip:
+                    continue
+                depends = list(calibs)
+                if std_frame is not None:
+                    std_task = ('standard', self.fitstbl['comb_id'][std_frame])
+                    if std_task in tasks:
+                        depends += [std_task]
+                tasks[('science', comb_id)] \
+                        = (reduce_and_save, (frames, bg_frames, frame_indx[is_standard]), depends)
+                grp_frames += [frames[0]]
+
+            # Build the calibrations only for groups with exposures to
+            # reduce, using the first exposure of the group
+            if len(grp_frames) > 0:
+                for c in calibs:
+                    calib_tasks[c] = (calibrate_detector, (grp_frames[0], c[2]), [])
+
+        calib_tasks.update(tasks)
+        return calib_tasks
+
+    def _merge_calibrations(self, calib_dict, cache_stats):
+        """
+        Merge the calibrations and the cache statistics returned by a
+        worker process.
 
-        # Finish
-        self.print_end_time()
+        Args:
+            calib_dict (:obj:`dict`):
+                Calibrations to add to
+                :attr:`pypeit.calibrations.Calibrations.calib_dict`.
+            cache_stats (:obj:`tuple`):
+                Hits and misses of the calibration cache (None if the
+                cache is not used) and of the raw-file cache in the
+                worker process.  None if the task was executed by this
+                process.
+        """
+        for key, data in calib_dict.items():
+            if key not in self.caliBrate.calib_dict:
+                self.caliBrate.calib_dict[key] = {}
+            self.caliBrate.calib_dict[key].update(data)
+        if cache_stats is None:
+            return
+        if cache_stats[0] is not None:
+            self.caliBrate.cache.add_stats(cache_stats[0])
+        io.raw_file_cache.add_stats(cache_stats[1])
+
+    def _merge_task(self, name, result):
+        """
+        Merge the result of a task in :func:`reduction_graph` into this
+        object.
+        """
+        if name[0] == 'calib':
+            calib_dict, cache_stats = result
+            self._merge_calibrations(calib_dict, cache_stats)
+            return
+        self.basename, cache_stats = result
+        self._merge_calibrations({}, cache_stats)
+        msgs.info('Finished {0} exposure {1}'.format(*name))
 
     # This is a static method to allow for use in coadding script 
     @staticmethod
@@ -397,32 +556,74 @@ class PypeIt(object):
             msgs.warn('Not reducing detectors: {0}'.format(' '.join([ str(d) for d in 
                                 set(np.arange(self.spectrograph.ndet))-set(detectors)])))
 
+        # Reduce the detectors in parallel?  Not if the exposure is
+        # already being reduced by a worker process.
+        nproc = 1 if self.show or parallel.in_worker() else min(self.ncpu, len(detectors))
+        if nproc > 1:
+            args = [(frames, det, bg_frames, std_outfile) for det in detectors]
+            result = parallel.map_tasks(reduce_one_detector, args, nproc=nproc,
+                                        shared={'pypeit': self})
+            # Merge the results in detector order
+            for self.det, (det_dict, vel_corr, basename, master_key_dict, calib_dict,
+                           cache_stats) in zip(detectors, result):
+                sci_dict[self.det] = det_dict
+                if vel_corr is not None:
+                    sci_dict['meta']['vel_corr'] = vel_corr
+                self.basename = basename
+                self.caliBrate.master_key_dict = master_key_dict
+                self._merge_calibrations(calib_dict, cache_stats)
+            return sci_dict
+
         # Loop on Detectors
         for self.det in detectors:
-            msgs.info("Working on detector {0}".format(self.det))
-            sci_dict[self.det] = {}
-            # Calibrate
-            #TODO Is the right behavior to just use the first frame?
-            self.caliBrate.set_config(frames[0], self.det, self.par['calibrations'])
-            self.caliBrate.run_the_steps()
-            # Extract
-            # TODO: pass back the background frame, pass in background
-            # files as an argument. extract one takes a file list as an
-            # argument and instantiates science within
-            sci_dict[self.det]['sciimg'], sci_dict[self.det]['sciivar'], \
-                sci_dict[self.det]['skymodel'], sci_dict[self.det]['objmodel'], \
-                sci_dict[self.det]['ivarmodel'], sci_dict[self.det]['outmask'], \
-                sci_dict[self.det]['specobjs'], vel_corr \
-                        = self.extract_one(frames, self.det, bg_frames=bg_frames,
-                                           std_outfile=std_outfile)
+            sci_dict[self.det], vel_corr = self.reduce_detector(frames, self.det,
+                                                                bg_frames=bg_frames,
+                                                                std_outfile=std_outfile)
             if vel_corr is not None:
                 sci_dict['meta']['vel_corr'] = vel_corr
 
-            # JFH TODO write out the background frame?
-
         # Return
         return sci_dict
 
+    def reduce_detector(self, frames, det, bg_frames=[], std_outfile=None):
+        """
+        Calibrate and extract one detector of an exposure.
+
+        Args:
+            frames (:obj:`list`):
+                List of frames to extract; stacked if more than one is
+                provided.
+            det (:obj:`int`):
+                1-indexed detector to reduce.
+            bg_frames (:obj:`list`, optional):
+                List of frame indices for the background.
+            std_outfile (:obj:`str`, optional):
+                File with a previously reduced standard spectrum from
+                PypeIt.
+
+        Returns:
+            tuple: The dictionary with the primary outputs of the
+            extraction for this detector and the velocity correction
+            (None if not applied).
+        """
+        msgs.info("Working on detector {0}".format(det))
+        det_dict = {}
+        # Calibrate
+        #TODO Is the right behavior to just use the first frame?
+        self.caliBrate.set_config(frames[0], det, self.par['calibrations'])
+        self.caliBrate.run_the_steps()
+        # Extract
+        # TODO: pass back the background frame, pass in background
+        # files as an argument. extract one takes a file list as an
+        # argument and instantiates science within
+        det_dict['sciimg'], det_dict['sciivar'], det_dict['skymodel'], det_dict['objmodel'], \
+            det_dict['ivarmodel'], det_dict['outmask'], det_dict['specobjs'], vel_corr \
+                    = self.extract_one(frames, det, bg_frames=bg_frames, std_outfile=std_outfile)
+
+        # JFH TODO write out the background frame?
+
+        return det_dict, vel_corr
+
     def flexure_correct(self, sobjs, maskslits):
         """
         Correct for flexure
@@ -724,3 +925,111 @@ class PypeIt(object):
         return '<{:s}: pypeit_file={}>'.format(self.__class__.__name__, self.pypeit_file)
 
 
+
+
+def reduce_one_detector(frames, det, bg_frames, std_outfile):
+    """
+    Calibrate and extract one detector with the :class:`PypeIt` object
+    shared by :func:`pypeit.parallel.map_tasks`.
+
+    This is the task executed by each worker process in
+    :func:`PypeIt.reduce_exposure`; see :func:`PypeIt.reduce_detector`
+    for the arguments.
+
+    Returns:
+        tuple: The dictionary with the extraction outputs, the
+        velocity correction, the root name of the output files, and
+        the master keys and calibration data for this detector, which
+        the calling process needs to save the exposure, and the
+        statistics of the caches.
+    """
+    pypeIt = parallel.get_shared('pypeit')
+    _reset_cache_stats(pypeIt)
+    det_dict, vel_corr = pypeIt.reduce_detector(frames, det, bg_frames=bg_frames,
+                                                std_outfile=std_outfile)
+    master_key_dict = pypeIt.caliBrate.master_key_dict
+    calib_dict = dict([(key, pypeIt.caliBrate.calib_dict[key])
+                            for key in set(master_key_dict.values())
+                                if key in pypeIt.caliBrate.calib_dict])
+    return det_dict, vel_corr, pypeIt.basename, master_key_dict, calib_dict, \
+                _cache_stats(pypeIt)
+
+
+def _reset_cache_stats(pypeIt):
+    """
+    Reset the statistics of the calibration and raw-file caches
+    inherited by a worker process.
+    """
+    if not parallel.in_worker():
+        return
+    if pypeIt.caliBrate.cache is not None:
+        pypeIt.caliBrate.cache.reset_stats()
+    io.raw_file_cache.reset_stats()
+
+
+def _cache_stats(pypeIt):
+    """
+    Return the statistics of the calibration and raw-file caches to
+    be merged by the calling process; None if the task was not
+    executed by a worker process.
+    """
+    if not parallel.in_worker():
+        return None
+    return None if pypeIt.caliBrate.cache is None else pypeIt.caliBrate.cache.stats, \
+                io.raw_file_cache.stats
+
+
+def calibrate_detector(frame, det):
+    """
+    Build the calibrations of one detector with the :class:`PypeIt`
+    object shared by :func:`pypeit.parallel.run_graph`.
+
+    Args:
+        frame (:obj:`int`):
+            Frame index in the metadata table used to select the
+            calibrations.
+        det (:obj:`int`):
+            1-indexed detector.
+
+    Returns:
+        tuple: The calibration data built for this detector, keyed by
+        master key as in
+        :attr:`pypeit.calibrations.Calibrations.calib_dict`, and the
+        statistics of the caches.
+    """
+    pypeIt = parallel.get_shared('pypeit')
+    _reset_cache_stats(pypeIt)
+    msgs.info("Building calibrations for detector {0}".format(det))
+    pypeIt.caliBrate.set_config(frame, det, pypeIt.par['calibrations'])
+    pypeIt.caliBrate.run_the_steps()
+    return dict([(key, pypeIt.caliBrate.calib_dict[key])
+                    for key in set(pypeIt.caliBrate.master_key_dict.values())
+                        if key in pypeIt.caliBrate.calib_dict]), _cache_stats(pypeIt)
+
+
+def reduce_and_save(frames, bg_frames, standard_frames):
+    """
+    Reduce and save one exposure with the :class:`PypeIt` object
+    shared by :func:`pypeit.parallel.run_graph`.
+
+    Args:
+        frames (:obj:`list`):
+            Frames to combine and reduce.
+        bg_frames (:obj:`list`):
+            Frames to use for the background.
+        standard_frames (:obj:`list`):
+            Standard star frames passed to
+            :func:`PypeIt.get_std_outfile`.  Can be None.
+
+    Returns:
+        tuple: The root name of the output files and the statistics of
+        the caches.
+    """
+    pypeIt = parallel.get_shared('pypeit')
+    _reset_cache_stats(pypeIt)
+    std_outfile = None if standard_frames is None \
+                        else pypeIt.get_std_outfile(standard_frames)
+    sci_dict = pypeIt.reduce_exposure(frames, bg_frames=bg_frames, std_outfile=std_outfile)
+    # TODO come up with sensible naming convention for save_exposure for combined files
+    pypeIt.save_exposure(frames[0], sci_dict, pypeIt.basename)
+    return pypeIt.basename, _cache_stats(pypeIt)
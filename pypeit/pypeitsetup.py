@@ -247,7 +247,7 @@ class PypeItSetup(object):
     def __repr__(self):
         return '<{:s}: nfiles={:d}>'.format(self.__class__.__name__, self.nfiles)
 
-    def build_fitstbl(self, strict=True):
+    def build_fitstbl(self, strict=True, index_file=None):
         """
         Construct the table with metadata for the frames to reduce.
 
@@ -259,6 +259,11 @@ class PypeItSetup(object):
                 read the headers of any of the files in
                 :attr:`file_list`.  Set to False to only report a
                 warning and continue.
+            index_file (:obj:`str`, optional):
+                Persistent index with the metadata of previously read
+                files, used to avoid reading the headers of files that
+                have not changed; see
+                :class:`pypeit.metaindex.MetadataIndex`.
 
         Returns:
             :obj:`astropy.table.Table`: Table with the metadata for each
@@ -267,7 +272,8 @@ class PypeItSetup(object):
         """
         # Build and sort the table
         self.fitstbl = PypeItMetaData(self.spectrograph, par=self.par, files=self.file_list,
-                                      usrdata=self.usrdata, strict=strict)
+                                      usrdata=self.usrdata, strict=strict,
+                                      index_file=index_file)
         # Sort by the time
         if 'time' in self.fitstbl.keys():
             self.fitstbl.sort('time')
@@ -355,7 +361,7 @@ class PypeItSetup(object):
                            format=format, overwrite=True)
 
     def run(self, setup_only=False, calibration_check=False,
-            use_header_id=False, sort_dir=None, write_bkg_pairs=False):
+            use_header_id=False, sort_dir=None, write_bkg_pairs=False, index_file=None):
         """
         Once instantiated, this is the main method used to construct the
         object.
@@ -396,6 +402,9 @@ class PypeItSetup(object):
                 the metadata table (:attr:`fitstbl`).
             sort_dir (:obj:`str`, optional):
                 The directory to put the '.sorted' file.
+            index_file (:obj:`str`, optional):
+                Persistent index with the metadata of previously read
+                files; see :func:`build_fitstbl`.
 
         Returns:
             :class:`pypeit.par.pypeitpar.PypeItPar`,
@@ -411,7 +420,7 @@ class PypeItSetup(object):
 
         # Build fitstbl
         if self.fitstbl is None:
-            self.build_fitstbl(strict=not setup_only)#, bkg_pairs=bkg_pairs)
+            self.build_fitstbl(strict=not setup_only, index_file=index_file)#, bkg_pairs=bkg_pairs)
 
         # File typing
         self.get_frame_types(flag_unknown=setup_only or calibration_check,
@@ -5,7 +5,7 @@ import numpy as np
 from astropy import stats
 from abc import ABCMeta
 
-from pypeit import ginga, utils, msgs, specobjs
+from pypeit import ginga, utils, msgs, specobjs, parallel
 from pypeit.core import skysub, extract, trace_slits, pixels, wave
 from pypeit.core import procimg
 from pypeit.images import scienceimage
@@ -278,23 +278,22 @@ class Reduce(object):
 
         # Mask objects using the skymask? If skymask has been set by objfinding, and masking is requested, then do so
         skymask_now = skymask if (skymask is not None) else np.ones_like(self.sciImg.image, dtype=bool)
+        # The slits are independent, so they can be fit in parallel.
+        # Plotting the fits requires them to be done serially.
+        nproc = 1 if show_fit else self.redux_par['nproc']
+        shared = dict(image=self.sciImg.image, ivar=self.sciImg.ivar, tilts=self.tilts,
+                      slitmask=self.slitmask, mask=self.sciImg.mask, skymask=skymask_now)
+        kwargs = dict(sigrej=sigrej, bsp=self.redux_par['bspline_spacing'],
+                      no_poly=self.redux_par['no_poly'], pos_mask=(not self.ir_redux),
+                      show_fit=show_fit)
+        args = [(slit, self.tslits_dict['slit_left'][:,slit], self.tslits_dict['slit_righ'][:,slit],
+                 kwargs) for slit in gdslits]
         # Loop on slits
-        for slit in gdslits:
-            msgs.info("Global sky subtraction for slit: {:d}".format(slit))
+        sky_slits = parallel.map_tasks(global_skysub_slit, args, nproc=nproc, shared=shared)
+        # Merge in slit order
+        for slit, sky_slit in zip(gdslits, sky_slits):
             thismask = (self.slitmask == slit)
-            inmask = (self.sciImg.mask == 0) & thismask & skymask_now
-            # Find sky
-            self.global_sky[thismask] = skysub.global_skysub(self.sciImg.image,
-                                                             self.sciImg.ivar,
-                                                             self.tilts, thismask,
-                                                             self.tslits_dict['slit_left'][:,slit],
-                                                             self.tslits_dict['slit_righ'][:,slit],
-                                                             inmask=inmask,
-                                                             sigrej=sigrej,
-                                                             bsp=self.redux_par['bspline_spacing'],
-                                                             no_poly=self.redux_par['no_poly'],
-                                                             pos_mask = (not self.ir_redux),
-                                                             show_fit=show_fit)
+            self.global_sky[thismask] = sky_slit
             # Mask if something went wrong
             if np.sum(self.global_sky[thismask]) == 0.:
                 self.maskslits[slit] = True
@@ -675,7 +674,8 @@ class MultiSlit(Reduce):
                     box_rad=self.redux_par['boxcar_radius']/self.spectrograph.detector[self.det-1]['platescale'],
                     sigrej=self.redux_par['sky_sigrej'],
                     model_noise=model_noise, std=std, bsp=self.redux_par['bspline_spacing'],
-                    sn_gauss=self.redux_par['sn_gauss'], inmask=inmask, show_profile=show_profile)
+                    sn_gauss=self.redux_par['sn_gauss'], inmask=inmask, show_profile=show_profile,
+                    nproc=self.redux_par['nproc'])
 
         # Set the bit for pixels which were masked by the extraction.
         # For extractmask, True = Good, False = Bad
@@ -777,7 +777,8 @@ class Echelle(Reduce):
             box_rad_order=self.redux_par['boxcar_radius']/plate_scale,
             sigrej=self.redux_par['sky_sigrej'],
             sn_gauss=self.redux_par['sn_gauss'], model_full_slit=self.redux_par['model_full_slit'],
-            model_noise=model_noise, show_profile=show_profile, show_resids=show_resids, show_fwhm=show_fwhm)
+            model_noise=model_noise, show_profile=show_profile, show_resids=show_resids, show_fwhm=show_fwhm,
+            nproc=self.redux_par['nproc'])
 
 
         # Step
@@ -791,6 +792,36 @@ class Echelle(Reduce):
 
 
 
+def global_skysub_slit(slit, slit_left, slit_righ, kwargs):
+    """
+    Perform the global sky subtraction for a single slit.
+
+    This is the task distributed by :func:`Reduce.global_skysub`.  The
+    images are retrieved with :func:`pypeit.parallel.get_shared`.
+
+    Args:
+        slit (:obj:`int`):
+            Index of the slit in the slit mask image.
+        slit_left (`numpy.ndarray`_):
+            Left edge of the slit.
+        slit_righ (`numpy.ndarray`_):
+            Right edge of the slit.
+        kwargs (:obj:`dict`):
+            Keyword arguments passed to
+            :func:`pypeit.core.skysub.global_skysub`.
+
+    Returns:
+        `numpy.ndarray`_: Sky model at the pixels in the slit.
+    """
+    msgs.info("Global sky subtraction for slit: {:d}".format(slit))
+    thismask = (parallel.get_shared('slitmask') == slit)
+    inmask = (parallel.get_shared('mask') == 0) & thismask & parallel.get_shared('skymask')
+    # Find sky
+    return skysub.global_skysub(parallel.get_shared('image'), parallel.get_shared('ivar'),
+                                parallel.get_shared('tilts'), thismask, slit_left, slit_righ,
+                                inmask=inmask, **kwargs)
+
+
 def instantiate_me(sciImg, spectrograph, tslits_dict, par, tilts, **kwargs):
     """
     Instantiate the Reduce subclass appropriate for the provided
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+#
+# See top-level LICENSE file for Copyright information
+#
+# -*- coding: utf-8 -*-
+"""
+This script builds the KD trees of ThAr line patterns used to
+wavelength calibrate ThAr arcs with the holy-grail method
+"""
+
+
+def parser(options=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--polygon', type=int, nargs='+', default=[3, 4, 5, 6],
+                        help='Number of lines in each pattern')
+    parser.add_argument('--numsearch', type=int, nargs='+', default=[10],
+                        help='Number of consecutive lines used to generate a pattern')
+    parser.add_argument('-o', '--overwrite', default=False, action='store_true',
+                        help='Rebuild the trees that are already up to date')
+
+    if options is None:
+        args = parser.parse_args()
+    else:
+        args = parser.parse_args(options)
+    return args
+
+
+def main(args):
+    from pypeit import msgs
+    from pypeit.core.wavecal import waveio, kdtree_generator
+
+    for polygon in args.polygon:
+        for numsearch in args.numsearch:
+            root = waveio.tree_root(polygon, numsearch)
+            if not args.overwrite and waveio.tree_meta(root) is not None:
+                msgs.info('KD tree {0:s} is up to date'.format(root))
+                continue
+            msgs.info('Building KD tree for polygon={0:d}, numsearch={1:d}'.format(polygon,
+                                                                                  numsearch))
+            kdtree_generator.main(polygon, numsearch=numsearch, verbose=True, outname=root)
@@ -44,8 +44,9 @@ def parser(options=None):
 
 #    parser.add_argument('-q', '--quick', default=False, help='Quick reduction',
 #                        action='store_true')
-#    parser.add_argument('-c', '--cpus', default=False, action='store_true',
-#                         help='Number of CPUs for parallel processing')
+    parser.add_argument('-n', '--ncpu', default=1, type=int,
+                        help='Number of processes used to reduce the detectors of each exposure '
+                             'in parallel.  Ignored if --show is used.')
 #    parser.print_help()
 
     if options is None:
@@ -69,7 +70,6 @@ def main(args):
     # These messages will not be saved to a log file
     # Set the default variables
     qck = False
-    cpu = 1
     #vrb = 2
 
     # Load options from command line
@@ -81,7 +81,7 @@ def main(args):
     # Instantiate the main pipeline reduction object
     pypeIt = pypeit.PypeIt(args.pypeit_file, verbosity=args.verbosity,
                            reuse_masters=args.use_masters, overwrite=args.overwrite,
-                           logname=logname, show=args.show)
+                           logname=logname, show=args.show, ncpu=args.ncpu)
 
     # JFH I don't see why this is an optional argument here. We could allow the user to modify an infinite number of parameters
     # from the command line? Why do we have the PypeIt file then? This detector can be set in the pypeit file.
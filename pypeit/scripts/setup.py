@@ -31,6 +31,13 @@ def parser(options=None):
                         help='Generate the PypeIt files and folders by input configuration. [all or A,B or B,D,E or E]')
     parser.add_argument('-b', '--background', default=False, action='store_true',
                         help='Include the background-pair columns for the user to edit')
+    parser.add_argument('-i', '--index', default=None, type=str,
+                        help='Index with the metadata of previously read files, used to only '
+                             'read the headers of new or changed files.  Default is '
+                             'setup_files/metadata_index.db in the output directory.')
+    parser.add_argument('--no_index', default=False, action='store_true',
+                        help='Read the headers of all files, without using or updating the '
+                             'metadata index')
     parser.add_argument('-v', '--verbosity', type=int, default=2,
                         help='Level of verbosity from 0 to 2; default is 2.')
 #    parser.add_argument('-q', '--quick', default=False, help='Quick reduction',
@@ -74,8 +81,14 @@ def main(args):
         # Should never reach here
         raise IOError('Need to set -r !!')
 
+    # Index with the metadata of previously read files
+    index_file = None if args.no_index else \
+                    (os.path.join(sort_dir, 'metadata_index.db') if args.index is None
+                        else args.index)
+
     # Run the setup
-    ps.run(setup_only=True, sort_dir=sort_dir, write_bkg_pairs=args.background)
+    ps.run(setup_only=True, sort_dir=sort_dir, write_bkg_pairs=args.background,
+           index_file=index_file)
 
     # Use PypeItMetaData to write the complete PypeIt file
     if args.cfg_split is not None:
@@ -6,6 +6,7 @@ import numpy as np
 from astropy.io import fits
 
 from pypeit import msgs
+from pypeit import io
 from pypeit.spectrographs import spectrograph
 from ..par.pypeitpar import DetectorPar
 from pypeit.par.pypeitpar import CalibrationsPar
@@ -296,9 +297,8 @@ class GeminiGMOSSSpectrograph(GeminiGMOSSpectrograph):
 
             # TODO: Fix this
             # Get the binning
-            hdu = fits.open(filename)
+            hdu = io.raw_file_cache.open(filename)
             binning = hdu[1].header['CCDSUM']
-            hdu.close()
 
             # Apply the mask
             xbin = int(binning.split(' ')[0])
@@ -308,9 +308,8 @@ class GeminiGMOSSSpectrograph(GeminiGMOSSpectrograph):
             msgs.info("Using hard-coded BPM for det=2 on GMOSs")
 
             # Get the binning
-            hdu = fits.open(filename)
+            hdu = io.raw_file_cache.open(filename)
             binning = hdu[1].header['CCDSUM']
-            hdu.close()
 
             # Apply the mask
             xbin = int(binning.split(' ')[0])
@@ -326,9 +325,8 @@ class GeminiGMOSSSpectrograph(GeminiGMOSSpectrograph):
             msgs.info("Using hard-coded BPM for det=2 on GMOSs")
 
             # Get the binning
-            hdu = fits.open(filename)
+            hdu = io.raw_file_cache.open(filename)
             binning = hdu[1].header['CCDSUM']
-            hdu.close()
 
             # Apply the mask
             xbin = int(binning.split(' ')[0])
@@ -572,7 +570,7 @@ def read_gmos(raw_file, det=1):
 
     # Read
     msgs.info("Reading GMOS file: {:s}".format(fil[0]))
-    hdu = fits.open(fil[0])
+    hdu = io.raw_file_cache.open(fil[0])
     head0 = hdu[0].header
     head1 = hdu[1].header
 
@@ -684,7 +682,7 @@ def gemini_read_amp(inp, ext):
     """
     # Parse input
     if isinstance(inp, str):
-        hdu = fits.open(inp)
+        hdu = io.raw_file_cache.open(inp)
     else:
         hdu = inp
 
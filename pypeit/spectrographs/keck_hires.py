@@ -11,6 +11,7 @@ from scipy import interpolate
 from astropy.io import fits
 
 from pypeit import msgs
+from pypeit import io
 from pypeit import telescopes
 from pypeit.core import parse
 from pypeit.core import framematch
@@ -464,7 +465,7 @@ def read_hires(raw_file, det=None):
     except AttributeError:
         print("Reading HIRES file: {:s}".format(fil[0]))
 
-    hdu = fits.open(fil[0])
+    hdu = io.raw_file_cache.open(fil[0])
     head0 = hdu[0].header
 
     # Get post, pre-pix values
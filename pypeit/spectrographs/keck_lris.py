@@ -8,6 +8,7 @@ from astropy.io import fits
 from pkg_resources import resource_filename
 
 from pypeit import msgs
+from pypeit import io
 from pypeit import telescopes
 from pypeit.core import parse
 from pypeit.core import framematch
@@ -644,9 +645,8 @@ class KeckLRISRSpectrograph(KeckLRISSpectrograph):
             msgs.info("Using hard-coded BPM for det=2 on LRISr")
 
             # Get the binning
-            hdu = fits.open(filename)
+            hdu = io.raw_file_cache.open(filename)
             binning = hdu[0].header['BINNING']
-            hdu.close()
 
             # Apply the mask
             xbin = int(binning.split(',')[0])
@@ -725,7 +725,7 @@ class KeckLRISRLSpectrograph(KeckLRISRSpectrograph):
 
         """
         # Open
-        hdu = fits.open(raw_file)
+        hdu = io.raw_file_cache.open(raw_file)
         # Grab data (this includes flips as needed)
         data, predata, postdata, x1, y1 = lris_read_amp(hdu, det)
         # Pack
@@ -739,7 +739,7 @@ class KeckLRISRLSpectrograph(KeckLRISRSpectrograph):
 
     def get_image_section(self, inp=None, det=1, section='datasec'):
         # Inp better be a string here!  Could check
-        hdu = fits.open(inp)
+        hdu = io.raw_file_cache.open(inp)
         head0 = hdu[0].header
         binning = head0['BINNING']
         xbin, ybin = [int(ibin) for ibin in binning.split(',')]
@@ -794,7 +794,7 @@ def read_lris(raw_file, det=None, TRIM=False):
 
     # Read
     msgs.info("Reading LRIS file: {:s}".format(fil[0]))
-    hdu = fits.open(fil[0])
+    hdu = io.raw_file_cache.open(fil[0])
     head0 = hdu[0].header
 
     # Get post, pre-pix values
@@ -980,7 +980,7 @@ def lris_read_amp(inp, ext):
     """
     # Parse input
     if isinstance(inp, str):
-        hdu = fits.open(inp)
+        hdu = io.raw_file_cache.open(inp)
     else:
         hdu = inp
 
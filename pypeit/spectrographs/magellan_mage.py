@@ -6,6 +6,7 @@ from astropy.time import Time
 from astropy.io import fits
 
 from pypeit import msgs
+from pypeit import io
 from pypeit import telescopes
 from pypeit.core import framematch
 from pypeit.core import parse
@@ -204,9 +205,8 @@ class MagellanMAGESpectrograph(spectrograph.Spectrograph):
         msgs.info("Custom bad pixel mask for MAGE")
         self.empty_bpm(shape=shape, filename=filename, det=det)
         # Get the binning
-        hdu = fits.open(filename)
+        hdu = io.raw_file_cache.open(filename)
         binspatial, binspec = parse.parse_binning(hdu[0].header['BINNING'])
-        hdu.close()
         # Do it
         self.bpm_img[:, :10//binspatial] = 1.
         self.bpm_img[:, 1020//binspatial:] = 1.
@@ -10,6 +10,7 @@ from scipy import interpolate
 from astropy.io import fits
 
 from pypeit import msgs
+from pypeit import io
 from pypeit import telescopes
 from pypeit.core import parse
 from pypeit.core import framematch
@@ -515,7 +516,7 @@ class MMTBINOSPECSpectrograph(spectrograph.Spectrograph):
         return self.bpm_img
 
     def get_slitmask(self, filename):
-        hdu = fits.open(filename)
+        hdu = io.raw_file_cache.open(filename)
         corners = np.array([hdu['BluSlits'].data['slitX1'],
                             hdu['BluSlits'].data['slitY1'],
                             hdu['BluSlits'].data['slitX2'],
@@ -532,7 +533,7 @@ class MMTBINOSPECSpectrograph(spectrograph.Spectrograph):
         Taken from xidl/DEEP2/spec2d/pro/deimos_omodel.pro and
         xidl/DEEP2/spec2d/pro/deimos_grating.pro
         """
-        hdu = fits.open(filename)
+        hdu = io.raw_file_cache.open(filename)
 
         # Grating slider
         slider = hdu[0].header['GRATEPOS']
@@ -875,7 +876,7 @@ def read_deimos(raw_file, det=None):
     except AttributeError:
         print("Reading DEIMOS file: {:s}".format(fil[0]))
 
-    hdu = fits.open(fil[0])
+    hdu = io.raw_file_cache.open(fil[0])
     head0 = hdu[0].header
 
     # Get post, pre-pix values
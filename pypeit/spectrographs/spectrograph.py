@@ -39,6 +39,7 @@ from astropy.io import fits
 from linetools.spectra import xspectrum1d
 
 from pypeit import msgs
+from pypeit import io
 from pypeit.core.wavecal import wvutils
 from pypeit.core import parse
 from pypeit.core import procimg
@@ -206,7 +207,7 @@ class Spectrograph(object):
         # Check the detector is defined
         self._check_detector()
 
-        hdu = fits.open(raw_file)
+        hdu = io.raw_file_cache.open(raw_file)
         raw_img = hdu[self.detector[det-1]['dataext']].data
         '''
         # Load the raw image
@@ -310,7 +311,7 @@ class Spectrograph(object):
                 # Force the call to the except block
                 raise KeyError
             elif isinstance(inp, str):
-                hdu = fits.open(inp)
+                hdu = io.raw_file_cache.open(inp)
                 hdr = hdu[self.detector[det-1]['dataext']].header
             elif isinstance(inp, fits.Header):
                 hdr = inp
@@ -660,8 +661,34 @@ class Spectrograph(object):
 
     # TODO: Change this so that it uses one argument for ifile or
     # headarray? ala, get_image_section, etc?
+    def get_meta_cards(self, headarr):
+        """
+        Construct the lookup table with the values of all the meta data
+        read directly from a header card.
+
+        Each card is searched for only once, instead of once per call to
+        :func:`get_meta_value`.
+
+        Args:
+            headarr (:obj:`list`):
+                List of headers of the file; see :func:`get_headarr`.
+
+        Returns:
+            dict: The raw header value of each meta key with a card;
+            None if the card is missing.
+        """
+        cards = {}
+        for meta_key, meta in self.meta.items():
+            if meta['card'] is None:
+                continue
+            try:
+                cards[meta_key] = headarr[meta['ext']][meta['card']]
+            except (KeyError, TypeError, IndexError):
+                cards[meta_key] = None
+        return cards
+
     def get_meta_value(self, ifile, meta_key, headarr=None, required=False, ignore_bad_header=False,
-                       usr_row=None):
+                       usr_row=None, cards=None):
         """
         Return meta data from a given file (or its array of headers)
 
@@ -677,6 +704,9 @@ class Spectrograph(object):
               Over-ride required;  not recommended
             usr_row: Row
               Provides user supplied frametype (and other things not used)
+            cards: dict, optional
+              Lookup table with the header values of the meta data for
+              this file, as returned by :func:`get_meta_cards`.
 
         Returns:
             value: value or list of values
@@ -710,6 +740,8 @@ class Spectrograph(object):
                 value = self.compound_meta(headarr, meta_key)
             else:
                 msgs.error("Failed to load spectrograph value for meta: {}".format(meta_key))
+        elif cards is not None:
+            value = cards[meta_key]
         else:
             # Grab from the header, if we can
             try:
@@ -793,10 +825,11 @@ class Spectrograph(object):
             list: Returns a list of :attr:`numhead` :obj:`fits.Header`
             objects with the extension headers.
         """
-        # Faster to open the whole file and then assign the headers,
-        # particularly for gzipped files (e.g., DEIMOS)
+        # Only read the header blocks; the data, and the headers beyond
+        # numhead, are skipped (without being decompressed for gzipped
+        # files)
         try:
-            hdu = fits.open(filename)
+            headarr = io.read_fits_headers(filename, nhead=self.numhead)
         except:
             if strict:
                 msgs.error('Problem opening {0}.'.format(filename))
@@ -804,7 +837,12 @@ class Spectrograph(object):
                 msgs.warn('Problem opening {0}.'.format(filename) + msgs.newline()
                           + 'Proceeding, but should consider removing this file!')
                 return ['None']*self.numhead
-        return [ hdu[k].header for k in range(self.numhead) ]
+        if any([h.get('ZIMAGE', False) for h in headarr]):
+            # Tile-compressed images need astropy to get the image
+            # headers
+            with fits.open(filename) as hdu:
+                headarr = [ hdu[k].header for k in range(self.numhead) ]
+        return headarr
 
 #    def get_match_criteria(self):
 #        msgs.error("You need match criteria for your spectrograph.")
@@ -5,11 +5,18 @@ import os
 import numpy as np
 import pytest
 
+from scipy.spatial import cKDTree
+
+from astropy.table import Table
+
+import linetools.utils
+
 from linetools.spectra import xspectrum1d
 
 import pypeit
 from pypeit import metadata
 from pypeit.core import arc
+from pypeit.core.wavecal import wvutils
 
 from pypeit.spectrographs.util import load_spectrograph
 
@@ -25,3 +32,62 @@ def test_detect_lines():
 
 # Many more functions in pypeit.core.arc that need tests!
 
+
+def test_xcorr_shift_stretch():
+    # Shift and stretch an archived arc spectrum
+    arxiv_file = pkg_resources.resource_filename('pypeit',
+                                                 'data/arc_lines/reid_arxiv/shane_kast_blue_600.fits')
+    spec = np.asarray(Table.read(arxiv_file)['flux'], dtype=float).ravel()
+    nspec = spec.size
+    shift, stretch = 25.3, 1.013
+    x = np.arange(nspec)
+    spec_ss = wvutils.cubic_resample(spec, (x - shift)/stretch)
+    success, _shift, _stretch, corr, _, _ = wvutils.xcorr_shift_stretch(spec_ss, spec)
+    assert success == 1
+    # Normalized by the untransformed spectrum, so less than unity
+    assert corr > 0.9
+    # Lines match to better than a pixel along the whole spectrum
+    assert np.all(np.absolute(np.array([0, nspec-1])*(_stretch - stretch) + _shift - shift) < 1.)
+
+
+def test_patterns():
+    from pypeit.core.wavecal import patterns
+    rng = np.random.RandomState(1)
+    linelist = np.sort(rng.uniform(4000., 6000., 40))
+    # Detections with a linear dispersion
+    detlines = (linelist[5:25] - 4500.)/1.5 + rng.normal(scale=0.1, size=20)
+    dindex, lindex, wvcen, disps = patterns.triangles(detlines, linelist, 1024., 5, 5, 0.5)
+    # Compare against a brute force search
+    matches = []
+    for d, xd, dd in patterns.pattern_indices(detlines.size, 3, 5):
+        dval = (detlines[xd]-detlines[d])/(detlines[dd]-detlines[d])
+        for l in range(linelist.size-2):
+            for ll in range(l+2, min(l+5, linelist.size)):
+                for xl in range(l+1, ll):
+                    lval = (linelist[xl]-linelist[l])/(linelist[ll]-linelist[l])
+                    if np.absolute(lval-dval) <= 0.5/(detlines[dd]-detlines[d]):
+                        matches += [[d, xd, dd, l, xl, ll]]
+    assert np.array_equal(np.hstack((dindex, lindex)), np.array(matches))
+    # The true solution is among the matches
+    indx = np.all(lindex == dindex + 5, axis=1)
+    assert np.any(indx)
+    assert np.absolute(np.median(disps[indx]) - 1.5) < 0.01
+    # The linelist patterns are memoized
+    assert patterns.linelist_patterns(linelist, 3, 5) is patterns.linelist_patterns(linelist.copy(), 3, 5)
+
+
+def test_kdtree_store(tmpdir):
+    from pypeit.core.wavecal import kdtree_generator, waveio
+    root = str(tmpdir.join('ThAr_patterns'))
+    tree, index = kdtree_generator.main(3, numsearch=4, ret_treeindx=True, outname=root)
+    _tree, _index = waveio.read_tree(root)
+    assert np.array_equal(index, _index)
+    # The restored tree gives the same matches
+    rng = np.random.RandomState(1)
+    dettree = cKDTree(rng.uniform(size=(100, 1)), leafsize=30)
+    assert dettree.query_ball_tree(tree, r=1e-3) == dettree.query_ball_tree(_tree, r=1e-3)
+    # A tree saved with an older format is ignored
+    meta = linetools.utils.loadjson(root + '.json')
+    linetools.utils.savejson(root + '.json', dict(meta, version=0), overwrite=True)
+    assert waveio.tree_meta(root) is None
+    assert waveio.read_tree(root)[0] is None
@@ -0,0 +1,127 @@
+"""
+Module to run tests on the persistent calibration cache
+"""
+import os
+import time
+import pickle
+
+import numpy as np
+
+from pypeit import calibcache
+from pypeit import parallel
+from pypeit.par import pypeitpar
+
+
+def test_key(tmpdir):
+    cache = calibcache.CalibrationCache(str(tmpdir))
+    raw = str(tmpdir.join('raw.fits'))
+    with open(raw, 'w') as f:
+        f.write('data')
+    par = pypeitpar.FrameGroupPar(frametype='bias')
+    key = cache.key('bias', files=[raw], par=par, det=1)
+    assert key == cache.key('bias', files=[raw], par=par, det=1)
+    # Any change in the inputs changes the key
+    assert key != cache.key('bias', files=[raw], par=par, det=2)
+    assert key != cache.key('bias', files=[raw], par=pypeitpar.FrameGroupPar(frametype='bias',
+                                                                              number=2), det=1)
+    assert key != cache.key('bias', files=[raw], par=par, depends=['abc'], det=1)
+    assert key != cache.key('bias', files=[raw], par=par, data=np.zeros(3), det=1)
+    # Except for the parameters that do not change the product
+    _par = pypeitpar.FrameGroupPar(frametype='bias',
+                                   process=pypeitpar.ProcessImagesPar(nproc=4, combine_block=16,
+                                                                      scratch_dir=str(tmpdir),
+                                                                      stack_dtype='float32',
+                                                                      lathreads=2))
+    assert key == cache.key('bias', files=[raw], par=_par, det=1)
+    assert cache.key('bias', files=[raw], par=[par, pypeitpar.WavelengthSolutionPar(nproc=4)]) \
+                == cache.key('bias', files=[raw], par=[par, pypeitpar.WavelengthSolutionPar()])
+    with open(raw, 'w') as f:
+        f.write('new data')
+    assert key != cache.key('bias', files=[raw], par=par, det=1)
+
+
+def test_save_load(tmpdir):
+    cache = calibcache.CalibrationCache(str(tmpdir))
+    data = (np.arange(10.), {'maskslits': np.zeros(2, dtype=bool)})
+    key = cache.key('trace', det=1)
+    assert cache.load('trace', key) is None
+    cache.save(key, data)
+    _data = cache.load('trace', key)
+    assert np.array_equal(_data[0], data[0])
+    assert np.array_equal(_data[1]['maskslits'], data[1]['maskslits'])
+    assert cache.stats['trace'] == [1, 1]
+
+    # Statistics from another process
+    cache.add_stats({'trace': [2, 0], 'arc': [0, 1]})
+    assert cache.stats['trace'] == [3, 1]
+    assert cache.stats['arc'] == [0, 1]
+
+
+def test_evict(tmpdir):
+    # Budget for about two of the arrays
+    cache = calibcache.CalibrationCache(str(tmpdir), max_size=2.5*8e4/1024**3)
+    keys = [cache.key('arc', det=i) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.save(key, (np.full(10000, i, dtype=float),))
+        time.sleep(0.01)
+    # Use the first, such that the second is the least recently used
+    os.utime(cache.file_name(keys[1]), (0, 0))
+    assert cache.load('arc', keys[0]) is not None
+    cache.save(keys[2], (np.zeros(10000),))
+    assert os.path.isfile(cache.file_name(keys[0]))
+    assert not os.path.isfile(cache.file_name(keys[1]))
+    assert os.path.isfile(cache.file_name(keys[2]))
+
+
+def test_calibration_dict():
+    # Memory for about two of the master keys
+    calib_dict = calibcache.CalibrationDict(max_size=2.5*8e4/1024**3)
+    for i in range(3):
+        key = 'A_{0}_01'.format(i)
+        # Filled as done by Calibrations
+        calib_dict[key] = {}
+        calib_dict[key]['arc'] = np.full(10000, i, dtype=float)
+    # The first has been moved to disk
+    stats = calib_dict.stats()
+    assert stats['in_memory'] == 2 and stats['on_disk'] == 1 and stats['spilled'] == 1
+    assert calib_dict.nbytes == 2*8e4
+    assert list(calib_dict.keys()) == ['A_1_01', 'A_2_01', 'A_0_01']
+    # and is read back when needed, moving the least recently used
+    # to disk instead
+    assert 'A_0_01' in calib_dict
+    assert np.all(calib_dict['A_0_01']['arc'] == 0)
+    stats = calib_dict.stats()
+    assert stats['reloaded'] == 1 and stats['spilled'] == 2
+    assert 'A_1_01' in calib_dict._spilled
+    assert calib_dict.peak_nbytes <= 3*8e4
+
+    # Entries are pickled as plain dictionaries
+    entry = pickle.loads(pickle.dumps(calib_dict['A_2_01']))
+    assert type(entry) is dict and np.all(entry['arc'] == 2)
+
+    # Move everything to disk
+    calib_dict.spill_all()
+    assert calib_dict.stats()['in_memory'] == 0 and calib_dict.nbytes == 0
+    assert np.all(calib_dict['A_1_01']['arc'] == 1)
+
+
+def _sum_arc(key):
+    return np.sum(parallel.get_shared('calib_dict')[key]['arc'])
+
+
+def test_calibration_dict_workers():
+    # Memory for a single master key
+    calib_dict = calibcache.CalibrationDict(max_size=1.5*8e4/1024**3)
+    for i, key in enumerate(['A', 'B', 'C']):
+        calib_dict[key] = {'arc': np.full(10000, i+1, dtype=float)}
+    assert 'A' in calib_dict._spilled and 'B' in calib_dict._spilled
+    spill_file = calib_dict._spilled['A']
+    # Read the spilled entry by two forked workers, and then by the
+    # calling process
+    sums = parallel.map_tasks(_sum_arc, ['A', 'A', 'B'], nproc=2,
+                              shared={'calib_dict': calib_dict})
+    assert sums == [1e4, 1e4, 2e4]
+    assert os.path.isfile(spill_file)
+    assert np.all(calib_dict['A']['arc'] == 1)
+    assert not os.path.isfile(spill_file)
+    assert np.all(calib_dict['B']['arc'] == 2)
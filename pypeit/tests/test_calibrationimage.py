@@ -49,3 +49,16 @@ def test_combine(deimos_flat_files):
     assert deimos_flats.image.shape == (4096,2048)
 
 
+
+def test_build_image_nproc():
+    from pypeit.tests.tstutils import data_path
+    files = [data_path('b1.fits.gz'), data_path('b27.fits.gz'), data_path('b1.fits.gz')]
+    images = []
+    for nproc in [1, 2]:
+        calib = calibrationimage.CalibrationImage(kast_blue, 1,
+                                                  pypeitpar.ProcessImagesPar(nproc=nproc),
+                                                  files=files)
+        calib.process_steps = procimg.init_process_steps(None, calib.proc_par) \
+                                    + ['trim', 'orient', 'apply_gain']
+        images += [calib.build_image()]
+    assert np.array_equal(images[0], images[1]), 'Parallel processing changed the result'
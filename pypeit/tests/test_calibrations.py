@@ -9,6 +9,7 @@ import glob
 import shutil
 
 import numpy as np
+from astropy.io import fits
 
 from pypeit import calibrations
 from pypeit.par import pypeitpar
@@ -103,6 +104,144 @@ def test_bpm(multi_caliBrate):
     assert np.sum(bpm) == 0.
 
 
+def test_cache(fitstbl, tmpdir):
+    spectrograph = load_spectrograph('shane_kast_blue')
+    par = pypeitpar.PypeItPar()['calibrations']
+    par['badpix'] = False
+    par['biasframe']['useframe'] = 'none' # Only use overscan
+    par['cachedir'] = str(tmpdir)
+    arc = []
+    for i in range(2):
+        # Fresh calibrations, as for a new run of PypeIt
+        caliBrate = reset_calib(calibrations.MultiSlitCalibrations(fitstbl, par, spectrograph))
+        caliBrate.shape = (2048,350)
+        caliBrate.get_bpm()
+        caliBrate.get_bias()
+        arc += [caliBrate.get_arc()]
+    # The second arc is read from the cache
+    assert caliBrate.cache.stats['arc'] == [1, 0]
+    assert np.array_equal(arc[0], arc[1])
+
+
+def test_cache_masters(fitstbl, tmpdir):
+    spectrograph = load_spectrograph('shane_kast_blue')
+    par = pypeitpar.PypeItPar()['calibrations']
+    par['badpix'] = False
+    par['biasframe']['useframe'] = 'none' # Only use overscan
+    par['cachedir'] = str(tmpdir.join('cache'))
+
+    def get_arc(reuse_masters=False):
+        caliBrate = reset_calib(calibrations.MultiSlitCalibrations(
+                                    fitstbl, par, spectrograph, caldir=str(tmpdir.join('Masters')),
+                                    reuse_masters=reuse_masters))
+        caliBrate.shape = (2048,350)
+        caliBrate.get_bpm()
+        caliBrate.get_bias()
+        return caliBrate, caliBrate.get_arc()
+
+    caliBrate, arc = get_arc()
+    master_file = caliBrate.arcImage.file_path
+    assert os.path.isfile(master_file)
+    # The Master is written when the arc is read from the cache
+    os.remove(master_file)
+    caliBrate, cached_arc = get_arc()
+    assert caliBrate.cache.stats['arc'] == [1, 0]
+    assert np.array_equal(arc, cached_arc)
+    assert os.path.isfile(master_file)
+    # A Master edited by hand is reused instead of the cached arc
+    with fits.open(master_file, mode='update') as hdu:
+        hdu['ARC'].data[...] = 0.
+    caliBrate, arc = get_arc(reuse_masters=True)
+    assert 'arc' not in caliBrate.cache.stats
+    assert np.all(arc == 0.)
+
+
+class _Master(object):
+    """Stand-in for the MasterFrame objects, recording the saves."""
+    def __init__(self, *args, master_key=None, **kwargs):
+        self.master_key = master_key
+        self.saved = False
+
+    def load(self):
+        return None
+
+    def save(self, **kwargs):
+        self.saved = True
+
+
+class _TraceSlits(_Master):
+    """Stand-in for TraceSlits."""
+    def load(self):
+        return None, None
+
+
+class _FlatField(object):
+    """Stand-in for FlatField that returns unity flats."""
+    def __init__(self, spectrograph, par, tslits_dict=None, tilts_dict=None, **kwargs):
+        self.tslits_dict = tslits_dict
+        self.tilts_dict = tilts_dict
+        self.rawflatimg = None
+
+    def load(self):
+        return None, None, None
+
+    def run(self, **kwargs):
+        return np.ones((2048,350)), np.ones((2048,350))
+
+    def save(self):
+        pass
+
+
+def test_cache_flat_miss(fitstbl, tmpdir, monkeypatch):
+    # Slits and tilts read from the cache, but not the flat
+    spectrograph = load_spectrograph('shane_kast_blue')
+    par = pypeitpar.PypeItPar()['calibrations']
+    par['badpix'] = False
+    par['biasframe']['useframe'] = 'none' # Only use overscan
+    par['cachedir'] = str(tmpdir.join('cache'))
+    caliBrate = calibrations.MultiSlitCalibrations(fitstbl, par, spectrograph,
+                                                   caldir=str(tmpdir.join('Masters')))
+    # Objects left over from another detector
+    caliBrate.traceSlits = _Master(master_key='A_1_02')
+    caliBrate.waveTilts = _Master(master_key='A_1_02')
+    reset_calib(caliBrate)
+    assert caliBrate.traceSlits is None and caliBrate.waveTilts is None
+
+    caliBrate.shape = (2048,350)
+    caliBrate.get_bpm()
+    caliBrate.get_bias()
+    caliBrate.get_arc()
+    caliBrate.wv_calib = {}
+    caliBrate.cache_keys['wavecalib'] = 'wavecalib'
+    cached = {'trace': (dict(maskslits=np.zeros(1, dtype=bool)), None),
+              'tilts': (dict(tilts=np.zeros((2048,350))), np.zeros(1, dtype=bool))}
+    monkeypatch.setattr(caliBrate, '_load_cache', lambda master_type: cached.get(master_type))
+    monkeypatch.setattr(calibrations.traceslits, 'TraceSlits', _TraceSlits)
+    monkeypatch.setattr(calibrations.wavetilts, 'WaveTilts', _Master)
+    monkeypatch.setattr(calibrations.flatfield, 'FlatField', _FlatField)
+    caliBrate.get_slits()
+    caliBrate.get_tilts()
+
+    # The masters of another detector are not overwritten
+    caliBrate.traceSlits = _Master(master_key='A_1_02')
+    caliBrate.waveTilts = _Master(master_key='A_1_02')
+    pixelflat, illumflat = caliBrate.get_flats()
+    assert np.all(pixelflat == 1.)
+    assert not caliBrate.traceSlits.saved and not caliBrate.waveTilts.saved
+
+    # Nor is a missing master
+    caliBrate.traceSlits = None
+    caliBrate.calib_dict.clear()
+    caliBrate.get_flats()
+
+    # The masters of this detector are updated
+    caliBrate.traceSlits = _Master(master_key=caliBrate.master_key_dict['trace'])
+    caliBrate.waveTilts = _Master(master_key=caliBrate.master_key_dict['arc'])
+    caliBrate.calib_dict.clear()
+    caliBrate.get_flats()
+    assert caliBrate.traceSlits.saved and caliBrate.waveTilts.saved
+
+
 @dev_suite_required
 def test_slits(multi_caliBrate):
     # Setup
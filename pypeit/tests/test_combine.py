@@ -0,0 +1,41 @@
+"""
+Module to run tests on core.combine functions.
+"""
+import pytest
+import numpy as np
+
+from pypeit.core import combine
+from pypeit.core import coadd2d
+
+def test_comb_frames_blocks():
+    rng = np.random.RandomState(1)
+    frames = rng.normal(1000., 30., (60,40,5))
+    frames[rng.uniform(size=frames.shape) < 0.01] += 1e5
+    frames[5,5,:] = 7e4
+    for method in ['mean', 'median', 'weightmean']:
+        kwargs = dict(saturation=65000., cosmics=20., method=method)
+        stack = combine.comb_frames(frames.copy(), **kwargs)
+        assert stack[5,5] == 65000., 'Saturated pixel should be replaced'
+        # The combination does not depend on the size of the blocks or
+        # the input format
+        blocks = combine.comb_frames([frames[:,:,i] for i in range(frames.shape[2])],
+                                     block_size=0.03, **kwargs)
+        assert np.array_equal(stack, blocks), 'Block combination changed the result'
+
+
+def test_weighted_combine_blocks():
+    rng = np.random.RandomState(1)
+    sci = rng.normal(1000., 30., (5,60,40)).astype(np.float32)
+    sci[2,10,5] += 1e5
+    var = rng.uniform(900., 1100., sci.shape).astype(np.float32)
+    mask = rng.uniform(size=sci.shape) > 0.01
+    for weights in [np.full(5, 0.2), rng.uniform(0.5, 1., (5,60))]:
+        stack = coadd2d.weighted_combine(weights, [sci], [var], mask, sigma_clip=True,
+                                         sigma_clip_stack=sci)
+        # The cosmic ray is rejected
+        assert np.absolute(stack[0][0][10,5] - 1000.) < 100.
+        # The combination does not depend on the size of the blocks
+        blocks = coadd2d.weighted_combine(weights, [sci], [var], mask, sigma_clip=True,
+                                          sigma_clip_stack=sci, block_size=0.01)
+        for a, b in zip(stack[0]+stack[1]+list(stack[2:]), blocks[0]+blocks[1]+list(blocks[2:])):
+            assert np.array_equal(a, b), 'Block combination changed the result'
@@ -0,0 +1,57 @@
+"""
+Module to run tests on core.extract functions.
+"""
+import pytest
+import numpy as np
+
+from pypeit.core import extract
+from pypeit.core import trace_slits
+
+def test_asymbox2():
+    rng = np.random.RandomState(1)
+    image = rng.normal(100., 10., (50,30))
+    left = np.full((50,2), 3.2)
+    left[:,1] = 10.7
+    right = left + np.array([4.1, 30.])
+    right[0] = left[0] - 1.
+    flux = extract.extract_asymbox2(image, left, right)
+    assert flux.shape == left.shape, 'Incorrect output shape'
+    # Fractional pixels at the edges of the window
+    assert np.allclose(flux[1:,0], 0.3*image[1:,3] + image[1:,4:7].sum(axis=1) + 0.8*image[1:,7]), \
+            'Incorrect boxcar extraction'
+    # Window clipped by the edge of the image
+    assert np.allclose(flux[1:,1], 0.8*image[1:,11] + image[1:,12:].sum(axis=1)), \
+            'Incorrect extraction at the edge of the image'
+    assert np.all(flux[0] == 0), 'Empty windows should have no flux'
+    # Weighted extraction of a uniform weight is the mean in the window
+    weighted = extract.extract_asymbox2(image, left[:,0], right[:,0],
+                                        weight_image=np.full(image.shape, 2.))
+    assert np.allclose(weighted[1:], flux[1:,0]/4.1), 'Incorrect weighted extraction'
+
+
+def test_boxcar_multi():
+    rng = np.random.RandomState(2)
+    images = [rng.normal(100., 10., (50,30)), rng.uniform(size=(50,30)) > 0.5]
+    trace = np.stack([np.linspace(5., 8., 50), np.linspace(20.3, 28.9, 50)], axis=1)
+    box = extract.extract_boxcar_multi(images, trace, 2.5)
+    assert box.shape == (2,) + trace.shape, 'Incorrect output shape'
+    for i in range(len(images)):
+        for j in range(trace.shape[1]):
+            assert np.allclose(box[i,:,j], extract.extract_boxcar(images[i].astype(float),
+                                                                   trace[:,j], 2.5)), \
+                    'Multi-image extraction does not match single extraction'
+
+
+def test_fweight():
+    # Symmetric profiles centered on the initial guesses
+    x = np.arange(40)
+    profile = np.exp(-0.5*(x-12.)**2/1.5**2) + np.exp(-0.5*(x-26.)**2/1.5**2)
+    image = np.tile(profile, (30,1))
+    xinit = np.tile([12., 26.], (30,1))
+    for invvar in [None, np.ones_like(image)]:
+        xfit, xerr = trace_slits.trace_fweight(image, xinit, radius=3., invvar=invvar)
+        assert xfit.shape == xinit.shape, 'Incorrect output shape'
+        assert np.allclose(xfit, xinit), 'Bad centroid'
+        assert np.all(xerr < 999), 'Centroids should be good'
+        xfit, xerr = trace_slits.trace_gweight(image, xinit, sigma=1.5, invvar=invvar)
+        assert np.allclose(xfit, xinit), 'Bad centroid'
@@ -3,11 +3,14 @@ Module to run loading images for different images served using the
 ProcessImages class
 """
 import os
+import shutil
 
 import pytest
 import glob
 import numpy as np
 
+from astropy.io import fits
+
 from pypeit.images.calibrationimage import CalibrationImage
 from pypeit.tests.tstutils import dev_suite_required
 from pypeit.par import pypeitpar
@@ -187,3 +190,24 @@ def test_load_isis():
         pytest.fail('WHT ISIS test data section failed.')
 '''
 
+
+def test_raw_file_cache(tmpdir):
+    from pypeit import io
+    from pypeit.tests.tstutils import data_path
+    ifile = str(tmpdir.join('b1.fits.gz'))
+    shutil.copy(data_path('b1.fits.gz'), ifile)
+    cache = io.HDUListCache()
+    spec = load_spectrograph('shane_kast_blue')
+    img, hdu = spec.load_raw_frame(ifile)
+    assert np.array_equal(img, fits.getdata(ifile).astype(float)), 'Bad image'
+    # Reopening returns the same HDUList until the file changes
+    assert cache.open(ifile) is cache.open(ifile), 'File should be cached'
+    assert cache.stats == [1, 1], 'Bad statistics'
+    hdu = cache.open(ifile)
+    stat = os.stat(ifile)
+    os.utime(ifile, (stat.st_atime, stat.st_mtime+10))
+    assert cache.open(ifile) is not hdu, 'File should be reread'
+    # Files are dropped beyond the maximum size
+    cache = io.HDUListCache(max_size=0)
+    cache.open(ifile)
+    assert cache.nbytes == 0, 'Should not keep any files'
@@ -12,6 +12,64 @@ from pypeit.tests.tstutils import dev_suite_required, data_path
 from pypeit.metadata import PypeItMetaData
 from pypeit.spectrographs.util import load_spectrograph
 from pypeit.scripts import setup
+from pypeit import io
+
+def test_read_headers():
+    # Compare the header-only read to astropy
+    from astropy.io import fits
+    ifile = data_path('b1.fits.gz')
+    with fits.open(ifile) as hdu:
+        headers = [h.header for h in hdu]
+    _headers = io.read_fits_headers(ifile)
+    assert len(_headers) == len(headers)
+    assert all([h.tostring() == _h.tostring() for h, _h in zip(headers, _headers)])
+    with pytest.raises(OSError):
+        io.read_fits_headers(ifile, nhead=len(headers)+1)
+
+
+def test_threaded_build():
+    spectrograph = load_spectrograph('shane_kast_blue')
+    files = [data_path('b1.fits.gz'), data_path('b27.fits.gz')]
+    par = spectrograph.default_pypeit_par()
+    par['rdx']['header_threads'] = 1
+    serial = PypeItMetaData(spectrograph, par, files=files, strict=False)
+    par['rdx']['header_threads'] = 2
+    threaded = PypeItMetaData(spectrograph, par, files=files, strict=False)
+    for key in serial.keys():
+        assert np.all(serial[key] == threaded[key]), 'Different {0}'.format(key)
+
+def test_index(tmpdir, monkeypatch):
+    spectrograph = load_spectrograph('shane_kast_blue')
+    files = []
+    for f in ['b1.fits.gz', 'b27.fits.gz']:
+        files += [str(tmpdir.join(f))]
+        shutil.copy(data_path(f), files[-1])
+    par = spectrograph.default_pypeit_par()
+    # A key without a value in the headers
+    monkeypatch.setitem(spectrograph.meta, 'dichroic', dict(ext=0, card='NOCARD'))
+    index_file = str(tmpdir.join('index.db'))
+    fitstbl = PypeItMetaData(spectrograph, par, files=files, strict=False, index_file=index_file)
+    assert np.all(fitstbl['dichroic'] == None)
+
+    # Rebuild without reading any headers
+    read = []
+    get_headarr = spectrograph.get_headarr
+    def _get_headarr(inp, strict=True):
+        read.append(inp)
+        return get_headarr(inp, strict=strict)
+    monkeypatch.setattr(spectrograph, 'get_headarr', _get_headarr)
+    _fitstbl = PypeItMetaData(spectrograph, par, files=files, strict=False, index_file=index_file)
+    assert len(read) == 0, 'Should not read any headers'
+    for key in fitstbl.keys():
+        assert np.all(fitstbl[key] == _fitstbl[key]), 'Different {0}'.format(key)
+
+    # Only the changed file is read
+    stat = os.stat(files[1])
+    os.utime(files[1], (stat.st_atime, stat.st_mtime+10))
+    _fitstbl = PypeItMetaData(spectrograph, par, files=files, strict=False, index_file=index_file)
+    assert read == [files[1]], 'Should only read the changed file'
+    for key in fitstbl.keys():
+        assert np.all(fitstbl[key] == _fitstbl[key]), 'Different {0}'.format(key)
 
 def test_read_combid():
 
@@ -0,0 +1,168 @@
+"""
+Module to run tests on the parallel processing utilities
+"""
+import time
+from collections import OrderedDict
+
+import pytest
+import numpy as np
+
+from pypeit import parallel
+from pypeit.pypmsgs import PypeItError
+from pypeit import reduce
+from pypeit import specobjs
+from pypeit.core import skysub
+
+
+def _sum_row(row):
+    return np.sum(parallel.get_shared('image')[row])
+
+
+def test_map_tasks():
+    image = np.arange(20.).reshape(4, 5)
+    serial = parallel.map_tasks(_sum_row, range(4), nproc=1, shared={'image': image})
+    pool = parallel.map_tasks(_sum_row, range(4), nproc=2, shared={'image': image})
+    assert np.array_equal(serial, np.sum(image, axis=1))
+    assert np.array_equal(serial, pool)
+
+
+def test_task_pool():
+    image = np.arange(20.).reshape(4, 5)
+    with parallel.TaskPool(nproc=2, shared={'image': image}) as pool:
+        assert np.array_equal(pool.map(_sum_row, range(4)), np.sum(image, axis=1))
+        # The same workers see the new values
+        pool.update(image=2*image)
+        assert np.array_equal(pool.map(_sum_row, range(4)), 2*np.sum(image, axis=1))
+        assert pool.map(_sum_row, [1]) == [70.]
+        with pytest.raises(PypeItError):
+            pool.update(image=np.zeros(3))
+    # Serial
+    pool = parallel.TaskPool(nproc=1, shared={'image': image})
+    pool.update(image=3*image)
+    assert np.array_equal(pool.map(_sum_row, range(4)), 3*np.sum(image, axis=1))
+    pool.close()
+
+
+def test_global_skysub_slits():
+    # Fake image with three vertical slits of sky lines
+    nspec, nspat = 200, 90
+    rng = np.random.RandomState(42)
+    # Slightly tilted lines so that the pixels sample the sky finely
+    piximg = np.arange(nspec, dtype=float)[:, None] + 0.05*(np.arange(nspat)[None, :] - nspat/2)
+    sky = 100. + 500.*np.exp(-0.5*((piximg-60.)/2.)**2) + 300.*np.exp(-0.5*((piximg-140.)/2.)**2)
+    image = sky + rng.normal(scale=3., size=(nspec, nspat))
+    ivar = np.full(image.shape, 1/9.)
+    tilts = piximg/(nspec-1)
+    slitmask = np.full(image.shape, -1, dtype=int)
+    left = np.array([2., 32., 62.])
+    righ = left + 26.
+    for slit in range(left.size):
+        slitmask[:, int(left[slit]):int(righ[slit])+1] = slit
+
+    shared = dict(image=image, ivar=ivar, tilts=tilts, slitmask=slitmask,
+                  mask=np.zeros(image.shape, dtype=int), skymask=np.ones(image.shape, dtype=bool))
+    kwargs = dict(sigrej=3., bsp=0.6, no_poly=True, pos_mask=True, show_fit=False)
+    args = [(slit, np.full(nspec, left[slit]), np.full(nspec, righ[slit]), kwargs)
+                for slit in range(left.size)]
+    serial = parallel.map_tasks(reduce.global_skysub_slit, args, nproc=1, shared=shared)
+    pool = parallel.map_tasks(reduce.global_skysub_slit, args, nproc=3, shared=shared)
+    for slit in range(left.size):
+        assert np.array_equal(serial[slit], pool[slit])
+        assert np.allclose(serial[slit], sky[slitmask == slit], atol=10.)
+
+
+def test_local_skysub_objects():
+    # Fake slit with three neighboring objects on top of the sky
+    nspec, nspat = 200, 60
+    rng = np.random.RandomState(3)
+    piximg = np.arange(nspec, dtype=float)[:, None] + 0.05*(np.arange(nspat)[None, :] - nspat/2)
+    sky = 100. + 500.*np.exp(-0.5*((piximg % 80 - 40.)/2.)**2)
+    spat = np.arange(nspat)[None, :]*np.ones((nspec, 1))
+    cens = [15., 30., 45.]
+    obj = np.sum([300.*np.exp(-0.5*((spat-c)/1.5)**2) for c in cens], axis=0)
+    var = sky + obj + 9.
+    image = sky + obj + rng.normal(size=sky.shape)*np.sqrt(var)
+    thismask = np.zeros((nspec, nspat), dtype=bool)
+    thismask[:, 2:58] = True
+
+    out = []
+    for nproc in [1, 2]:
+        sobjs = specobjs.SpecObjs()
+        for i, c in enumerate(cens):
+            sobj = specobjs.SpecObj((nspec, nspat), 0.5, 0.5, slitid=0, objtype='science',
+                                    pypeline='MultiSlit', spat_pixpos=c)
+            sobj.trace_spat = np.full(nspec, c)
+            sobj.trace_spec = np.arange(nspec)
+            sobj.fwhm = 3.5
+            sobj.maskwidth = 8.
+            sobj.objid = i
+            sobjs.add_sobj(sobj)
+        skymodel, objmodel, ivarmodel, outmask \
+                = skysub.local_skysub_extract(image, 1/var, piximg/(nspec-1), 4000. + piximg, sky,
+                                              np.full(sky.shape, 9.), thismask, np.full(nspec, 2.),
+                                              np.full(nspec, 57.), sobjs, nproc=nproc)
+        out.append((skymodel, objmodel, [sobj.optimal['COUNTS'] for sobj in sobjs]))
+
+    assert np.array_equal(out[0][0], out[1][0])
+    assert np.array_equal(out[0][1], out[1][1])
+    assert np.array_equal(out[0][2], out[1][2])
+
+
+class _Scale(object):
+    def __init__(self, factor):
+        self.factor = factor
+
+
+def _scaled_sum_row(row):
+    return parallel.get_shared('scale').factor * _sum_row(row)
+
+
+def _nested_sum(rows):
+    # Executed serially within a worker process
+    return parallel.map_tasks(_sum_row, rows, nproc=2)
+
+
+def test_map_tasks_objects():
+    image = np.arange(20.).reshape(4, 5)
+    shared = {'image': image, 'scale': _Scale(2.)}
+    pool = parallel.map_tasks(_scaled_sum_row, range(4), nproc=2, shared=shared)
+    assert np.array_equal(pool, 2*np.sum(image, axis=1))
+    nested = parallel.map_tasks(_nested_sum, [[0, 1], [2, 3]], nproc=2, shared=shared)
+    assert np.array_equal(np.concatenate(nested), np.sum(image, axis=1))
+
+
+def _wait(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_iter_tasks_stop():
+    # Stopping the iteration cancels the tasks still running
+    start = time.time()
+    for seconds in parallel.iter_tasks(_wait, [0., 0., 30., 30.], nproc=2):
+        if seconds == 0.:
+            break
+    assert time.time() - start < 10.
+
+
+def _add(a, b):
+    return a + b
+
+
+def test_graph_levels():
+    depends = {'a': [], 'b': ['a'], 'c': [], 'd': ['b', 'c']}
+    assert parallel.graph_levels(depends) == [['a', 'c'], ['b'], ['d']]
+    with pytest.raises(PypeItError):
+        parallel.graph_levels({'a': ['b'], 'b': ['a']})
+    with pytest.raises(PypeItError):
+        parallel.graph_levels({'a': ['x']})
+
+
+def test_run_graph():
+    tasks = OrderedDict([('a', (_add, (1, 2), [])), ('b', (_add, (3, 4), [])),
+                         ('c', (_sum_row, (1,), ['a', 'b']))])
+    merged = []
+    results = parallel.run_graph(tasks, nproc=2, shared={'image': np.ones((2, 3))},
+                                 merge=lambda name, r: merged.append(name))
+    assert results == {'a': 3, 'b': 7, 'c': 3.}
+    assert merged == ['a', 'b', 'c']
@@ -29,3 +29,22 @@ def test_replace_columns():
                           np.repeat(np.arange(4),10).reshape(4,10).T), \
                 'Interpolation failed.'
 
+
+
+def test_lacosmic():
+    rng = np.random.RandomState(3)
+    img = rng.normal(100., 10., (300,200))
+    x, y = rng.randint(2, 198, 50), rng.randint(2, 298, 50)
+    img[y,x] += 2000.
+    crmask = procimg.lacosmic(1, img, 65535., 0.9)
+    assert np.all(crmask[y,x]), 'Did not find all cosmic rays'
+    assert np.sum(crmask) < 50*21, 'Grown mask too large'
+    # Threads do not change the result
+    assert np.array_equal(crmask, procimg.lacosmic(1, img, 65535., 0.9, nthreads=3)), \
+            'Threads changed the result'
+    # Growth of the mask, including at the edge of the image
+    mask = np.zeros((7,7), dtype=float)
+    assert not np.any(procimg.grow_masked(mask, 1.5, 1.)), 'Should not grow an empty mask'
+    mask[0,3] = mask[3,3] = 1.
+    grown = procimg.grow_masked(mask, 1.5, 1.)
+    assert np.sum(grown) == 6 + 9, 'Incorrect growth'
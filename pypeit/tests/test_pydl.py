@@ -3,7 +3,7 @@ Module to run tests on pyidl functions
 """
 
 import numpy as np
-from pypeit.core.pydl import bspline
+from pypeit.core.pydl import bspline, bspline_basis, bspline_band_system, cholesky_band, iterfit
 import pytest
 
 try:
@@ -28,3 +28,131 @@ def test_bsplinetodict():
 
     assert np.max(np.array(bspline_dict['breakpoints'])-bspline_fromdict.breakpoints) == 0.
 
+
+
+def test_band_system():
+    """ Test that the vectorized assembly of the b-spline normal
+    equations matches the loop over breakpoints.
+    """
+    rng = np.random.RandomState(1234)
+    x = np.sort(rng.uniform(size=2000))
+    y = np.sin(10*x) + rng.normal(scale=0.1, size=x.size)
+    invvar = np.full(x.size, 100.)
+    for npoly in [1, 3]:
+        sset = bspline(x, bkspace=0.01, npoly=npoly)
+        bf1, lower, upper = sset.action(x)
+        action = np.repeat(bf1, npoly, axis=1) * rng.uniform(1, 2, size=(x.size, npoly*sset.nord))
+        nfull = sset.mask[sset.nord:].sum() * npoly
+        a2 = action * np.sqrt(invvar)[:, None]
+        alpha0, beta0 = bspline_band_system(a2, a2, y*np.sqrt(invvar), lower, upper, npoly, nfull,
+                                            vectorized=False)
+        alpha1, beta1 = bspline_band_system(a2, a2, y*np.sqrt(invvar), lower, upper, npoly, nfull)
+        assert np.allclose(alpha0, alpha1, rtol=1e-12, atol=0.)
+        assert np.allclose(beta0, beta1, rtol=1e-12, atol=1e-12*np.abs(beta0).max())
+
+    # Full fit
+    sset = bspline(x, bkspace=0.01)
+    sset_loop = sset.copy()
+    bf1, lower, upper = sset.action(x)
+    err, yfit = sset.workit(x, y, invvar, bf1, lower, upper)
+    err_loop, yfit_loop = sset_loop.workit(x, y, invvar, bf1, lower, upper, vectorized=False)
+    assert err == 0 and err_loop == 0
+    assert np.allclose(sset.coeff, sset_loop.coeff, rtol=1e-10)
+
+
+def test_workit_system():
+    """ Test that updating the saved normal equations for changed
+    weights matches assembling them from scratch.
+    """
+    rng = np.random.RandomState(1234)
+    x = np.sort(rng.uniform(size=2000))
+    y = np.sin(10*x) + rng.normal(scale=0.1, size=x.size)
+    invvar = np.full(x.size, 100.)
+    sset = bspline(x, bkspace=0.01, npoly=2)
+    bf1, lower, upper = sset.action(x)
+    action = np.repeat(bf1, 2, axis=1) * rng.uniform(1, 2, size=(x.size, 2*sset.nord))
+    system = {}
+    sset.workit(x, y, invvar, action, lower, upper, system=system)
+    # Reject and restore a few points
+    invvar[rng.randint(x.size, size=50)] = 0.
+    _invvar = invvar.copy()
+    _invvar[rng.randint(x.size, size=20)] = 50.
+    for ivar in [invvar, _invvar]:
+        _sset = sset.copy()
+        err, yfit = sset.workit(x, y, ivar, action, lower, upper, system=system)
+        _err, _yfit = _sset.workit(x, y, ivar, action, lower, upper)
+        assert err == 0 and _err == 0
+        assert np.allclose(sset.coeff, _sset.coeff, rtol=1e-10)
+        assert np.allclose(yfit, _yfit, rtol=1e-10)
+
+
+def test_iterfit_incremental():
+    """ Test that the incremental rejection iterations of iterfit
+    match refitting from scratch.
+    """
+    rng = np.random.RandomState(1234)
+    x = rng.uniform(size=5000)
+    y = np.sin(10*x) + rng.normal(scale=0.1, size=x.size)
+    y[rng.randint(x.size, size=100)] += 2.
+    invvar = np.full(x.size, 100.)
+    sset, outmask = iterfit(x, y, invvar=invvar, upper=3, lower=3, kwargs_bspline={'bkspace':0.01})
+    _sset, _outmask = iterfit(x, y, invvar=invvar, upper=3, lower=3,
+                              kwargs_bspline={'bkspace':0.01}, incremental=False)
+    assert np.sum(np.invert(outmask)) >= 100, 'Should reject the outliers'
+    assert np.array_equal(outmask, _outmask)
+    assert np.allclose(sset.coeff, _sset.coeff, rtol=1e-10)
+
+
+def test_bspline_basis():
+    """ Test that the cached basis gives the same fits and evaluations
+    and follows changes of the breakpoint mask.
+    """
+    rng = np.random.RandomState(1234)
+    x = rng.uniform(size=5000)
+    y = np.sin(10*x) + rng.normal(scale=0.1, size=x.size)
+    invvar = np.full(x.size, 100.)
+    basis = bspline_basis(x)
+    sset, outmask = iterfit(x, y, invvar=invvar, kwargs_bspline={'bkspace':0.01})
+    _sset, _outmask = iterfit(x, y, invvar=invvar, kwargs_bspline={'bkspace':0.01}, basis=basis)
+    assert np.array_equal(outmask, _outmask)
+    assert np.array_equal(sset.coeff, _sset.coeff)
+    assert np.array_equal(sset.value(x)[0], _sset.value(x, basis=basis)[0])
+
+    # Masking breakpoints recomputes the basis
+    sset.mask[20:22] = False
+    assert np.array_equal(sset.value(x)[0], sset.value(x, basis=basis)[0])
+    assert np.array_equal(basis.bkpt, sset.breakpoints[sset.mask])
+
+    # The basis must be for the evaluated positions
+    with pytest.raises(ValueError):
+        sset.value(x[::-1], basis=basis)
+
+
+def test_cholesky_lapack():
+    """ Test that the LAPACK banded Cholesky factorization and solver
+    match the python implementation, including the error return.
+    """
+    rng = np.random.RandomState(1234)
+    x = np.sort(rng.uniform(size=2000))
+    y = np.sin(10*x) + rng.normal(scale=0.1, size=x.size)
+    invvar = np.full(x.size, 100.)
+
+    # Identical coefficients from workit
+    sset = bspline(x, bkspace=0.01)
+    sset_py = sset.copy()
+    bf1, lower, upper = sset.action(x)
+    err, yfit = sset.workit(x, y, invvar, bf1, lower, upper)
+    err_py, yfit_py = sset_py.workit(x, y, invvar, bf1, lower, upper, use_lapack=False)
+    assert err == 0 and err_py == 0
+    assert np.allclose(sset.coeff, sset_py.coeff, rtol=1e-10)
+    assert np.allclose(sset.icoeff, sset_py.icoeff, rtol=1e-10)
+    assert np.allclose(yfit, yfit_py, rtol=1e-10)
+
+    # Matrix that is not positive definite: the failing row is returned
+    alpha = np.zeros((4, 14))
+    alpha[0, :10] = 1.
+    alpha[1, :9] = 2.
+    assert cholesky_band(alpha)[0] == cholesky_band(alpha, use_lapack=False)[0] == 1
+    # Negative diagonal: all bad rows are returned
+    alpha[0, 3:5] = -1.
+    assert np.array_equal(cholesky_band(alpha)[0], [3, 4])
@@ -11,6 +11,7 @@ from pypeit import msgs
 from pypeit.par.util import make_pypeit_file
 from pypeit import pypeitsetup
 from pypeit.pypeit import PypeIt
+from pypeit.tests.tstutils import dummy_fitstbl
 
 def data_path(filename):
     data_dir = os.path.join(os.path.dirname(__file__), 'files')
@@ -61,3 +62,33 @@ def test_select_detectors():
     assert np.array_equal(PypeIt.select_detectors(detnum=[1,3]), [1,3]), \
             'Incorrect detectors selected.'
 
+
+def test_reduction_batches(tmpdir):
+    # Two calibration groups, with the standard in the second
+    fitstbl = dummy_fitstbl()
+    fitstbl['calib'] = ['0,1']*4 + ['1', '0', '0', '1', '1', '0']
+    fitstbl._set_calib_group_bits()
+    fitstbl.set_combination_groups()
+    pypeIt = PypeIt.__new__(PypeIt)
+    pypeIt.fitstbl = fitstbl
+    pypeIt.spectrograph = fitstbl.spectrograph
+    pypeIt.par = pypeIt.spectrograph.default_pypeit_par()
+    pypeIt.par['rdx']['redux_path'] = str(tmpdir)
+    pypeIt.overwrite = True
+
+    # The group of the standard is reduced first, and the groups are
+    # reduced one at a time by a single process
+    assert pypeIt.calib_group_batches(nproc=1) == [[1], [0]]
+    assert pypeIt.calib_group_batches(nproc=2) == [[1, 0]]
+
+    done = set()
+    tasks = pypeIt.reduction_graph(groups=[1], skip=done)
+    assert list(tasks.keys()) == [('calib', 1, 1), ('standard', 1), ('science', 4),
+                                  ('science', 5)]
+    assert tasks[('science', 4)][2] == [('calib', 1, 1), ('standard', 1)]
+    done.update(tasks.keys())
+    # The standard of the first batch is not a dependency of the second
+    tasks = pypeIt.reduction_graph(groups=[0], skip=done)
+    assert list(tasks.keys()) == [('calib', 0, 1), ('science', 2), ('science', 3),
+                                  ('science', 6)]
+    assert tasks[('science', 2)][2] == [('calib', 0, 1)]
@@ -40,3 +40,13 @@ def test_calc_ivar():
     res = utils.inverse(x, positive=True)
     assert np.array_equal(res, np.array([0.0, 0.0, 0.0, 10.0, 1.0]))
     assert np.array_equal(utils.calc_ivar(res), np.array([0.0, 0.0, 0.0, 0.1, 1.0]))
+
+
+def test_scratch_array(tmpdir):
+    arr = utils.scratch_array((3,10,5), dtype=np.float32, scratch_dir=str(tmpdir))
+    assert isinstance(arr, np.memmap), 'Should be memory-mapped'
+    assert arr.dtype == np.float32 and np.all(arr == 0), 'Bad allocation'
+    arr[1] = 2.
+    assert np.sum(arr) == 100., 'Bad assignment'
+    assert len(tmpdir.listdir()) == 0, 'Scratch file should not be visible'
+    assert not isinstance(utils.scratch_array((3,10,5)), np.memmap), 'Should be in memory'
@@ -258,3 +258,40 @@ def test_wavecalib_general():
         assert grade
 
 '''
+
+
+def test_reidentify_prepared():
+    # Reidentify an arxiv order against the others with and without
+    # preparing the arxiv spectra beforehand
+    from pypeit.core.wavecal import autoid, waveio, wvutils
+    arxiv = Table.read(os.path.join(waveio.reid_arxiv_path, 'vlt_xshooter_vis1x1.fits'))
+    spec_arxiv = np.asarray(arxiv['flux'][:3], dtype=float).T
+    wave_arxiv = np.asarray(arxiv['wave'][:3], dtype=float).T
+    x = np.arange(spec_arxiv.shape[0])
+    spec = wvutils.cubic_resample(spec_arxiv[:,1], (x - 10.2)/1.002)
+    line_list = waveio.load_line_lists(['ThAr'])
+    det, spec_cont_sub, patt_dict = autoid.reidentify(spec, spec_arxiv, wave_arxiv, line_list, 1)
+    _det, _spec_cont_sub, _patt_dict \
+            = autoid.reidentify(spec, spec_arxiv, wave_arxiv, line_list, 1,
+                                det_arxiv=autoid.detect_arxiv(spec_arxiv),
+                                xcorr_arxiv=autoid.xcorr_prep(spec_arxiv))
+    assert patt_dict['acceptable']
+    assert np.array_equal(det, _det)
+    assert np.array_equal(patt_dict['IDs'], _patt_dict['IDs'])
+
+
+def test_holy_grail_nproc():
+    # Calibrate two shifted Kast arcs serially and in parallel
+    from pypeit.core.wavecal import autoid, waveio, wvutils
+    from pypeit.par import pypeitpar
+    arxiv = Table.read(os.path.join(waveio.reid_arxiv_path, 'shane_kast_blue_600.fits'))
+    spec = np.asarray(arxiv['flux'], dtype=float).ravel()
+    spec = np.stack((spec, wvutils.cubic_resample(spec, np.arange(spec.size) - 15.3)), axis=1)
+    par = pypeitpar.WavelengthSolutionPar(lamps=['CdI', 'HgI', 'HeI'], nonlinear_counts=1e10)
+    all_patt_dict, all_final_fit = autoid.HolyGrail(spec, par=par).get_results()
+    par['nproc'] = 2
+    _all_patt_dict, _all_final_fit = autoid.HolyGrail(spec, par=par).get_results()
+    for slit in ['0', '1']:
+        assert all_final_fit[slit]['rms'] < par['rms_threshold']
+        assert np.array_equal(all_patt_dict[slit]['IDs'], _all_patt_dict[slit]['IDs'])
+        assert np.array_equal(all_final_fit[slit]['fitc'], _all_final_fit[slit]['fitc'])
@@ -5,6 +5,7 @@ General utility functions.
 """
 import os
 import warnings
+import tempfile
 import itertools
 import matplotlib
 
@@ -288,7 +289,7 @@ def bspline_fit(x,y,order=3,knots=None,everyn=20,xmin=None,xmax=None,w=None,bksp
 # and make them explicit
 def bspline_profile(xdata, ydata, invvar, profile_basis, inmask = None, upper=5, lower=5,
                     maxiter=25, nord = 4, bkpt=None, fullbkpt=None,
-                    relative=None, kwargs_bspline={}, kwargs_reject={}):
+                    relative=None, kwargs_bspline={}, kwargs_reject={}, basis=None):
     """
     Create a B-spline in the least squares sense with rejection, using a model profile
 
@@ -322,6 +323,9 @@ def bspline_profile(xdata, ydata, invvar, profile_basis, inmask = None, upper=5,
        Passed to bspline
      kwargs_reject : dict
        Passed to djs_reject
+     basis : :class:`pypeit.core.pydl.bspline_basis`, optional
+       Cached b-spline basis at xdata, to share it with other fits or evaluations at the
+       same positions
 
      Returns
      -------
@@ -390,9 +394,15 @@ def bspline_profile(xdata, ydata, invvar, profile_basis, inmask = None, upper=5,
             exit_status = 4
             return sset, outmask, yfit, reduced_chi, exit_status
 
-    # This was checked in detail against IDL for identical inputs
-    outer = (np.outer(np.ones(nord, dtype=float), profile_basis.flatten('F'))).T
-    action_multiple = outer.reshape((nx, npoly * nord), order='F')
+    # The profile-augmented action matrix only holds the nord*npoly
+    # non-zero elements of each row of the design matrix: column
+    # k*npoly + ipoly is the product of the k-th b-spline in the
+    # breakpoint interval of the data point and the ipoly-th profile.
+    # The normal equations are saved between rejection iterations, so
+    # that only the contributions of newly rejected points are
+    # recomputed; see pydl.bspline.workit.
+    profile_basis = profile_basis.reshape((nx, npoly), order='F')
+    system = {}
     #--------------------
     # Iterate spline fit
     iiter = 0
@@ -416,16 +426,16 @@ def bspline_profile(xdata, ydata, invvar, profile_basis, inmask = None, upper=5,
 
             # we'll do the fit right here..............
             if error != 0:
-                bf1, laction, uaction = sset.action(xdata)
+                bf1, laction, uaction = sset.action(xdata, basis=basis)
                 if np.any(bf1 == -2) or (bf1.size !=nx*nord):
                     msgs.error("BSPLINE_ACTION failed!")
-                action = np.copy(action_multiple)
-                for ipoly in range(npoly):
-                    action[:, np.arange(nord)*npoly + ipoly] *= bf1
+                action = (bf1[:,:,None] * profile_basis[:,None,:]).reshape(nx, nord*npoly)
                 del bf1 # Clear the memory
+                system.clear()
             if np.sum(np.isfinite(action) is False) > 0:
                 msgs.error("Infinities in action matrix, wavelengths may be very messed up!!!")
-            error, yfit = sset.workit(xdata, ydata, invvar*maskwork,action, laction, uaction)
+            error, yfit = sset.workit(xdata, ydata, invvar*maskwork,action, laction, uaction,
+                                      system=system)
         iiter += 1
         if error == -2:
             msgs.warn(" All break points have been dropped!! Fit failed, I hope you know what you are doing")
@@ -510,6 +520,36 @@ def calc_ivar(varframe):
 
 
 
+def scratch_array(shape, dtype=float, scratch_dir=None):
+    """
+    Allocate a zero-filled array, optionally backed by a memory-mapped
+    scratch file.
+
+    The scratch file is created with :func:`tempfile.TemporaryFile`,
+    such that it is removed from disk when the array is released.
+
+    Args:
+        shape (:obj:`tuple`):
+            Shape of the array.
+        dtype (:obj:`type`, optional):
+            Data type of the array.
+        scratch_dir (:obj:`str`, optional):
+            Directory for the scratch file.  If None, the array is
+            held in memory.
+
+    Returns:
+        `numpy.ndarray`_: The allocated array; a `numpy.memmap`
+        object if `scratch_dir` is provided.
+    """
+    if scratch_dir is None or np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+    if not os.path.isdir(scratch_dir):
+        os.makedirs(scratch_dir)
+    # The mapping keeps the (already unlinked) file open
+    with tempfile.TemporaryFile(dir=scratch_dir) as f:
+        return np.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+
 def func_fit(x, y, func, deg, x2 = None, minx=None, maxx=None, minx2=None, maxx2=None, w=None, inmask = None, guesses=None,
              bspline_par=None, return_errors=False):
     """ General routine to fit a function to a given set of x,y points